@@ -0,0 +1,45 @@
+"""Compare per-recipient and shared frame encoding for large broadcasts."""
+
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from texte.chat_room import ChatRoom  # noqa: E402
+from texte.protocol import frame_message  # noqa: E402
+
+RECIPIENT_COUNTS = (1_000, 10_000)
+ROUNDS = 20
+
+
+def filled_room(size: int) -> ChatRoom:
+    room = ChatRoom()
+    for index in range(size):
+        room.route(f"client-{index}", f"{{REGISTER}}User {index}", f"127.0.0.1:{index}")
+    return room
+
+
+def encode_each(room: ChatRoom) -> int:
+    result = room.route("client-0", "{ALL}shift starts in five minutes", "127.0.0.1:0")
+    return sum(len(frame_message(delivery.message)) for delivery in result.deliveries)
+
+
+def encode_shared(room: ChatRoom) -> int:
+    result = room.route("client-0", "{ALL}shift starts in five minutes", "127.0.0.1:0")
+    return sum(len(delivery.frame) for delivery in result.deliveries)
+
+
+def main() -> None:
+    print("recipients  per-recipient  shared")
+    for count in RECIPIENT_COUNTS:
+        room = filled_room(count)
+        each = timeit.timeit(lambda room=room: encode_each(room), number=ROUNDS) / ROUNDS
+        shared = timeit.timeit(lambda room=room: encode_shared(room), number=ROUNDS) / ROUNDS
+        print(f"{count:>10}  {each * 1_000:10.2f} ms  {shared * 1_000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Time ChatRoom routing as the number of signed-in users grows."""
+
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from texte.chat_room import ChatRoom  # noqa: E402
+
+ROOM_SIZES = (10, 1_000, 10_000)
+ROUNDS = 2_000
+
+
+def filled_room(size: int) -> ChatRoom:
+    room = ChatRoom()
+    for index in range(size):
+        room.route(f"client-{index}", f"{{REGISTER}}User {index}", f"127.0.0.1:{index}")
+    return room
+
+
+def time_direct_route(size: int) -> float:
+    room = filled_room(size)
+    message = f"{{TO}}user {size - 1}|ping"
+    seconds = timeit.timeit(lambda: room.route("client-0", message, "127.0.0.1:0"), number=ROUNDS)
+    return seconds / ROUNDS
+
+
+def main() -> None:
+    print("users   direct route")
+    for size in ROOM_SIZES:
+        print(f"{size:>6}  {time_direct_route(size) * 1_000_000:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Compare the old startswith chains with one `command_tag` lookup per message.
+
+The chains are copies of what `ChatRoom.route` and the client's
+`_handle_server_message` did before they dispatched through a dict keyed by tag.
+"""
+
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from texte.protocol import (  # noqa: E402
+    ALL,
+    CONNECT,
+    DISCONNECT,
+    ERROR,
+    FILE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_END,
+    HISTORY,
+    JOINED,
+    LEFT,
+    REGISTER,
+    SEQ,
+    SERVER_MESSAGE,
+    TO,
+    UNREGISTER,
+    USERS,
+    command_tag,
+    display_text,
+    history_end_payload,
+    joined_payload,
+    left_payload,
+    parse_file_begin,
+    parse_file_chunk,
+    parse_file_delivery,
+    parse_file_end,
+    parse_sequenced_message,
+    users_payload,
+)
+
+ROUNDS = 20
+REPEATS = 5
+SERVER_PREFIXES = (
+    CONNECT, DISCONNECT, REGISTER, UNREGISTER, ALL, TO,
+    FILE, FILE_CHUNK, FILE_BEGIN, FILE_END, HISTORY,
+)  # fmt: skip
+SERVER_TAGS = {prefix: index for index, prefix in enumerate(SERVER_PREFIXES)}
+CLIENT_PARSERS: tuple[Callable[[str], object], ...] = (
+    parse_file_delivery,
+    parse_file_chunk,
+    parse_file_begin,
+    parse_file_end,
+    users_payload,
+    joined_payload,
+    left_payload,
+    parse_sequenced_message,
+    history_end_payload,
+    display_text,
+)
+CLIENT_TAGS = {
+    tag: index
+    for index, tag in enumerate(
+        (FILE, FILE_CHUNK, FILE_BEGIN, FILE_END, USERS, JOINED, LEFT, SEQ, HISTORY)
+    )
+} | {SERVER_MESSAGE: 9, ERROR: 9}
+
+# What each side mostly receives: chat, with some direct messages and presence.
+SERVER_MIX = (
+    [f"{ALL}lunch at noon? {number}" for number in range(60)]
+    + [f"{TO}Bob|see you at {number}" for number in range(30)]
+    + [f"{HISTORY}since|{number}" for number in range(5)]
+    + [f"{FILE_END}t{number}|complete" for number in range(5)]
+)
+CLIENT_MIX = (
+    [f"{SERVER_MESSAGE}[12:00] Ana: lunch at noon? {number}" for number in range(50)]
+    + [f"{SEQ}{number}|[12:00] Ana: lunch at noon?" for number in range(35)]
+    + [f"{JOINED}User {number}" for number in range(5)]
+    + [f"{LEFT}User {number}" for number in range(5)]
+    + [f"{ERROR}User 'Zed' is not signed in." for _number in range(5)]
+)
+
+
+def server_chain(message: str) -> int:
+    for index, prefix in enumerate(SERVER_PREFIXES):
+        if message.startswith(prefix):
+            return index
+    return -1
+
+
+def server_table(message: str) -> int:
+    return SERVER_TAGS.get(command_tag(message), -1)
+
+
+def client_chain(message: str) -> int:
+    # Every parser before the matching one runs and returns None.
+    for index, parse in enumerate(CLIENT_PARSERS):
+        if parse(message) is not None:
+            return index
+    return -1
+
+
+def client_table(message: str) -> int:
+    index = CLIENT_TAGS.get(command_tag(message), -1)
+    if index >= 0:
+        CLIENT_PARSERS[index](message)
+    return index
+
+
+def measure(identify: Callable[[str], int], messages: list[str]) -> float:
+    def run() -> None:
+        for message in messages:
+            identify(message)
+
+    best = min(timeit.repeat(run, number=ROUNDS, repeat=REPEATS))
+    return best / ROUNDS / len(messages) * 1_000_000_000
+
+
+def main() -> None:
+    assert all(server_chain(message) == server_table(message) for message in SERVER_MIX)
+    assert all(client_chain(message) == client_table(message) for message in CLIENT_MIX)
+
+    print(f"{'side':<7} {'chain ns':>9}  {'table ns':>9}  {'speedup':>7}")
+    for side, chain, table, messages in (
+        ("server", server_chain, server_table, SERVER_MIX),
+        ("client", client_chain, client_table, CLIENT_MIX),
+    ):
+        before, after = measure(chain, messages), measure(table, messages)
+        print(f"{side:<7} {before:>9.0f}  {after:>9.0f}  {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compare decode-and-re-encode with zero-decode relay for `{FILE}` attachments."""
+
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from texte.chat_room import ChatRoom  # noqa: E402
+from texte.protocol import file_message, parse_file_message, routed_file_message  # noqa: E402
+
+PAYLOAD_SIZES = (64 * 1024, 1_000_000)
+ROUNDS = 200
+
+
+def two_user_room() -> ChatRoom:
+    room = ChatRoom()
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    return room
+
+
+def decode_and_reencode(message: str) -> int:
+    parsed = parse_file_message(message)
+    assert parsed is not None
+    return len(routed_file_message("Alice", parsed.filename, parsed.data))
+
+
+def relay(room: ChatRoom, message: str) -> int:
+    result = room.route("client-1", message, "127.0.0.1:1")
+    return len(result.deliveries[0].message)
+
+
+def main() -> None:
+    room = two_user_room()
+    print("payload    decode+encode  relay")
+    for size in PAYLOAD_SIZES:
+        message = file_message("Bob", "photo.png", bytes(size))
+        before = timeit.timeit(lambda m=message: decode_and_reencode(m), number=ROUNDS) / ROUNDS
+        after = timeit.timeit(lambda m=message: relay(room, m), number=ROUNDS) / ROUNDS
+        print(f"{size:>7} B  {before * 1_000:10.3f} ms  {after * 1_000:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
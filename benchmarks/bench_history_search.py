@@ -0,0 +1,54 @@
+"""Time full-text history search over a large message store."""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from texte.message_store import MessageStore  # noqa: E402
+
+MESSAGES = 1_000_000
+CONVERSATIONS = ("ALL", "Ana", "Bo", "Cy", "Dee")
+VOCABULARY = [f"w{number:04d}" for number in range(5_000)]
+QUERIES = ("w0001", "w49", "w0100 w0200", "kayak", "w0")
+ROUNDS = 20
+
+
+def fill(store: MessageStore, count: int) -> None:
+    rng = random.Random(7)
+    for number in range(count):
+        words = " ".join(rng.choices(VOCABULARY, k=8))
+        if number % 100_000 == 0:
+            words += " kayak"
+        conversation = CONVERSATIONS[number % len(CONVERSATIONS)]
+        store.append(
+            conversation,
+            {"type": "text", "text": f"[12:00] {conversation}: {words}", "kind": "incoming"},
+        )
+    store.flush()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    with tempfile.TemporaryDirectory() as directory:
+        store = MessageStore(Path(directory) / "history.sqlite3", batch_size=10_000)
+        started = time.perf_counter()
+        fill(store, count)
+        print(f"indexed {count} messages in {time.perf_counter() - started:.1f} s")
+        print("query          hits  ms/search")
+        for query in QUERIES:
+            started = time.perf_counter()
+            for _round in range(ROUNDS):
+                hits = store.search(query)
+            elapsed = (time.perf_counter() - started) / ROUNDS
+            print(f"{query:<13} {len(hits):>5}  {elapsed * 1_000:9.2f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Time protocol.py encode and parse hot paths against stored regression thresholds.
+
+Each case runs over a corpus of realistic messages and reports microseconds per
+message. A case slower than its limit in `protocol_thresholds.json` is a
+regression and makes the script exit with status 1.
+
+Usage:
+    python benchmarks/bench_protocol.py
+    python benchmarks/bench_protocol.py --quick --json protocol-report.json
+    python benchmarks/bench_protocol.py --update-thresholds
+"""
+
+import argparse
+import base64
+import json
+import random
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+THRESHOLDS = Path(__file__).with_name("protocol_thresholds.json")
+
+sys.path.insert(0, str(ROOT))
+
+from texte.protocol import (  # noqa: E402
+    FrameDecoder,
+    chat_message,
+    clean_chat_text,
+    command_tag,
+    frame_message,
+    parse_direct_message,
+    parse_file_message,
+    split_frames,
+    users_message,
+)
+
+MESSAGES = 1_000
+USERS = 500
+ATTACHMENTS = 20
+ATTACHMENT_BYTES = 16 * 1024
+READ_CHUNK_BYTES = 4096
+# Limits written by --update-thresholds are this multiple of the measured time, which
+# leaves room for slower machines while still catching an accidental quadratic path.
+HEADROOM = 4.0
+ROUNDS = 20
+QUICK_ROUNDS = 3
+REPEATS = 5
+
+WORDS = (
+    "deploy", "lunch", "ticket", "review", "merge", "standup", "café", "naïve",
+    "build", "release", "ok", "thanks", "🙂", "tomorrow", "Zürich", "agenda",
+)  # fmt: skip
+
+
+def chat_texts(rng: random.Random, count: int) -> list[str]:
+    texts = []
+    for index in range(count):
+        # Mostly short lines, some pasted paragraphs with line breaks.
+        length = rng.choice((3, 6, 12, 40)) if index % 10 else 200
+        words = rng.choices(WORDS, k=length)
+        if length > 12:
+            words[length // 2] += "\n"
+        texts.append(" ".join(words))
+    return texts
+
+
+def build_cases(rng: random.Random) -> dict[str, tuple[Callable[[], object], int]]:
+    """Return each case as a zero-argument callable and the messages it handles."""
+    texts = chat_texts(rng, MESSAGES)
+    names = [f"User {number}" for number in range(USERS)]
+    recipients = [rng.choice(names) for _ in texts]
+    commands = [chat_message(name, text) for name, text in zip(recipients, texts, strict=True)]
+    direct = [command for command in commands if command.startswith("{TO}")]
+    frames = [frame_message(command) for command in commands]
+    stream = b"".join(frames)
+    buffer = stream.decode() + "{ALL}partial"
+    attachments = [
+        f"{{FILE}}{rng.choice(names)}|photo-{index}.png|"
+        + base64.b64encode(rng.randbytes(ATTACHMENT_BYTES)).decode("ascii")
+        for index in range(ATTACHMENTS)
+    ]
+    rosters = [names[:size] for size in (1, 10, 100, USERS)]
+
+    def feed_stream() -> int:
+        decoder = FrameDecoder()
+        count = 0
+        for start in range(0, len(stream), READ_CHUNK_BYTES):
+            count += len(decoder.feed(stream[start : start + READ_CHUNK_BYTES]))
+        return count
+
+    return {
+        "frame_message": (lambda: [frame_message(command) for command in commands], len(commands)),
+        "split_frames": (lambda: split_frames(buffer), len(commands)),
+        "frame_decoder_feed": (feed_stream, len(commands)),
+        "chat_message": (
+            lambda: [
+                chat_message(name, text) for name, text in zip(recipients, texts, strict=True)
+            ],
+            len(texts),
+        ),
+        "parse_direct_message": (
+            lambda: [parse_direct_message(command) for command in direct],
+            len(direct),
+        ),
+        "parse_file_message": (
+            lambda: [parse_file_message(message) for message in attachments],
+            len(attachments),
+        ),
+        "users_message": (lambda: [users_message(roster) for roster in rosters], len(rosters)),
+        "clean_chat_text": (lambda: [clean_chat_text(text) for text in texts], len(texts)),
+        "command_tag": (lambda: [command_tag(command) for command in commands], len(commands)),
+    }
+
+
+def measure(rounds: int) -> dict[str, float]:
+    """Return the best-of-`REPEATS` microseconds per message for every case."""
+    results = {}
+    for name, (case, messages) in build_cases(random.Random(7)).items():
+        best = min(timeit.repeat(case, number=rounds, repeat=REPEATS))
+        results[name] = best / rounds / messages * 1_000_000
+    return results
+
+
+def load_thresholds(path: Path = THRESHOLDS) -> dict[str, float]:
+    if not path.exists():
+        return {}
+    return {name: float(limit) for name, limit in json.loads(path.read_text())["max_us"].items()}
+
+
+def regressions(results: dict[str, float], thresholds: dict[str, float]) -> list[str]:
+    return [
+        name for name, micros in results.items() if name in thresholds and micros > thresholds[name]
+    ]
+
+
+def report(results: dict[str, float], thresholds: dict[str, float]) -> dict[str, object]:
+    failed = regressions(results, thresholds)
+    return {
+        "cases": {
+            name: {
+                "us_per_message": round(micros, 4),
+                "max_us": thresholds.get(name),
+                "ok": name not in failed,
+            }
+            for name, micros in results.items()
+        },
+        "regressions": failed,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Fewer rounds, for test runs.")
+    parser.add_argument("--json", type=Path, help="Also write the report to this JSON file.")
+    parser.add_argument(
+        "--update-thresholds",
+        action="store_true",
+        help=f"Store {HEADROOM:g}x this run's timings as the new limits.",
+    )
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    results = measure(QUICK_ROUNDS if args.quick else ROUNDS)
+    if args.update_thresholds:
+        limits = {name: round(micros * HEADROOM, 3) for name, micros in results.items()}
+        THRESHOLDS.write_text(json.dumps({"max_us": limits}, indent=2) + "\n")
+    thresholds = load_thresholds()
+    failed = regressions(results, thresholds)
+
+    print("case                   us/message   limit")
+    for name, micros in results.items():
+        limit = thresholds.get(name)
+        status = "  REGRESSION" if name in failed else ""
+        limit_text = "-" if limit is None else f"{limit:.3f}"
+        print(f"{name:<21} {micros:11.3f}  {limit_text:>6}{status}")
+    if args.json:
+        args.json.write_text(json.dumps(report(results, thresholds), indent=2) + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Compare per-datagram and batched UDP socket handling on loopback."""
+
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+from PyQt6 import QtCore, QtNetwork  # noqa: E402
+
+from texte.qt_server import PeerAddresses  # noqa: E402
+
+HOST = "127.0.0.1"
+DATAGRAMS = 5_000
+ROUNDS = 5
+PAYLOAD = b"{MSG}[12:00] Ana: shift starts in five minutes"
+
+
+def send_fresh(sender: QtNetwork.QUdpSocket, port: int) -> None:
+    for _number in range(DATAGRAMS):
+        sender.writeDatagram(PAYLOAD, QtNetwork.QHostAddress(HOST), port)
+
+
+def send_cached(sender: QtNetwork.QUdpSocket, port: int) -> None:
+    addresses = PeerAddresses()
+    for _number in range(DATAGRAMS):
+        sender.writeDatagram(PAYLOAD, addresses.get(HOST), port)
+
+
+def read_checked(receiver: QtNetwork.QUdpSocket) -> int:
+    count = 0
+    while receiver.hasPendingDatagrams():
+        _data, sender, _port = receiver.readDatagram(receiver.pendingDatagramSize())
+        if sender is not None:
+            sender.toString()
+        count += 1
+    return count
+
+
+def read_batched(receiver: QtNetwork.QUdpSocket) -> int:
+    count = 0
+    while (size := receiver.pendingDatagramSize()) >= 0:
+        _data, sender, _port = receiver.readDatagram(size)
+        if sender is not None:
+            sender.toString()
+        count += 1
+    return count
+
+
+def measure(
+    sender: QtNetwork.QUdpSocket,
+    receiver: QtNetwork.QUdpSocket,
+    port: int,
+    send: Callable[[QtNetwork.QUdpSocket, int], None],
+    read: Callable[[QtNetwork.QUdpSocket], int],
+) -> tuple[float, float]:
+    send_seconds = read_seconds = 0.0
+    received = 0
+    for _round in range(ROUNDS):
+        started = time.perf_counter()
+        send(sender, port)
+        send_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        received += read(receiver)
+        read_seconds += time.perf_counter() - started
+    return DATAGRAMS * ROUNDS / send_seconds, received / read_seconds
+
+
+def main() -> None:
+    app = QtCore.QCoreApplication(sys.argv)
+    receiver = QtNetwork.QUdpSocket()
+    if not receiver.bind(QtNetwork.QHostAddress(HOST), 0):
+        raise SystemExit("UDP bind failed")
+    receiver.setSocketOption(
+        QtNetwork.QAbstractSocket.SocketOption.ReceiveBufferSizeSocketOption, 8 * 1024 * 1024
+    )
+    sender = QtNetwork.QUdpSocket()
+    port = receiver.localPort()
+    print(f"{'mode':<22} {'sent/s':>9}  {'received/s':>10}")
+    for label, send, read in (
+        ("per-datagram", send_fresh, read_checked),
+        ("cached + batched reads", send_cached, read_batched),
+    ):
+        sent, received = measure(sender, receiver, port, send, read)
+        print(f"{label:<22} {sent:>9,.0f}  {received:>10,.0f}")
+    sender.close()
+    receiver.close()
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,19 +12,37 @@ HOST = "127.0.0.1"
 
 sys.path.insert(0, str(ROOT))
 
-from texte.protocol import chat_message, file_message, frame_message, parse_file_delivery  # noqa: E402
+from texte.protocol import (  # noqa: E402
+    FileChunk,
+    FileDelivery,
+    FileMessage,
+    FrameDecoder,
+    ReliableChannel,
+    binary_file_frame,
+    binary_frame,
+    chat_message,
+    connect_message,
+    file_message,
+    frame_message,
+    parse_file_delivery,
+    wants_binary_frames,
+)
 
 
 class DemoClient:
-    def __init__(self, protocol: str, port: int) -> None:
+    def __init__(self, protocol: str, port: int, binary: bool = False) -> None:
         self.protocol = protocol
         self.port = port
-        self.buffer = ""
+        self.binary = binary
+        self.decoder = FrameDecoder()
+        self.channel = ReliableChannel()
         if protocol == "udp":
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Short reads give the reliable channel a chance to retransmit between them.
+            self.socket.settimeout(0.2)
         else:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.settimeout(2)
+            self.socket.settimeout(2)
 
     def connect(self) -> None:
         if self.protocol == "tcp":
@@ -32,71 +50,97 @@ class DemoClient:
             while time.time() < deadline:
                 try:
                     self.socket.connect((HOST, self.port))
-                    return
+                    break
                 except OSError:
                     time.sleep(0.1)
+            if self.binary:
+                self.socket.sendall(frame_message(connect_message(binary=True)))
+                self.recv_until(wants_binary_frames)
 
     def send(self, message: str) -> None:
         if self.protocol == "udp":
-            self.socket.sendto(message.encode(), (HOST, self.port))
+            datagram = self.channel.wrap(message.encode(), time.monotonic())
+            self.socket.sendto(datagram, (HOST, self.port))
+        elif self.binary:
+            self.socket.sendall(binary_frame(message))
         else:
             self.socket.sendall(frame_message(message))
 
+    def send_file(self, recipient: str, filename: str, data: bytes) -> None:
+        if self.binary:
+            self.socket.sendall(binary_file_frame(recipient, filename, data))
+        else:
+            self.send(file_message(recipient, filename, data))
+
     def send_until(self, message: str, predicate) -> str:
-        if self.protocol == "tcp":
-            self.send(message)
-            return self.recv_until(predicate)
+        # UDP datagrams lost while the server starts are retransmitted by the channel.
+        self.send(message)
+        return self.recv_until(predicate)
 
+    def recv_until(self, predicate) -> str:
         deadline = time.time() + 5
-        last_error: OSError | None = None
         while time.time() < deadline:
             try:
-                self.send(message)
-                reply = self.socket.recvfrom(4096)[0].decode()
-                if predicate(reply):
-                    return reply
-            except OSError as error:
-                last_error = error
+                for message in self._read_messages():
+                    if isinstance(message, str) and predicate(message):
+                        return message
+            except OSError:
                 time.sleep(0.1)
-        raise RuntimeError("Timed out waiting for UDP demo response.") from last_error
+        raise RuntimeError("Timed out waiting for demo message.")
 
-    def recv_until(self, predicate) -> str:
+    def recv_file(self) -> FileDelivery | None:
         deadline = time.time() + 5
         while time.time() < deadline:
             try:
                 for message in self._read_messages():
-                    if predicate(message):
-                        return message
+                    if isinstance(message, FileChunk):
+                        continue
+                    if isinstance(message, FileMessage) or message.startswith("{FILE}"):
+                        return parse_file_delivery(message)
             except OSError:
                 time.sleep(0.1)
-        raise RuntimeError("Timed out waiting for demo message.")
+        raise RuntimeError("Timed out waiting for demo file.")
 
     def close(self) -> None:
         self.socket.close()
 
-    def _read_messages(self) -> list[str]:
+    def _read_messages(self) -> list[str | FileMessage | FileChunk]:
         if self.protocol == "udp":
-            return [self.socket.recvfrom(4096)[0].decode()]
+            return self._read_datagram()
+
+        while True:
+            messages = self.decoder.feed(self.socket.recv(4096))
+            if messages:
+                return messages
 
-        while "\n" not in self.buffer:
-            self.buffer += self.socket.recv(4096).decode()
-        parts = self.buffer.split("\n")
-        self.buffer = parts.pop()
-        return [part.strip() for part in parts if part.strip()]
+    def _read_datagram(self) -> list[str | FileMessage | FileChunk]:
+        for datagram in self.channel.due(time.monotonic()):
+            self.socket.sendto(datagram, (HOST, self.port))
+        payload, ack = self.channel.receive(self.socket.recvfrom(4096)[0], time.monotonic())
+        if ack is not None:
+            self.socket.sendto(ack, (HOST, self.port))
+        return [] if payload is None else [payload.decode()]
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Run a two-client Texte demo.")
     parser.add_argument("--protocol", choices=["udp", "tcp"], default="tcp")
     parser.add_argument("--port", type=int, default=33042)
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="Use length-prefixed binary TCP frames so the file travels as raw bytes.",
+    )
     args = parser.parse_args()
+    binary = args.binary and args.protocol == "tcp"
 
     server_args = [sys.executable, str(ROOT / "server.py"), "--port", str(args.port)]
+    server_args += ["--log-level", "warning"]
     if args.protocol == "tcp":
         server_args.insert(2, "tcp")
     server = subprocess.Popen(server_args)
-    alice = DemoClient(args.protocol, args.port)
-    bob = DemoClient(args.protocol, args.port)
+    alice = DemoClient(args.protocol, args.port, binary)
+    bob = DemoClient(args.protocol, args.port, binary)
 
     try:
         alice.connect()
@@ -117,10 +161,8 @@ def main() -> None:
         print(f"Bob received direct message: {bob_direct.removeprefix('{MSG}')}")
 
         if args.protocol == "tcp":
-            alice.send(file_message("Bob", "demo.txt", b"hello from texte"))
-            delivery = parse_file_delivery(
-                bob.recv_until(lambda message: message.startswith("{FILE}"))
-            )
+            alice.send_file("Bob", "demo.txt", b"hello from texte")
+            delivery = bob.recv_file()
             if delivery is None:
                 raise RuntimeError("Expected a file delivery.")
             print(
@@ -0,0 +1,25 @@
+import gc
+import os
+import sys
+from collections.abc import Iterator
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6 import QtWidgets
+
+
+@pytest.fixture(scope="session")
+def qapp() -> Iterator[QtWidgets.QApplication]:
+    """One QApplication for the whole run.
+
+    A test that made its own would destroy it on return while that test's widgets
+    and models still exist, which crashes Qt.
+    """
+    existing = QtWidgets.QApplication.instance()
+    app = existing if isinstance(existing, QtWidgets.QApplication) else None
+    app = app or QtWidgets.QApplication(sys.argv)
+    yield app
+    # Widgets held in reference cycles must go while the application still exists.
+    gc.collect()
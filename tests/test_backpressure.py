@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import pytest
+
+from texte.asyncio_server import AsyncTcpConnection
+from texte.backpressure import (
+    ATTACHMENT,
+    CHAT,
+    CONTROL,
+    DISCONNECT,
+    PAUSE_ATTACHMENTS,
+    OutboundQueue,
+    ServerStats,
+    WriteLimits,
+    frame_kind,
+)
+from texte.chat_room import ChatRoom, deliveries_for
+from texte.protocol import COALESCE_BYTES, FileChunk, OutboundMessage
+
+
+def test_frame_kind_separates_chat_attachments_and_control() -> None:
+    chat, file, chunk, users = (
+        deliveries_for(["client"], message)[0]
+        for message in (
+            "{MSG}hello",
+            "{FILE}Alice|a.txt|aGk=",
+            OutboundMessage(file=FileChunk("t1", 0, b"x")),
+            "{USERS}Alice",
+        )
+    )
+
+    assert [frame_kind(delivery) for delivery in (chat, file, chunk, users)] == [
+        CHAT,
+        ATTACHMENT,
+        ATTACHMENT,
+        CONTROL,
+    ]
+
+
+def test_queue_writes_through_until_the_high_water_mark() -> None:
+    queue = OutboundQueue(WriteLimits(high_water=10, low_water=4), ServerStats())
+
+    assert queue.push(b"12345", CHAT, pending=0) == [b"12345"]
+    assert queue.push(b"12345", CHAT, pending=5) == [b"12345"]
+    assert queue.push(b"1", CONTROL, pending=10) == []
+    assert queue.congested
+    assert queue.drain(pending=6) == []
+    assert queue.drain(pending=4) == [b"1"]
+    assert not queue.congested
+
+
+def test_drop_chat_policy_drops_oldest_chat_frames_first() -> None:
+    stats = ServerStats()
+    queue = OutboundQueue(WriteLimits(high_water=20, low_water=0), stats)
+
+    queue.push(b"old chat", CHAT, pending=20)
+    queue.push(b"{USERS}", CONTROL, pending=20)
+    queue.push(b"new chat", CHAT, pending=20)
+
+    assert queue.drain(pending=0) == [b"{USERS}", b"new chat"]
+    assert (stats.frames_dropped, stats.bytes_dropped) == (1, 8)
+
+
+def test_pause_attachments_policy_keeps_chat_flowing() -> None:
+    stats = ServerStats()
+    queue = OutboundQueue(WriteLimits(10, 2, PAUSE_ATTACHMENTS), stats)
+
+    assert queue.push(b"chunk-1", ATTACHMENT, pending=8) == []
+    assert queue.push(b"chat", CHAT, pending=8) == [b"chat"]
+    assert queue.push(b"chunk-2", ATTACHMENT, pending=12) == []
+    assert queue.drain(pending=0) == [b"chunk-1"]
+    assert queue.drain(pending=1) == [b"chunk-2"]
+    assert stats.frames_paused == 2
+
+
+def test_disconnect_policy_and_hard_limit_drop_the_client() -> None:
+    stats = ServerStats()
+    disconnecting = OutboundQueue(WriteLimits(10, 2, DISCONNECT), stats)
+    holding = OutboundQueue(WriteLimits(10, 2, PAUSE_ATTACHMENTS), stats)
+
+    assert disconnecting.push(b"x" * 11, CHAT, pending=1) is None
+    assert holding.push(b"x" * 30, ATTACHMENT, pending=5) == []
+    assert holding.push(b"x" * 20, ATTACHMENT, pending=5) is None
+    assert stats.slow_disconnects == 2
+
+
+@pytest.mark.parametrize("low_water", [0, 1_000, 15_000])
+def test_async_connection_sends_held_frames_once_the_client_reads(low_water: int) -> None:
+    limits = WriteLimits(high_water=20_000, low_water=low_water)
+    assert limits.high_water < COALESCE_BYTES
+    frames = [b"%04d" % index + b"x" * 995 + b"\n" for index in range(60)]
+    received: list[bytes] = []
+
+    async def exchange() -> None:
+        loop = asyncio.get_running_loop()
+        accepted: asyncio.Future[AsyncTcpConnection] = loop.create_future()
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            connection = AsyncTcpConnection(reader, writer, ChatRoom(), set(), lambda: None, limits)
+            accepted.set_result(connection)
+            await connection.serve()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        connection = await accepted
+        # The client reads nothing until every frame has been written or held.
+        for frame in frames:
+            connection.write(frame)
+        assert connection.outbound.congested
+        received.append(await reader.readexactly(sum(map(len, frames))))
+        writer.close()
+        server.close()
+
+    # A spinning drain loop never yields, so watch it from another thread.
+    thread = threading.Thread(target=asyncio.run, args=(exchange(),), daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert received == [b"".join(frames)]
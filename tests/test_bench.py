@@ -0,0 +1,66 @@
+import asyncio
+import socket
+
+import pytest
+
+from texte.bench import (
+    BenchConfig,
+    ServerProcess,
+    TrafficMix,
+    parse_mix,
+    percentile,
+    run_bench,
+)
+
+
+def test_parse_mix_reads_weights_and_rejects_unknown_kinds() -> None:
+    assert parse_mix("all=60, to=40") == TrafficMix(60.0, 40.0, 0.0)
+    assert parse_mix("file=1") == TrafficMix(0.0, 0.0, 1.0)
+    with pytest.raises(ValueError):
+        parse_mix("all=1,video=2")
+    with pytest.raises(ValueError):
+        parse_mix("all=0")
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    samples = [float(value) for value in range(1, 1001)]
+
+    assert percentile(samples, 0.5) == 500.0
+    assert percentile(samples, 0.99) == 990.0
+    assert percentile(samples, 0.999) == 999.0
+    assert percentile([3.0], 0.999) == 3.0
+    assert percentile([], 0.5) is None
+
+
+@pytest.mark.parametrize("protocol", ["tcp", "udp"])
+def test_bench_drives_traffic_and_measures_delivery(protocol: str) -> None:
+    port = _free_port()
+    server = ServerProcess(protocol, port, "asyncio")
+    config = BenchConfig(
+        protocol,
+        clients=4,
+        duration=0.5,
+        rate=20.0,
+        mix=TrafficMix(50.0, 30.0, 20.0),
+        port=port,
+    )
+
+    try:
+        report = asyncio.run(run_bench(config, server.pid))
+    finally:
+        server.stop()
+
+    summary = report.summary()
+    assert report.sent > 0
+    assert report.delivered >= report.sent
+    assert len(report.latencies) == report.delivered
+    p50, p999 = summary["p50_ms"], summary["p999_ms"]
+    assert isinstance(p50, float) and isinstance(p999, float)
+    assert p50 <= p999
+    assert report.server_rss is None or report.server_rss > 0
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,147 @@
+from collections.abc import Iterator
+
+import pytest
+from PyQt6 import QtCore, QtWidgets
+
+from texte.chat_log import ChatMessageModel, ChatModelCache
+from texte.message_store import MessageStore
+
+
+@pytest.fixture
+def owner(qapp: QtWidgets.QApplication) -> Iterator[QtCore.QObject]:
+    """A parent for the test's models, created once the QApplication exists."""
+    parent = QtCore.QObject()
+    yield parent
+    parent.deleteLater()
+    qapp.sendPostedEvents(None, QtCore.QEvent.Type.DeferredDelete.value)
+
+
+def text_entry(text: str, kind: str = "incoming") -> dict[str, object]:
+    return {"type": "text", "text": text, "kind": kind, "reactions": []}
+
+
+def test_model_sync_only_inserts_appended_entries(owner: QtCore.QObject) -> None:
+    entries = [text_entry("[12:00] Ana: one")]
+    model = ChatMessageModel("ALL", entries, owner)
+    inserted: list[tuple[int, int]] = []
+    model.rowsInserted.connect(lambda _parent, first, last: inserted.append((first, last)))
+
+    entries.extend([text_entry("[12:01] Ana: two"), text_entry("[12:02] Bo: three")])
+
+    assert model.rowCount() == 1
+    assert model.sync() == 2
+    assert model.sync() == 0
+    assert inserted == [(1, 2)]
+    assert model.message_row(1).grouped
+    assert not model.message_row(2).grouped
+    assert model.message_row(2).show_sender
+
+
+def test_model_cache_reuses_recent_models_and_evicts_the_oldest(owner: QtCore.QObject) -> None:
+    history: dict[str, list[dict[str, object]]] = {"ALL": []}
+    cache = ChatModelCache(history, owner, capacity=2)
+
+    all_model = cache.get("ALL")
+    cache.get("Ana")
+    history["ALL"].append(text_entry("[12:00] Ana: hi"))
+
+    assert cache.get("ALL") is all_model
+    assert all_model.rowCount() == 1
+
+    cache.get("Bo")
+
+    assert "Ana" not in cache
+    assert "ALL" in cache
+    assert len(cache) == 2
+    assert history["Ana"] == []
+
+
+def test_model_exposes_the_newest_page_and_prepends_older_pages(owner: QtCore.QObject) -> None:
+    entries = [text_entry(f"[12:00] Ana: {number}") for number in range(250)]
+    model = ChatMessageModel("ALL", entries, owner, page_size=100)
+
+    assert model.rowCount() == 100
+    assert model.data(model.index(0)) == "150"
+    assert model.load_older() == 100
+    assert model.data(model.index(0)) == "50"
+    assert model.load_older() == 50
+    assert not model.has_older()
+    assert model.load_older() == 0
+    assert model.rowCount() == 250
+
+
+def test_model_pages_older_entries_from_the_store(owner: QtCore.QObject, tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    for number in range(150):
+        store.append("ALL", text_entry(f"[12:00] Ana: {number}"))
+    history: dict[str, list[dict[str, object]]] = {"ALL": []}
+    cache = ChatModelCache(history, owner)
+    cache.store = store
+
+    model = cache.get("ALL")
+    history["ALL"].append(text_entry("[12:05] Bo: live"))
+    store.append("ALL", history["ALL"][-1])
+    model.sync()
+    row_before = model.message_row(0)
+
+    assert model.rowCount() == 101
+    assert model.data(model.index(0)) == "50"
+    assert model.load_older() == 50
+    assert model.message_row(50) is row_before
+    assert model.data(model.index(0)) == "0"
+    assert not model.has_older()
+    store.close()
+
+
+def test_model_reveals_a_stored_entry_beyond_the_loaded_pages(
+    owner: QtCore.QObject, tmp_path
+) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    for number in range(300):
+        store.append("ALL", text_entry(f"[12:00] Ana: {number}"))
+    history: dict[str, list[dict[str, object]]] = {"ALL": []}
+    cache = ChatModelCache(history, owner)
+    cache.store = store
+    model = cache.get("ALL")
+    target_id = store.since("ALL", 1)[20]["id"]
+    assert isinstance(target_id, int)
+
+    row = model.reveal(target_id)
+
+    assert row == 0
+    assert model.data(model.index(0)) == "20"
+    assert model.rowCount() == 280
+    assert model.reveal(target_id) == 0
+    assert model.reveal(10_000) is None
+    store.close()
+
+
+def test_model_trims_stored_entries_and_pages_them_back(owner: QtCore.QObject, tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    history: dict[str, list[dict[str, object]]] = {"ALL": [], "Bo": []}
+    cache = ChatModelCache(history, owner)
+    cache.store = store
+    model = cache.get("ALL")
+    for number in range(250):
+        for conversation, entries in history.items():
+            entries.append(text_entry(f"[12:00] Ana: {number}"))
+            store.append(conversation, entries[-1])
+    model.sync()
+    removed: list[tuple[int, int]] = []
+    model.rowsAboutToBeRemoved.connect(lambda _parent, first, last: removed.append((first, last)))
+    kept_row = model.message_row(model.rowCount() - 1)
+
+    cache.trim(model, following=False)
+
+    assert len(history["ALL"]) == 250
+    assert len(history["Bo"]) == 100
+    assert removed == []
+    cache.trim(model, following=True)
+    assert len(history["ALL"]) == 100
+    assert removed == [(0, 149)]
+    assert model.message_row(model.rowCount() - 1) is kept_row
+    assert model.load_older() == 100
+    assert model.data(model.index(0)) == "50"
+    assert model.load_older() == 50
+    assert not model.has_older()
+    store.close()
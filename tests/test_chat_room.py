@@ -1,4 +1,12 @@
 from texte.chat_room import ChatRoom
+from texte.protocol import (
+    FileChunk,
+    binary_file_frame,
+    file_begin_message,
+    file_chunk_message,
+    file_end_message,
+    file_message,
+)
 
 
 def test_room_registers_users_and_sends_presence() -> None:
@@ -52,13 +60,176 @@ def test_room_routes_direct_message_to_sender_and_target() -> None:
     assert all("Alice -> Bob: private ping" in delivery.message for delivery in result.deliveries)
 
 
-def test_room_unregisters_and_sends_updated_presence() -> None:
+def test_room_replays_history_and_sequences_chat_after_catch_up() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-1", "{ALL}before", "127.0.0.1:1")
+    room.route("client-1", "{TO}Alice|note to self", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+
+    replay = room.route("client-2", "{HISTORY}last|10", "127.0.0.1:2")
+    first, end = (delivery.message for delivery in replay.deliveries)
+    assert first.startswith("{SEQ}1|[")
+    assert first.endswith("] Alice: before")
+    assert end == "{HISTORY}2"
+
+    live = room.route("client-1", "{ALL}after", "127.0.0.1:1")
+    prefixes = {delivery.recipient: delivery.message[:6] for delivery in live.deliveries}
+    assert prefixes == {"client-1": "{MSG}[", "client-2": "{SEQ}3"}
+
+    resumed = room.route("client-1", "{HISTORY}since|1", "127.0.0.1:1")
+    assert [delivery.message.split("|", 1)[0] for delivery in resumed.deliveries] == [
+        "{SEQ}2",
+        "{SEQ}3",
+        "{HISTORY}3",
+    ]
+
+
+def test_room_does_not_replay_direct_messages_to_a_later_user_of_the_same_name() -> None:
+    room = ChatRoom()
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    room.route("client-1", "{TO}Bob|private ping", "127.0.0.1:1")
+
+    own = room.route("client-2", "{HISTORY}last|10", "127.0.0.1:2")
+    room.route("client-2", "{DISCONNECT}", "127.0.0.1:2")
+    room.route("client-3", "{REGISTER}bob", "127.0.0.1:3")
+    replay = room.route("client-3", "{HISTORY}last|10", "127.0.0.1:3")
+
+    assert own.deliveries[0].message.endswith("Alice -> Bob: private ping")
+    assert [delivery.message for delivery in replay.deliveries] == ["{HISTORY}1"]
+
+
+def test_room_rejects_history_requests_before_sign_in() -> None:
+    room = ChatRoom()
+
+    result = room.route("client-1", "{HISTORY}last|10", "127.0.0.1:1")
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    malformed = room.route("client-1", "{HISTORY}last|ten", "127.0.0.1:1")
+
+    assert result.deliveries[0].message == "{ERROR}Sign in before loading history."
+    assert malformed.deliveries[0].message == "{ERROR}History request could not be read."
+
+
+def test_room_sends_snapshot_to_joiner_and_deltas_to_others() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    result = room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+
+    assert [(delivery.recipient, delivery.message) for delivery in result.deliveries] == [
+        ("client-2", "{MSG}Welcome Bob!"),
+        ("client-2", "{USERS}Alice,Bob"),
+        ("client-1", "{JOINED}Bob"),
+    ]
+
+    rename = room.route("client-2", "{REGISTER}Bobby", "127.0.0.1:2")
+
+    assert [(delivery.recipient, delivery.message) for delivery in rename.deliveries] == [
+        ("client-2", "{MSG}Welcome Bobby!"),
+        ("client-1", "{LEFT}Bob"),
+        ("client-2", "{LEFT}Bob"),
+        ("client-1", "{JOINED}Bobby"),
+        ("client-2", "{JOINED}Bobby"),
+    ]
+
+
+def test_room_unregisters_and_sends_left_delta() -> None:
     room = ChatRoom()
 
     room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
     room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
     result = room.route("client-2", "{UNREGISTER}Bob", "127.0.0.1:2")
 
-    assert "{MSG}Bye Bob!" in [delivery.message for delivery in result.deliveries]
-    assert "{USERS}Alice" in [delivery.message for delivery in result.deliveries]
+    assert [(delivery.recipient, delivery.message) for delivery in result.deliveries] == [
+        ("client-2", "{MSG}Bye Bob!"),
+        ("client-1", "{LEFT}Bob"),
+    ]
     assert room.usernames == ["Alice"]
+
+
+def test_room_name_index_follows_renames_and_disconnects() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-1", "{REGISTER}Alicia", "127.0.0.1:1")
+    result = room.route("client-2", "{REGISTER}alice", "127.0.0.1:2")
+
+    assert result.deliveries[0].message == "{MSG}Welcome alice!"
+    assert room.usernames == ["alice", "Alicia"]
+
+    direct = room.route("client-2", "{TO}ALICIA|hi", "127.0.0.1:2")
+    assert {delivery.recipient for delivery in direct.deliveries} == {"client-1", "client-2"}
+
+    room.route("client-1", "{DISCONNECT}", "127.0.0.1:1")
+    missing = room.route("client-2", "{TO}Alicia|hi", "127.0.0.1:2")
+    assert missing.deliveries[0].message == "{ERROR}User 'Alicia' is not signed in."
+
+
+def test_room_broadcast_deliveries_share_one_encoded_frame() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    result = room.route("client-1", "{ALL}hello", "127.0.0.1:1")
+
+    first, second = result.deliveries
+    assert first.frame is second.frame
+    assert first.frame == f"{first.message}\n".encode()
+
+
+def test_room_relays_file_payloads_without_reencoding() -> None:
+    room = ChatRoom()
+    data = bytes(range(256)) * 4
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    message = file_message("bob", "raw.bin", data)
+    result = room.route("client-1", message, "127.0.0.1:1")
+
+    bob, alice = result.deliveries
+    assert (bob.recipient, alice.recipient) == ("client-2", "client-1")
+    assert bob.message == message.replace("{FILE}bob|", "{FILE}Alice|")
+    assert bob.binary_frame == binary_file_frame("Alice", "raw.bin", data)
+
+
+def test_room_relays_chunked_transfers_without_echoing_the_sender() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    begin = room.route("client-1", file_begin_message("Bob", "s1", "big.bin", 6), "")
+    text_chunk = room.route("client-1", file_chunk_message("s1", 0, b"abc"), "")
+    binary_chunk = room.route("client-1", FileChunk("s1", 3, b"def"), "")
+    end = room.route("client-1", file_end_message("s1"), "")
+
+    assert [(delivery.recipient, delivery.message) for delivery in begin.deliveries] == [
+        ("client-2", "{FILEBEGIN}Alice|t1|big.bin|6")
+    ]
+    assert text_chunk.deliveries[0].message == file_chunk_message("t1", 0, b"abc")
+    assert binary_chunk.deliveries[0].outbound.file == FileChunk("t1", 3, b"def")
+    assert end.deliveries[0].message == "{FILEEND}t1|complete"
+
+
+def test_room_cancels_transfers_on_bad_offsets_and_disconnects() -> None:
+    room = ChatRoom()
+
+    room.route("client-1", "{REGISTER}Alice", "127.0.0.1:1")
+    room.route("client-2", "{REGISTER}Bob", "127.0.0.1:2")
+    room.route("client-1", file_begin_message("ALL", "s1", "a.bin", 6), "")
+    skipped = room.route("client-1", FileChunk("s1", 3, b"def"), "")
+
+    assert [(delivery.recipient, delivery.message) for delivery in skipped.deliveries] == [
+        ("client-2", "{FILEEND}t1|cancelled"),
+        ("client-1", "{FILEEND}s1|cancelled"),
+        ("client-1", "{ERROR}Attachment transfer was cancelled."),
+    ]
+
+    room.route("client-1", file_begin_message("Bob", "s2", "b.bin", 6), "")
+    left = room.route("client-1", "{DISCONNECT}", "127.0.0.1:1")
+
+    assert [(delivery.recipient, delivery.message) for delivery in left.deliveries] == [
+        ("client-2", "{FILEEND}t2|cancelled"),
+        ("client-2", "{LEFT}Alice"),
+    ]
@@ -1,13 +1,27 @@
 import os
 import sys
+import time
 from typing import Any, cast
 
 os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 os.environ.setdefault("TEXTE_DISABLE_AUTO_START", "1")
 
-from PyQt6 import QtCore, QtWidgets
+import pytest
+from PyQt6 import QtCore, QtNetwork, QtWidgets
 
+from texte.chat_log import HISTORY_PAGE_SIZE
 from texte.client import ChatClient
+from texte.client_support import qbytearray_to_bytes
+from texte.protocol import (
+    FileChunk,
+    FileMessage,
+    FrameDecoder,
+    ack_datagram,
+    parse_reliable_datagram,
+    reliable_datagram,
+)
+
+pytestmark = pytest.mark.usefixtures("qapp")
 
 
 def test_client_constructs_with_messages_shell() -> None:
@@ -141,25 +155,66 @@ def test_auto_local_session_starts_only_for_tcp_and_auto_mode() -> None:
     assert app is not None
 
 
-def test_client_message_rows_are_distinct_and_selectable() -> None:
+def test_client_message_rows_are_painted_from_the_model() -> None:
     app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
 
     client = ChatClient()
+    client.resize(1280, 720)
+    client.show()
     client.username.setText("Hugo")
     client._add_chat_text("Welcome Hugo!", "system")
     client._add_chat_text("[12:00] Hugo: hello", "outgoing")
     client._add_chat_text("[12:01] Jam: hi", "incoming")
+    app.processEvents()
+
+    model = client.chat_model
+    assert model.rowCount() == 3
+    assert [model.message_row(row).kind for row in range(3)] == ["system", "outgoing", "incoming"]
+    assert model.data(model.index(2)) == "hi"
+    assert model.message_row(0).time
+    assert not client.chat_log.findChildren(QtWidgets.QLabel)
+    rects = [client.chat_log.visualRect(model.index(row)) for row in range(3)]
+    assert all(rect.height() > 0 for rect in rects)
+    assert rects[0].bottom() < rects[1].top() and rects[1].bottom() < rects[2].top()
+
+    client.close()
+    assert app is not None
 
-    assert client.chat_log.count() == 3
-    for index in range(client.chat_log.count()):
-        container = client.chat_log.itemWidget(client.chat_log.item(index))
-        assert container is not None
-        labels = container.findChildren(QtWidgets.QLabel)
-        assert labels
-        assert any(
-            label.textInteractionFlags() & QtCore.Qt.TextInteractionFlag.TextSelectableByMouse
-            for label in labels
-        )
+
+def test_chat_log_only_shows_the_active_conversation() -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client._add_chat_text("[12:00] Alice: hi", "incoming", conversation="ALL")
+    client._add_chat_text("[12:01] Alice -> Hugo: psst", "incoming", conversation="Alice")
+    client._add_chat_text("[12:02] Alice: again", "incoming", conversation="ALL")
+
+    assert client.chat_model.rowCount() == 2
+    assert client.chat_model.message_row(1).grouped
+
+    all_model = client.chat_model
+    client._show_conversation_history("Alice")
+    assert client.chat_model.rowCount() == 1
+    assert client.chat_model.data(client.chat_model.index(0)) == "psst"
+    assert not client.chat_model.message_row(0).show_sender
+
+    client._add_chat_text("[12:03] Alice: while away", "incoming", conversation="ALL")
+    client._show_conversation_history("ALL")
+    assert client.chat_model is all_model
+    assert client.chat_log.model() is all_model
+    assert all_model.rowCount() == 3
+
+    client.resize(900, 600)
+    client.show()
+    for minute in range(40):
+        client._add_chat_text(f"[12:{minute:02d}] Bo: filler", "incoming", conversation="ALL")
+    app.processEvents()
+    scrollbar = client.chat_log.verticalScrollBar()
+    assert scrollbar is not None and scrollbar.maximum() > 0
+    scrollbar.setValue(10)
+    client._show_conversation_history("Alice")
+    client._show_conversation_history("ALL")
+    assert scrollbar.value() == 10
 
     client.close()
     assert app is not None
@@ -187,6 +242,162 @@ def test_direct_messages_route_to_their_own_conversation() -> None:
     assert app is not None
 
 
+def test_chat_log_pages_in_older_history_without_moving_visible_rows() -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.conversation_history["Bo"] = [
+        {"type": "text", "text": f"[12:00] Bo: line {number}", "kind": "incoming"}
+        for number in range(250)
+    ]
+    client.resize(900, 600)
+    client.show()
+    client._show_conversation_history("Bo")
+    app.processEvents()
+
+    model = client.chat_model
+    assert model.rowCount() == 100
+    scrollbar = client.chat_log.verticalScrollBar()
+    assert scrollbar is not None
+    assert scrollbar.value() == scrollbar.maximum()
+
+    scrollbar.setValue(scrollbar.minimum())
+    top_before = client.chat_log.visualRect(model.index(0)).top()
+    app.processEvents()
+
+    assert model.rowCount() == 200
+    assert model.data(model.index(100)) == "line 150"
+    assert client.chat_log.visualRect(model.index(100)).top() == top_before
+    assert scrollbar.value() > scrollbar.minimum()
+
+    client.close()
+    assert app is not None
+
+
+def test_client_history_survives_restart(tmp_path) -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.history_dir = tmp_path
+    client._add_chat_text("[12:00] Ana: before sign-in", "incoming", conversation="ALL")
+    client._open_message_store("Hugo")
+    client._add_chat_text("[12:01] Ana -> Hugo: saved", "incoming", conversation="Ana")
+    client._update_message_reaction("Ana", client.conversation_history["Ana"][-1], "👍")
+    client.close()
+
+    restarted = ChatClient()
+    restarted.history_dir = tmp_path
+    restarted._open_message_store("Hugo")
+
+    assert restarted.chat_model.data(restarted.chat_model.index(0)) == "before sign-in"
+    restarted._show_conversation_history("Ana")
+    assert restarted.chat_model.rowCount() == 1
+    assert restarted.chat_model.message_row(0).entry["reactions"] == ["👍"]
+    assert (tmp_path / "Hugo.sqlite3").exists()
+
+    restarted.close()
+    assert app is not None
+
+
+def test_client_keeps_only_the_shown_page_of_stored_history_in_memory(tmp_path) -> None:
+    client = ChatClient()
+    client.history_dir = tmp_path
+    client._open_message_store("Hugo")
+    for number in range(HISTORY_PAGE_SIZE * 3):
+        client._add_chat_text(f"[12:00] Ana: {number}", "incoming", conversation="ALL")
+        client._add_chat_text(f"[12:00] Ana -> Hugo: {number}", "incoming", conversation="Ana")
+
+    client._flush_message_store()
+
+    assert len(client.conversation_history["ALL"]) == HISTORY_PAGE_SIZE
+    assert len(client.conversation_history["Ana"]) == HISTORY_PAGE_SIZE
+    assert client.chat_model.load_older() == HISTORY_PAGE_SIZE
+    assert client.chat_model.data(client.chat_model.index(0)) == str(HISTORY_PAGE_SIZE)
+    client.close()
+
+
+def test_signing_in_as_another_profile_switches_history_stores(tmp_path) -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.history_dir = tmp_path
+    client.username.setText("Hugo")
+    client.sign_in_button.setChecked(True)
+    client.sign_in()
+    client._add_chat_text("[12:01] Ana -> Hugo: for Hugo only", "incoming", conversation="Ana")
+    client.sign_in_button.setChecked(False)
+    client.sign_in()
+
+    client.username.setText("Iris")
+    client.sign_in_button.setChecked(True)
+    client.sign_in()
+    client._add_chat_text("[12:02] Ana -> Iris: for Iris only", "incoming", conversation="Ana")
+    client._show_conversation_history("Ana")
+
+    assert client.message_store is not None
+    assert client.message_store.path == tmp_path / "Iris.sqlite3"
+    assert client.chat_model.rowCount() == 1
+    assert client.chat_model.data(client.chat_model.index(0)) == "for Iris only"
+    client.search_field.setText("Hugo")
+    client._run_history_search()
+    first_hit = client.search_results.item(0)
+    assert first_hit is not None
+    assert first_hit.text() == "No matching messages"
+
+    client.close()
+    hugo = ChatClient()
+    hugo.history_dir = tmp_path
+    hugo._open_message_store("Hugo")
+    hugo._show_conversation_history("Ana")
+    assert hugo.chat_model.rowCount() == 1
+    assert hugo.chat_model.data(hugo.chat_model.index(0)) == "for Hugo only"
+
+    hugo.close()
+    assert app is not None
+
+
+def test_search_jumps_to_a_message_in_another_conversation(tmp_path) -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.history_dir = tmp_path
+    client.resize(900, 600)
+    client.show()
+    client._open_message_store("Hugo")
+    client._add_chat_text("[12:00] Bo -> Hugo: the kayak trip is on", "incoming", conversation="Bo")
+    for number in range(150):
+        client._add_chat_text(f"[12:01] Bo -> Hugo: filler {number}", "incoming", conversation="Bo")
+    client.chat_models.clear()
+    del client.conversation_history["Bo"][:-100]
+
+    client.search_field.setText("kay")
+    client._run_history_search()
+
+    assert client.search_results.isVisibleTo(client)
+    assert client.search_results.count() == 1
+    result = client.search_results.item(0)
+    assert result is not None
+    assert "kayak" in result.text()
+
+    client._open_search_result(result)
+    app.processEvents()
+
+    model = client.chat_model
+    assert model.conversation == "Bo"
+    assert model.data(model.index(0)) == "the kayak trip is on"
+    assert client.chat_log.message_delegate.highlighted is model.message_row(0).entry
+    viewport = client.chat_log.viewport()
+    assert viewport is not None
+    assert viewport.rect().intersects(client.chat_log.visualRect(model.index(0)))
+
+    client.search_field.clear()
+    client._run_history_search()
+    assert not client.search_results.isVisibleTo(client)
+
+    client.close()
+    assert app is not None
+
+
 def test_message_reaction_popup_can_open_without_crashing() -> None:
     app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
 
@@ -194,15 +405,17 @@ def test_message_reaction_popup_can_open_without_crashing() -> None:
     client.show()
     client._add_chat_text("[12:00] Alice: hello", "incoming", conversation="ALL")
 
-    item = client.chat_log.item(0)
-    assert item is not None
-    container = client.chat_log.itemWidget(item)
-    assert container is not None
-    bubble = container.findChild(QtWidgets.QFrame, "Message_Bubble")
-    assert bubble is not None
+    app.processEvents()
+    row_rect = client.chat_log.visualRect(client.chat_model.index(0))
+    geometry = client.chat_log.message_delegate.geometry(
+        client.chat_model.message_row(0), row_rect.width()
+    )
+    _index, region, anchor = client.chat_log.hit_test(row_rect.topLeft() + geometry.card.center())
+    assert region == "message"
+    assert anchor.isValid()
 
     client._show_message_action_popup(
-        bubble,
+        anchor,
         entry={"type": "text", "text": "[12:00] Alice: hello", "kind": "incoming", "reactions": []},
         sender="Alice",
         conversation="ALL",
@@ -224,17 +437,39 @@ def test_client_file_delivery_adds_file_card(tmp_path) -> None:
     client = ChatClient()
     client.download_dir = tmp_path
     client._save_file_delivery("Alice", "demo.txt", b"payload")
+    client._show_conversation_history("Alice")
 
-    assert client.chat_log.count() == 1
-    container = client.chat_log.itemWidget(client.chat_log.item(0))
-    assert container is not None
-    assert container.findChild(QtWidgets.QFrame, "File_Card") is not None
+    assert client.chat_model.rowCount() == 1
+    assert client.chat_model.message_row(0).entry_type == "file"
     assert (tmp_path / "demo.txt").exists()
 
     client.close()
     assert app is not None
 
 
+def test_client_writes_chunked_transfers_to_downloads(tmp_path) -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.download_dir = tmp_path
+    client._handle_server_message("{FILEBEGIN}Alice|t1|big.bin|6")
+    client._handle_server_message("{FILECHUNK}t1|0|YWJj")
+    client._receive_file_chunk(FileChunk("t1", 3, b"def"))
+    client._handle_server_message("{FILEEND}t1|complete")
+    client._handle_server_message("{FILEBEGIN}Alice|t2|partial.bin|6")
+    client._handle_server_message("{FILECHUNK}t2|0|YWJj")
+    client._handle_server_message("{FILEEND}t2|cancelled")
+
+    assert (tmp_path / "big.bin").read_bytes() == b"abcdef"
+    assert not (tmp_path / "partial.bin").exists()
+    assert not client.incoming_transfers
+    files = [entry for entry in client.conversation_history["Alice"] if entry["type"] == "file"]
+    assert [entry["filename"] for entry in files] == ["big.bin"]
+
+    client.close()
+    assert app is not None
+
+
 def test_client_avatar_selector_updates_visible_avatar() -> None:
     _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
 
@@ -280,6 +515,37 @@ def test_client_commits_username_rename_while_signed_in() -> None:
     assert _app is not None
 
 
+def test_client_catches_up_from_the_last_sequence_it_saw(tmp_path) -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.history_dir = tmp_path
+    client.history_server = ("TCP", "127.0.0.1", 5000)
+    client.username.setText("Hugo")
+    client.active_username = "Hugo"
+    messages: list[str] = []
+    cast(Any, client).send_message = lambda message, host=None, port=None: messages.append(message)
+
+    client._request_catch_up()
+    client._handle_server_message("{SEQ}4|[12:00] Ana: missed")
+    client._handle_server_message("{HISTORY}4")
+    client._handle_server_message("{SEQ}4|[12:00] Ana: missed")
+    client._handle_server_message("{SEQ}6|[12:01] Ana -> Hugo: live")
+    client._request_catch_up()
+
+    assert messages == ["{HISTORY}last|50", "{HISTORY}since|6"]
+    assert [entry["text"] for entry in client.conversation_history["ALL"]] == [
+        "[12:00] Ana: missed"
+    ]
+    assert client.conversation_history["Ana"][0]["text"] == "[12:01] Ana -> Hugo: live"
+
+    client._handle_server_message("{HISTORY}2")
+    assert client.history_seqs[("TCP", "127.0.0.1", 5000)] == 2
+
+    client.close()
+    assert app is not None
+
+
 def test_conversation_list_updates_from_presence_and_selects_recipient() -> None:
     app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
 
@@ -340,3 +606,116 @@ def test_start_local_session_uses_selected_udp_protocol() -> None:
 
     client.close()
     assert app is not None
+
+
+def test_udp_client_acknowledges_and_retransmits_through_its_channel() -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    server = QtNetwork.QUdpSocket()
+    assert server.bind(QtNetwork.QHostAddress("127.0.0.1"), 0)
+    client = ChatClient()
+    client.protocol_selector.setCurrentText("UDP")
+    client.port_number.setText(str(server.localPort()))
+    client.server_button.setChecked(True)
+    client.connect_client()
+
+    def next_datagram() -> QtNetwork.QNetworkDatagram:
+        deadline = time.monotonic() + 3
+        while not server.hasPendingDatagrams() and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        return server.receiveDatagram()
+
+    connect = next_datagram()
+    parsed = parse_reliable_datagram(qbytearray_to_bytes(connect.data()))
+    assert parsed is not None
+    assert parsed[2] == b"{CONNECT}"
+    assert qbytearray_to_bytes(next_datagram().data()) == qbytearray_to_bytes(connect.data())
+
+    server.writeDatagram(
+        ack_datagram(parsed[0], parsed[1]), connect.senderAddress(), connect.senderPort()
+    )
+    server.writeDatagram(
+        reliable_datagram(5, 1, b"{MSG}[12:00] Ana: over udp"),
+        connect.senderAddress(),
+        connect.senderPort(),
+    )
+
+    assert qbytearray_to_bytes(next_datagram().data()) == ack_datagram(5, 1)
+    assert client.conversation_history["ALL"][-1]["text"] == "[12:00] Ana: over udp"
+    assert client.udp_channel is not None and client.udp_channel.in_flight == 0
+
+    client.close()
+    server.close()
+
+
+def test_tcp_client_coalesces_frames_sent_in_one_event_loop_turn() -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    server = QtNetwork.QTcpServer()
+    assert server.listen(QtNetwork.QHostAddress("127.0.0.1"), 0)
+    client = ChatClient()
+    client.protocol_selector.setCurrentText("TCP")
+    client.port_number.setText(str(server.serverPort()))
+    client.server_button.setChecked(True)
+    client.connect_client()
+
+    decoder = FrameDecoder()
+    peers: list[QtNetwork.QTcpSocket] = []
+
+    def read_until(count: int) -> list[str | FileMessage | FileChunk]:
+        messages: list[str | FileMessage | FileChunk] = []
+        deadline = time.monotonic() + 3
+        while len(messages) < count and time.monotonic() < deadline:
+            app.processEvents()
+            if not peers and (connection := server.nextPendingConnection()) is not None:
+                peers.append(connection)
+            for connection in peers:
+                connection.waitForReadyRead(10)
+                messages.extend(decoder.feed(qbytearray_to_bytes(connection.readAll())))
+        return messages
+
+    assert read_until(1) == ["{CONNECT}"]
+    client.send_message("{ALL}one")
+    client.send_message("{ALL}two")
+    client.send_message("{ALL}three")
+
+    assert read_until(3) == ["{ALL}one", "{ALL}two", "{ALL}three"]
+    stats = client.write_coalescer.stats
+    assert (stats.writes, stats.frames) == (2, 4)
+
+    client.close()
+    server.close()
+
+
+def test_presence_deltas_update_conversations_in_place() -> None:
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    client = ChatClient()
+    client.username.setText("Hugo")
+    client._handle_server_message("{USERS}Alice,Hugo,Jam")
+    client.conversation_list.setCurrentRow(2)
+    jam_row = client.conversation_list.item(2)
+
+    client._handle_server_message("{JOINED}bob")
+    client._handle_server_message("{JOINED}Hugo")
+
+    assert [client.chat_selector.itemText(index) for index in range(4)] == [
+        "ALL",
+        "Alice",
+        "bob",
+        "Jam",
+    ]
+    assert client.conversation_list.count() == 4
+    assert client.conversation_list.item(3) is jam_row
+    assert client.chat_selector.currentText() == "Jam"
+
+    client._handle_server_message("{LEFT}Jam")
+
+    assert client.online_users == ["Alice", "bob"]
+    assert client.conversation_list.count() == 3
+    assert client.chat_selector.currentText() == "ALL"
+    assert client.chat_title.text() == "ALL"
+
+    client.close()
+    assert app is not None
@@ -1,3 +1,4 @@
+import json
 import re
 import socket
 import subprocess
@@ -14,6 +15,13 @@ def test_tcp_demo_matches_expected_transcript() -> None:
     assert _normalize_timestamps(output) == expected
 
 
+def test_binary_tcp_demo_matches_expected_transcript() -> None:
+    output = _run_demo("tcp", "--binary")
+    expected = Path("examples/expected/tcp-demo.txt").read_text(encoding="utf-8").strip()
+
+    assert _normalize_timestamps(output) == expected
+
+
 def test_udp_demo_matches_expected_transcript() -> None:
     output = _run_demo("udp")
     expected = Path("examples/expected/udp-demo.txt").read_text(encoding="utf-8").strip()
@@ -21,7 +29,25 @@ def test_udp_demo_matches_expected_transcript() -> None:
     assert _normalize_timestamps(output) == expected
 
 
-def _run_demo(protocol: str) -> str:
+def test_protocol_benchmark_reports_every_case(tmp_path: Path) -> None:
+    # Timings depend on the machine, so the thresholds are enforced by a separate
+    # CI step; here the script only has to run and describe every case.
+    report_path = tmp_path / "protocol.json"
+    subprocess.run(
+        [sys.executable, "benchmarks/bench_protocol.py", "--quick", "--json", str(report_path)],
+        check=False,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report["cases"]
+    assert all(case["max_us"] is not None for case in report["cases"].values())
+    assert all(case["us_per_message"] > 0 for case in report["cases"].values())
+
+
+def _run_demo(protocol: str, *extra_args: str) -> str:
     result = subprocess.run(
         [
             sys.executable,
@@ -30,6 +56,7 @@ def _run_demo(protocol: str) -> str:
             protocol,
             "--port",
             str(_free_port()),
+            *extra_args,
         ],
         check=True,
         capture_output=True,
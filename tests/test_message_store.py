@@ -0,0 +1,107 @@
+from texte.message_store import MessageStore
+
+
+def text_entry(text: str) -> dict[str, object]:
+    return {"type": "text", "text": text, "kind": "incoming", "reactions": []}
+
+
+def test_store_batches_writes_and_assigns_ids_on_flush(tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3", batch_size=3)
+    first = text_entry("one")
+    store.append("ALL", first)
+    store.append("ALL", text_entry("two"))
+
+    assert store.pending == 2
+    assert "id" not in first
+    assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    store.append("Ana", text_entry("three"))
+
+    assert store.pending == 0
+    assert isinstance(first["id"], int)
+    assert store.count("ALL") == 2
+    assert store.conversations() == ["ALL", "Ana"]
+    store.close()
+
+
+def test_store_pages_backwards_from_an_entry(tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    for number in range(250):
+        store.append("ALL", text_entry(str(number)))
+    store.append("Ana", text_entry("elsewhere"))
+
+    newest = store.page("ALL", limit=100)
+    older = store.page("ALL", newest[0], limit=100)
+    oldest = store.page("ALL", older[0], limit=100)
+
+    assert [entry["text"] for entry in newest] == [str(number) for number in range(150, 250)]
+    assert older[-1]["text"] == "149"
+    assert [entry["text"] for entry in oldest] == [str(number) for number in range(50)]
+    assert store.page("ALL", text_entry("never stored")) == []
+    store.close()
+
+
+def test_store_persists_updates_across_reopen(tmp_path) -> None:
+    path = tmp_path / "history.sqlite3"
+    store = MessageStore(path)
+    entry = text_entry("hello")
+    store.append("ALL", entry)
+    store.flush()
+    entry["reactions"] = ["👍"]
+    store.update(entry)
+    store.close()
+
+    reopened = MessageStore(path)
+    [stored] = reopened.page("ALL")
+
+    assert stored["reactions"] == ["👍"]
+    assert stored["id"] == entry["id"]
+    reopened.close()
+
+
+def test_store_search_ranks_prefix_matches_across_conversations(tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    store.append("ALL", text_entry("[09:00] Ana: lunch at noon?"))
+    store.append("Bo", text_entry("[09:01] Bo -> Ana: lunch lunch, then the launch review"))
+    store.append("ALL", text_entry("[09:02] Cy: nothing to see"))
+    store.append("Bo", {"type": "file", "sender": "Bo", "filename": "launch-plan.pdf"})
+
+    hits = store.search("lun")
+
+    assert [(hit.conversation, hit.sender) for hit in hits] == [("Bo", "Bo"), ("ALL", "Ana")]
+    assert "lunch" in hits[0].snippet
+    assert [hit.conversation for hit in store.search("launch plan")] == ["Bo"]
+    assert [hit.snippet for hit in store.search("Cy")] == ["nothing to see"]
+    assert store.search("missing") == []
+    assert store.search(' "* ') == []
+    store.close()
+
+
+def test_store_indexes_rows_written_before_the_search_index(tmp_path) -> None:
+    path = tmp_path / "history.sqlite3"
+    store = MessageStore(path)
+    store.append("ALL", text_entry("[09:00] Ana: before search existed"))
+    store.flush()
+    store.connection.execute("DELETE FROM messages_fts")
+    store.connection.commit()
+    store.close()
+
+    reopened = MessageStore(path)
+
+    assert [hit.snippet for hit in reopened.search("existed")] == ["before search existed"]
+    reopened.close()
+
+
+def test_store_reads_forward_from_an_entry(tmp_path) -> None:
+    store = MessageStore(tmp_path / "history.sqlite3")
+    for number in range(10):
+        store.append("ALL", text_entry(str(number)))
+    entries = store.page("ALL")
+    third_id = entries[2]["id"]
+    assert isinstance(third_id, int)
+
+    between = store.since("ALL", third_id, entries[5])
+
+    assert [entry["text"] for entry in between] == ["2", "3", "4"]
+    assert len(store.since("ALL", third_id)) == 8
+    store.close()
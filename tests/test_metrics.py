@@ -0,0 +1,98 @@
+from texte.backpressure import ServerStats
+from texte.chat_room import ChatRoom
+from texte.metrics import (
+    InstrumentedRoom,
+    LatencyHistogram,
+    ServerMetrics,
+    command_label,
+    http_response,
+    is_loopback_peer,
+    render_metrics,
+)
+from texte.protocol import FileChunk, FileMessage
+
+
+def test_command_label_names_known_commands_and_folds_the_rest() -> None:
+    assert command_label("{ALL}hello") == "all"
+    assert command_label("{FILEBEGIN}Bob|t1|a.txt|10") == "filebegin"
+    assert command_label(FileMessage("Bob", "a.txt", b"data")) == "file"
+    assert command_label(FileChunk("t1", 0, b"data")) == "filechunk"
+    assert command_label("{MADEUP}x") == "other"
+    assert command_label("plain text") == "other"
+
+
+def test_loopback_peers_include_mapped_ipv4_and_ipv6() -> None:
+    assert is_loopback_peer("127.0.0.1:5000")
+    assert is_loopback_peer("::1:5000")
+    assert is_loopback_peer("::ffff:127.0.0.1:5000")
+    assert not is_loopback_peer("192.168.1.20:5000")
+    assert not is_loopback_peer("unknown:0")
+
+
+def test_latency_histogram_reports_bucket_upper_bounds() -> None:
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+
+    for _number in range(99):
+        histogram.observe(0.00002)
+    histogram.observe(2.0)
+
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.000025
+    assert histogram.quantile(0.99) == 0.000025
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_instrumented_room_counts_commands_and_renders_prometheus_text() -> None:
+    metrics = ServerMetrics(ServerStats())
+    room = InstrumentedRoom(ChatRoom(), metrics)
+    metrics.bytes_received = 42
+
+    room.route("alice", "{REGISTER}Alice", "127.0.0.1:5000")
+    room.route("alice", "{ALL}hello", "127.0.0.1:5000")
+    room.route("alice", "{ALL}again", "127.0.0.1:5000")
+    text = render_metrics(metrics)
+
+    assert "# TYPE texte_commands_total counter" in text
+    assert 'texte_commands_total{command="all"} 2' in text
+    assert 'texte_commands_total{command="register"} 1' in text
+    assert 'texte_route_seconds_bucket{command="all",le="+Inf"} 2' in text
+    assert 'texte_route_seconds_count{command="register"} 1' in text
+    assert "texte_bytes_received_total 42" in text
+    assert "texte_frames_dropped_total 0" in text
+    assert "texte_registered_clients 1" in text
+
+
+def test_stats_command_answers_only_peers_on_the_server_host() -> None:
+    room = InstrumentedRoom(ChatRoom(), ServerMetrics())
+    room.route("alice", "{ALL}hello", "127.0.0.1:5000")
+
+    local = room.route("alice", "{STATS}", "127.0.0.1:5000")
+    remote = room.route("mallory", "{STATS}", "10.0.0.9:5000")
+
+    assert [delivery.recipient for delivery in local.deliveries] == ["alice"]
+    assert local.deliveries[0].message.startswith("{MSG}Server stats: all=1")
+    assert "registered_clients=0" in local.deliveries[0].message
+    assert remote.deliveries[0].message.startswith("{ERROR}")
+    assert room.metrics.commands["stats"] == 2
+
+
+def test_http_response_serves_metrics_and_waits_for_complete_headers() -> None:
+    metrics = ServerMetrics()
+    metrics.bytes_sent = 7
+
+    assert http_response(b"GET /metrics HTTP/1.1\r\nHost: x\r\n", metrics) is None
+    response = http_response(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n", metrics)
+    assert response is not None
+    head, _separator, body = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"version=0.0.4" in head
+    assert f"Content-Length: {len(body)}".encode() in head
+    assert b"texte_bytes_sent_total 7\n" in body
+
+    missing = http_response(b"GET / HTTP/1.1\r\n\r\n", metrics)
+    refused = http_response(b"POST /metrics HTTP/1.1\r\n\r\n", metrics)
+    oversized = http_response(b"G" * 9000, metrics)
+    assert missing is not None and missing.startswith(b"HTTP/1.1 404 ")
+    assert refused is not None and refused.startswith(b"HTTP/1.1 405 ")
+    assert oversized is not None and oversized.startswith(b"HTTP/1.1 431 ")
@@ -1,35 +1,84 @@
+import zlib
 from datetime import datetime
 
 from texte.protocol import (
     ALL,
+    BINARY_CODES,
+    BINARY_HEADER,
+    COMPRESSED_FLAG,
     CONNECT,
     DISCONNECT,
     FIELD,
+    INITIAL_RTO,
+    MAX_INFLATED_BYTES,
+    MAX_SEND_ATTEMPTS,
     REGISTER,
     TO,
     UNREGISTER,
+    Command,
+    FileBegin,
+    FileChunk,
+    FileEnd,
+    FileMessage,
+    FrameDecoder,
+    OutboundMessage,
+    ReliableChannel,
+    ReliableEndpoint,
+    WriteCoalescer,
+    WriteStats,
+    ack_datagram,
+    binary_chunk_frame,
+    binary_file_frame,
+    binary_frame,
     chat_line,
     chat_message,
     clean_chat_text,
     command_payload,
+    command_tag,
+    compress_frame,
+    connect_message,
     direct_chat_line,
-    display_text,
     display_name,
+    display_text,
+    file_begin_message,
+    file_chunk_message,
+    file_end_message,
     file_message,
     frame_message,
+    frame_payload,
     handle_server_message,
+    history_end_message,
+    history_end_payload,
+    history_request,
+    joined_message,
+    joined_payload,
+    left_message,
+    left_payload,
     message_has_chat_text,
     outgoing_payload,
+    parse_command,
     parse_direct_message,
+    parse_display_message,
+    parse_encoded_file_chunk,
+    parse_encoded_file_message,
+    parse_file_begin,
+    parse_file_chunk,
     parse_file_delivery,
+    parse_file_end,
     parse_file_message,
+    parse_history_request,
+    parse_sequenced_message,
     register_message,
+    reliable_datagram,
+    sequenced_message,
     server_message,
     split_frames,
     timestamp,
     unregister_message,
     users_message,
     users_payload,
+    wants_binary_frames,
+    wants_compressed_frames,
 )
 
 
@@ -59,6 +108,20 @@ def test_registration_commands_include_usernames() -> None:
     assert unregister_message(" Hugo ") == "{UNREGISTER}Hugo"
 
 
+def test_command_tag_identifies_known_tags_in_one_scan() -> None:
+    assert command_tag("{FILE}Bob|a.txt|ZGF0YQ==") == "{FILE}"
+    assert command_tag("{FILEBEGIN}Bob|t1|a.txt|10") == "{FILEBEGIN}"
+    assert command_tag("{TO}Bob|see {you}") == "{TO}"
+    assert command_tag("{MADEUP}x") == ""
+    assert command_tag("{unterminated") == ""
+    assert command_tag("plain text") == ""
+
+    command = parse_command("{TO}Bob|hello")
+    assert command == Command("{TO}", "{TO}Bob|hello")
+    assert command.payload == "Bob|hello"
+    assert parse_command("plain text").payload == "plain text"
+
+
 def test_command_payload_and_display_name() -> None:
     assert command_payload("{REGISTER}Hugo", REGISTER) == "Hugo"
     assert display_name(REGISTER, REGISTER, "127.0.0.1") == "127.0.0.1"
@@ -72,6 +135,16 @@ def test_chat_line_includes_timestamp_sender_and_text() -> None:
     assert direct_chat_line("Hugo", "Bob", "hello", now) == "[09:07] Hugo -> Bob: hello"
 
 
+def test_parse_display_message_splits_routed_chat_lines() -> None:
+    assert parse_display_message("[12:00] Ana -> Bo: hi: there", "incoming", "now") == {
+        "time": "12:00",
+        "sender": "Ana",
+        "recipient": "Bo",
+        "body": "hi: there",
+    }
+    assert parse_display_message("Welcome", "system", "9:00 AM")["time"] == "9:00 AM"
+
+
 def test_users_message_round_trip() -> None:
     message = users_message(["Bob", "Alice"])
 
@@ -79,6 +152,14 @@ def test_users_message_round_trip() -> None:
     assert users_payload(message) == ["Alice", "Bob"]
 
 
+def test_presence_deltas_round_trip() -> None:
+    assert joined_message(" Bob ") == "{JOINED}Bob"
+    assert joined_payload(joined_message("Bob")) == "Bob"
+    assert left_payload(left_message("Bob")) == "Bob"
+    assert joined_payload(left_message("Bob")) is None
+    assert left_payload("{LEFT}") is None
+
+
 def test_direct_message_parsing() -> None:
     parsed = parse_direct_message(TO + "Bob|hello")
 
@@ -88,6 +169,20 @@ def test_direct_message_parsing() -> None:
     assert parse_direct_message(TO + "Bob|") is None
 
 
+def test_history_messages_round_trip() -> None:
+    request = parse_history_request(history_request("since", 42))
+    line = parse_sequenced_message(sequenced_message(7, "[09:00] Ana: a|b"))
+
+    assert request is not None
+    assert (request.mode, request.value) == ("since", 42)
+    assert parse_history_request("{HISTORY}latest|5") is None
+    assert line is not None
+    assert (line.seq, line.text) == (7, "[09:00] Ana: a|b")
+    assert parse_sequenced_message("{SEQ}x|text") is None
+    assert history_end_payload(history_end_message(9)) == 9
+    assert history_end_payload(history_request("last", 5)) is None
+
+
 def test_file_message_round_trip() -> None:
     message = file_message("Bob", "avatar|one.png", b"image-bytes")
     parsed = parse_file_message(message)
@@ -101,6 +196,49 @@ def test_file_message_round_trip() -> None:
     assert delivery.sender == "Bob"
 
 
+def test_encoded_file_message_reads_header_without_decoding() -> None:
+    parsed = parse_encoded_file_message(file_message(" Bob ", "../a.png", b"\x00\x01\x02\x03"))
+
+    assert parsed is not None
+    assert (parsed.recipient, parsed.filename, parsed.encoded) == ("Bob", "a.png", "AAECAw==")
+    assert parsed.byte_count == 4
+    assert parse_encoded_file_message("{FILE}Bob|a.png|AAECAw=") is None
+    assert parse_encoded_file_message("{FILE}Bob|a.png|") is None
+    assert parse_encoded_file_message("{FILE}Bob|a.png|ÅÅÅÅ") is None
+
+
+def test_file_transfer_messages_round_trip() -> None:
+    begin = file_begin_message("Bob", "s1", "../movie.mp4", 3_000_000)
+    chunk = file_chunk_message("s1", 65536, b"\x00chunk")
+    end = file_end_message("s1", complete=False)
+
+    assert parse_file_begin(begin) == FileBegin("Bob", "s1", "movie.mp4", 3_000_000)
+    assert parse_file_chunk(chunk) == FileChunk("s1", 65536, b"\x00chunk")
+    assert parse_file_end(end) == FileEnd("s1", complete=False)
+    assert parse_file_end(file_end_message("s1")) == FileEnd("s1", complete=True)
+    assert parse_file_begin("{FILEBEGIN}Bob|s1|empty.bin|0") is None
+
+
+def test_encoded_file_chunk_counts_bytes_without_decoding() -> None:
+    for data in (b"a", b"ab", b"abc", b"abcd"):
+        encoded = parse_encoded_file_chunk(file_chunk_message("s1", 0, data))
+
+        assert encoded is not None
+        assert encoded.byte_count == len(data)
+    assert parse_encoded_file_chunk("{FILECHUNK}s1|0|abc") is None
+
+
+def test_binary_chunk_frames_carry_raw_bytes() -> None:
+    decoder = FrameDecoder()
+    data = b"\x00|\n\xff" * 10
+
+    assert decoder.feed(binary_chunk_frame("t1", 40, data)) == [FileChunk("t1", 40, data)]
+    assert binary_frame(file_chunk_message("t1", 40, data)) == binary_chunk_frame("t1", 40, data)
+    assert OutboundMessage(file=FileChunk("t1", 40, data)).line_frame == frame_message(
+        file_chunk_message("t1", 40, data)
+    )
+
+
 def test_tcp_frames_split_complete_messages_and_keep_remainder() -> None:
     encoded = frame_message("{REGISTER}Alice") + b"{ALL}hel"
     messages, remainder = split_frames(encoded.decode())
@@ -109,6 +247,132 @@ def test_tcp_frames_split_complete_messages_and_keep_remainder() -> None:
     assert remainder == "{ALL}hel"
 
 
+def test_frame_decoder_yields_frames_across_chunk_boundaries() -> None:
+    decoder = FrameDecoder()
+    stream = frame_message("{REGISTER}Alice") + b"{ALL}h\xc3" + b"\xa9llo\r\n\n{TO}Bob|x"
+
+    assert decoder.feed(stream[:10]) == []
+    assert decoder.feed(stream[10:22]) == ["{REGISTER}Alice"]
+    assert decoder.feed(stream[22:]) == ["{ALL}héllo"]
+    assert len(decoder) == len(b"{TO}Bob|x")
+
+    decoder.clear()
+    assert len(decoder) == 0
+
+
+def test_frame_decoder_reassembles_large_frame_from_small_chunks() -> None:
+    payload = file_message("Bob", "big.bin", bytes(range(256)) * 400)
+    frame = frame_message(payload)
+    decoder = FrameDecoder()
+
+    messages: list[str | FileMessage | FileChunk] = []
+    for offset in range(0, len(frame), 1024):
+        messages.extend(decoder.feed(frame[offset : offset + 1024]))
+
+    assert messages == [payload]
+    assert len(decoder) == 0
+
+
+def test_binary_frames_negotiate_and_mix_with_text_frames() -> None:
+    decoder = FrameDecoder()
+    stream = (
+        frame_message(connect_message(binary=True))
+        + binary_frame("{TO}Bob|héllo")
+        + binary_file_frame("Bob", "raw|data.bin", b"\x00\n|\xff")
+        + frame_message("{ALL}plain")
+    )
+
+    messages = decoder.feed(stream[:7]) + decoder.feed(stream[7:30]) + decoder.feed(stream[30:])
+
+    assert messages == [
+        "{CONNECT}binary",
+        "{TO}Bob|héllo",
+        FileMessage("Bob", "raw_data.bin", b"\x00\n|\xff"),
+        "{ALL}plain",
+    ]
+    assert wants_binary_frames(connect_message(binary=True))
+    assert not wants_binary_frames(connect_message())
+
+
+def test_compressed_frames_negotiate_and_round_trip() -> None:
+    decoder = FrameDecoder()
+    decoder.inflate = True
+    text = "{ALL}" + "quarterly numbers attached " * 100
+    data = b"0123456789abcdef" * 4096
+    compressed_text = compress_frame(binary_frame(text))
+    file_frame = binary_file_frame("Bob", "log.txt", data)
+
+    assert compressed_text[1] & COMPRESSED_FLAG
+    assert len(compressed_text) < len(text) // 5
+    assert decoder.feed(compressed_text + file_frame) == [
+        text.strip(),
+        FileMessage("Bob", "log.txt", data),
+    ]
+    assert wants_compressed_frames(connect_message(binary=True, compressed=True))
+    assert wants_binary_frames(connect_message(binary=True, compressed=True))
+    assert not wants_compressed_frames(connect_message(binary=True))
+
+
+def test_compress_frame_leaves_small_attachment_and_text_frames_alone() -> None:
+    short = binary_frame("{ALL}hello")
+    file = binary_file_frame("Bob", "log.txt", b"a" * 4096)
+    chunk = binary_chunk_frame("t1", 0, b"a" * 4096)
+    line = frame_message("{ALL}" + "a" * 4096)
+
+    assert compress_frame(short) is short
+    assert compress_frame(file) is file
+    assert compress_frame(chunk) is chunk
+    assert compress_frame(line) is line
+
+
+def test_compressed_frames_that_fail_to_inflate_are_dropped() -> None:
+    body = zlib.compress(b"a" * (MAX_INFLATED_BYTES + 1))
+    header = BINARY_HEADER.pack(0, BINARY_CODES["{ALL}"] | COMPRESSED_FLAG, len(body))
+
+    decoder = FrameDecoder()
+    decoder.inflate = True
+
+    assert decoder.feed(header + body) == ["{ALL}"]
+    assert decoder.feed(header + b"x" * len(body)) == ["{ALL}"]
+
+
+def test_compressed_frames_are_refused_until_compression_is_negotiated() -> None:
+    frame = compress_frame(binary_frame("{ALL}" + "quarterly numbers attached " * 100))
+    decoder = FrameDecoder()
+
+    assert decoder.feed(frame) == ["{ALL}"]
+    decoder.inflate = True
+    assert decoder.feed(frame) == ["{ALL}" + ("quarterly numbers attached " * 100).strip()]
+    decoder.clear()
+    assert not decoder.inflate
+
+
+def test_binary_file_frames_reject_bad_attachments() -> None:
+    decoder = FrameDecoder()
+
+    assert decoder.feed(binary_file_frame("Bob", "empty.bin", b"")) == ["{FILE}"]
+    assert decoder.feed(binary_frame("no command")) == ["no command"]
+    assert decoder.feed(binary_frame("{FILE}Alice|bad.bin|a!b@")) == [
+        "{ERROR}Attachment could not be delivered."
+    ]
+
+
+def test_outbound_message_encodes_files_lazily_per_format() -> None:
+    outbound = OutboundMessage(file=parse_file_delivery(file_message("Alice", "a.txt", b"hi")))
+
+    assert outbound.binary_frame is outbound.binary_frame
+    assert outbound.binary_frame.endswith(b"Alice|a.txt|hi")
+    assert outbound.line_frame == frame_message("{FILE}Alice|a.txt|aGk=")
+
+
+def test_frame_payload_drops_the_newline_without_copying() -> None:
+    frame = frame_message("{MSG}hello")
+    payload = frame_payload(frame)
+
+    assert bytes(payload) == b"{MSG}hello"
+    assert payload.obj is frame
+
+
 def test_chat_text_validation() -> None:
     assert clean_chat_text(" hello\nthere ") == "hello there"
     assert message_has_chat_text("{ALL}hello")
@@ -161,3 +425,111 @@ def test_unknown_message_has_no_effect() -> None:
     assert result.log_line is None
     assert not result.close_connection
     assert not result.stop_server
+
+
+def test_reliable_channel_delivers_once_and_acknowledges_every_copy() -> None:
+    sender = ReliableChannel(session=7)
+    receiver = ReliableChannel(session=9)
+    datagram = sender.wrap(b"{ALL}hello", now=0.0)
+
+    assert datagram == reliable_datagram(7, 1, b"{ALL}hello")
+    assert receiver.receive(datagram, now=0.1) == (b"{ALL}hello", ack_datagram(7, 1))
+    assert receiver.receive(datagram, now=0.2) == (None, ack_datagram(7, 1))
+    assert receiver.duplicates == 1
+
+    assert sender.receive(ack_datagram(7, 1), now=0.04) == (None, None)
+    assert sender.in_flight == 0
+    assert sender.srtt == 0.04
+    assert sender.rto < INITIAL_RTO
+
+
+def test_reliable_channel_retransmits_only_unacked_datagrams_with_backoff() -> None:
+    channel = ReliableChannel(session=1)
+    first = channel.wrap(b"one", now=0.0)
+    channel.wrap(b"two", now=0.0)
+    channel.receive(ack_datagram(1, 2), now=0.1)
+
+    assert channel.due(now=0.4) == []
+    assert channel.due(now=INITIAL_RTO) == [first]
+    # The 0.1 s sample set the timeout to 0.3 s; the second send waits twice that.
+    assert channel.due(now=1.0) == []
+    assert channel.due(now=1.1) == [first]
+    # Karn's rule: the ack of a retransmitted datagram does not update the RTT estimate.
+    channel.receive(ack_datagram(1, 1), now=2.0)
+    assert channel.srtt == 0.1
+    assert channel.retransmits == 2
+
+
+def test_reliable_channel_gives_up_after_max_attempts() -> None:
+    channel = ReliableChannel(session=1)
+    channel.wrap(b"lost", now=0.0)
+
+    resent = sum(len(channel.due(now=float(tick))) for tick in range(1, 60))
+
+    assert resent == MAX_SEND_ATTEMPTS - 1
+    assert channel.lost == 1
+    assert channel.next_deadline() is None
+
+
+def test_reliable_channel_resets_duplicate_tracking_for_a_new_peer_session() -> None:
+    receiver = ReliableChannel(session=1)
+
+    assert receiver.receive(reliable_datagram(5, 1, b"a"), now=0.0)[0] == b"a"
+    assert receiver.receive(reliable_datagram(6, 1, b"b"), now=0.0)[0] == b"b"
+    assert receiver.receive(reliable_datagram(6, 3, b"c"), now=0.0)[0] == b"c"
+    assert receiver.receive(reliable_datagram(6, 2, b"d"), now=0.0)[0] == b"d"
+    assert receiver.receive(reliable_datagram(6, 3, b"c"), now=0.0)[0] is None
+
+
+def test_reliable_endpoint_leaves_plain_peers_unwrapped() -> None:
+    endpoint = ReliableEndpoint()
+
+    assert endpoint.receive("plain", b"{ALL}hi", now=0.0) == (b"{ALL}hi", None)
+    assert endpoint.wrap("plain", b"{MSG}hi", now=0.0) == b"{MSG}hi"
+    payload, ack = endpoint.receive("reliable", reliable_datagram(3, 1, b"{ALL}hi"), now=0.0)
+    wrapped = endpoint.wrap("reliable", b"{MSG}hi", now=0.0)
+
+    assert (payload, ack) == (b"{ALL}hi", ack_datagram(3, 1))
+    assert isinstance(wrapped, bytes) and wrapped.startswith(b"{RUDP}")
+    assert endpoint.next_deadline() == INITIAL_RTO
+    assert endpoint.due(now=INITIAL_RTO) == [("reliable", wrapped)]
+
+
+def test_reliable_endpoint_opens_channels_only_for_reliable_senders() -> None:
+    endpoint = ReliableEndpoint()
+
+    assert endpoint.receive("stray", ack_datagram(3, 1), now=0.0) == (None, None)
+    assert endpoint.receive("odd", b"{RUDP}not-a-header", now=0.0) == (b"{RUDP}not-a-header", None)
+    assert endpoint.channels == {}
+
+
+def test_reliable_endpoint_expires_idle_channels_once_nothing_is_in_flight() -> None:
+    endpoint = ReliableEndpoint(idle_seconds=10.0)
+    endpoint.receive("gone", reliable_datagram(3, 1, b"{ALL}hi"), now=0.0)
+    endpoint.receive("busy", reliable_datagram(4, 1, b"{ALL}hi"), now=0.0)
+    endpoint.wrap("busy", b"{MSG}hi", now=0.0)
+    endpoint.receive("active", reliable_datagram(5, 1, b"{ALL}hi"), now=6.0)
+
+    assert endpoint.expire(now=12.0) == ["gone"]
+    assert set(endpoint.channels) == {"busy", "active"}
+    endpoint.receive("plain", b"{ALL}hi", now=22.0)
+    assert set(endpoint.channels) == {"busy"}
+
+
+def test_write_coalescer_joins_frames_until_size_or_age_limit() -> None:
+    stats = WriteStats()
+    coalescer = WriteCoalescer(stats, max_bytes=16, max_delay=0.01)
+
+    assert coalescer.push(b"{ALL}a\n", now=0.0) is False
+    assert coalescer.push(b"{ALL}b\n", now=0.001) is False
+    assert coalescer.flush() == b"{ALL}a\n{ALL}b\n"
+    assert coalescer.flush() == b""
+
+    assert coalescer.push(b"{ALL}c\n", now=1.0) is False
+    assert coalescer.push(b"{ALL}d\n", now=1.02) is True
+    coalescer.flush()
+    assert coalescer.push(b"x" * 16, now=2.0) is True
+    coalescer.flush()
+
+    assert (stats.writes, stats.frames, stats.byte_count) == (3, 5, 44)
+    assert stats.frames_per_write == 5 / 3
@@ -0,0 +1,66 @@
+from texte.room_history import HistoryLimits, RoomHistory
+
+
+def texts(lines) -> list[str]:
+    return [line.text for line in lines]
+
+
+def test_room_history_caps_each_room_by_count_and_bytes() -> None:
+    history = RoomHistory(HistoryLimits(room_messages=3, room_bytes=10))
+
+    for text in ("a", "b", "c", "d"):
+        history.record_public(text)
+    assert texts(history.last("Ana", 10)) == ["b", "c", "d"]
+
+    history.record_public("x" * 9)
+    assert texts(history.last("Ana", 10)) == ["d", "x" * 9]
+    assert history.head == 5
+
+
+def test_room_history_merges_public_and_own_direct_rooms_by_sequence() -> None:
+    history = RoomHistory()
+    history.record_public("one")
+    history.record_direct("Ana", "Bo", "two")
+    history.record_direct("Cy", "Dee", "hidden")
+    history.record_public("three")
+    history.record_direct("Bo", "Ana", "four")
+
+    assert texts(history.last("Bo", 10)) == ["one", "two", "three", "four"]
+    assert texts(history.last("Ana", 2)) == ["three", "four"]
+    assert texts(history.since("Bo", 2)) == ["three", "four"]
+    assert [line.seq for line in history.since("Cy", 0)] == [1, 3, 4]
+    assert history.last("Bo", 0) == []
+
+
+def test_room_history_drops_least_recent_direct_pairs() -> None:
+    history = RoomHistory(HistoryLimits(direct_rooms=2))
+    history.record_direct("Ana", "Bo", "old")
+    history.record_direct("Ana", "Cy", "kept")
+    history.record_direct("Ana", "Bo", "touch")
+    history.record_direct("Ana", "Dee", "new")
+
+    assert texts(history.since("Cy", 0)) == []
+    assert texts(history.since("Ana", 0)) == ["old", "touch", "new"]
+
+
+def test_room_history_forgets_the_direct_rooms_of_a_departed_reader() -> None:
+    history = RoomHistory()
+    history.record_public("hello")
+    history.record_direct(1, 2, "secret")
+    history.record_direct(2, 3, "kept")
+
+    history.forget(1)
+
+    assert texts(history.since(2, 0)) == ["hello", "kept"]
+    assert texts(history.since(1, 0)) == ["hello"]
+    assert history.byte_count == len("hello") + len("kept")
+
+
+def test_room_history_drops_least_recent_direct_pairs_past_the_byte_budget() -> None:
+    history = RoomHistory(HistoryLimits(total_bytes=12))
+    history.record_public("ping")
+    history.record_direct(1, 2, "oldest")
+    history.record_direct(1, 3, "newer")
+
+    assert texts(history.since(1, 0)) == ["ping", "newer"]
+    assert history.byte_count == len("ping") + len("newer")
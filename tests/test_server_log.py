@@ -0,0 +1,84 @@
+import json
+import logging
+import queue
+from pathlib import Path
+
+from texte.server_log import (
+    BoundedQueueHandler,
+    JsonLineFormatter,
+    LogSettings,
+    SamplingFilter,
+    log_event,
+    logger,
+    start_server_logging,
+    worker_log_settings,
+)
+
+
+def test_json_line_formatter_writes_event_level_and_fields() -> None:
+    record = _record("connection.opened", peer="127.0.0.1:5000", port=33002)
+
+    line = json.loads(JsonLineFormatter().format(record))
+
+    assert line["event"] == "connection.opened"
+    assert line["level"] == "info"
+    assert line["peer"] == "127.0.0.1:5000"
+    assert line["port"] == 33002
+    assert line["time"].endswith("+00:00")
+
+
+def test_sampling_filter_keeps_one_in_n_connection_events() -> None:
+    sampling = SamplingFilter(every=3)
+
+    opened = [sampling.filter(_record("connection.opened")) for _number in range(7)]
+    stopped = [sampling.filter(_record("server.stopped")) for _number in range(3)]
+
+    assert opened == [True, False, False, True, False, False, True]
+    assert stopped == [True, True, True]
+    kept = _record("connection.closed", peer="a")
+    assert sampling.filter(kept)
+    assert vars(kept)["fields"] == {"peer": "a", "sampled": 3}
+
+
+def test_bounded_queue_handler_drops_and_counts_past_its_limit() -> None:
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = BoundedQueueHandler(records, limit=2)
+
+    for number in range(5):
+        handler.handle(_record("room.event", number=number))
+
+    assert records.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_server_logging_writes_json_lines_and_rotates(tmp_path: Path) -> None:
+    path = tmp_path / "server.log"
+    server_logging = start_server_logging(LogSettings(level="info", path=path, max_bytes=400))
+    try:
+        log_event("debug.hidden", logging.DEBUG)
+        for number in range(20):
+            log_event("room.event", text=f"line {number}")
+    finally:
+        server_logging.stop()
+
+    files = sorted(tmp_path.glob("server.log*"))
+    lines = [json.loads(line) for file in files for line in file.read_text().splitlines()]
+    assert len(files) > 1
+    assert all(file.stat().st_size <= 400 for file in files)
+    assert {line["event"] for line in lines} == {"room.event"}
+    assert not logger.handlers
+
+
+def test_worker_log_settings_give_each_worker_its_own_file() -> None:
+    settings = LogSettings(level="debug", path=Path("logs/server.log"), sample=10)
+
+    worker = worker_log_settings(settings, 1)
+
+    assert worker == LogSettings(level="debug", path=Path("logs/server.worker1.log"), sample=10)
+    assert worker_log_settings(LogSettings(), 1) == LogSettings()
+
+
+def _record(event: str, **fields: object) -> logging.LogRecord:
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, event, (), None)
+    record.fields = fields
+    return record
@@ -1,16 +1,51 @@
+import json
 import socket
 import subprocess
 import sys
 import time
-
-from texte.protocol import file_message, frame_message, parse_file_delivery
+import urllib.request
+from pathlib import Path
+from typing import TypeVar
+
+import pytest
+from PyQt6 import QtNetwork
+
+from texte.protocol import (
+    FILE_CHUNK_BYTES,
+    MAX_FILE_BYTES,
+    FileChunk,
+    FileMessage,
+    FrameDecoder,
+    ack_datagram,
+    binary_file_frame,
+    binary_frame,
+    compress_frame,
+    connect_message,
+    file_begin_message,
+    file_chunk_message,
+    file_end_message,
+    file_message,
+    frame_message,
+    parse_file_begin,
+    parse_file_delivery,
+    parse_reliable_datagram,
+    reliable_datagram,
+    wants_binary_frames,
+    wants_compressed_frames,
+)
+from texte.qt_server import PeerAddresses
 
 HOST = "127.0.0.1"
+BACKENDS = ["qt", "asyncio"]
+FileT = TypeVar("FileT", FileMessage, FileChunk)
 
 
-def test_udp_server_registers_and_broadcasts_to_registered_clients() -> None:
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_udp_server_registers_and_broadcasts_to_registered_clients(backend: str) -> None:
     port = _free_port()
-    server = subprocess.Popen([sys.executable, "server.py", "--port", str(port)])
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(port), "--backend", backend]
+    )
     first = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     second = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     first.settimeout(2)
@@ -32,9 +67,74 @@ def test_udp_server_registers_and_broadcasts_to_registered_clients() -> None:
         _stop_process(server)
 
 
-def test_udp_server_rejects_file_messages() -> None:
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_udp_server_ignores_bytes_that_are_not_utf8(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(port), "--backend", backend]
+    )
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(2)
+
+    try:
+        _send_udp_until(client, port, b"{REGISTER}Alice", lambda text: text.startswith("{MSG}"))
+        client.sendto(b"\xff\xfe", (HOST, port))
+        client.sendto(b"{ALL}caf\xc3\xa9 \xff", (HOST, port))
+
+        assert _recv_udp_until(client, lambda text: "Alice:" in text).endswith("Alice: café")
+        assert server.poll() is None
+    finally:
+        client.close()
+        _stop_process(server)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_udp_server_acknowledges_and_retransmits_reliable_datagrams(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(port), "--backend", backend]
+    )
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(2)
+    register = reliable_datagram(7, 1, b"{REGISTER}Alice")
+
+    try:
+        welcome = _send_udp_until(client, port, register, lambda text: text.startswith("{RUDP}"))
+        client.sendto(_reliable_ack(welcome), (HOST, port))
+        users = _recv_udp_until(client, lambda text: text.startswith("{RUDP}"))
+        repeated = _recv_udp_until(client, lambda text: text.startswith("{RUDP}"))
+
+        assert welcome.endswith("|{MSG}Welcome Alice!")
+        assert repeated == users
+        client.sendto(_reliable_ack(users), (HOST, port))
+        client.sendto(register, (HOST, port))
+        assert _recv_udp_until(client, lambda text: text.startswith("{ACK}")) == "{ACK}7|1"
+        client.settimeout(1.5)
+        with pytest.raises(socket.timeout):
+            _recv_udp_until(client, lambda text: text.startswith("{RUDP}"))
+    finally:
+        client.close()
+        _stop_process(server)
+
+
+def test_peer_addresses_reuse_parsed_hosts_and_drop_the_oldest() -> None:
+    addresses = PeerAddresses(limit=2)
+    received = QtNetwork.QHostAddress("127.0.0.1")
+    addresses.remember("127.0.0.1", received)
+
+    assert addresses.get("127.0.0.1") is received
+    assert addresses.get("127.0.0.2").toString() == "127.0.0.2"
+    assert addresses.get("127.0.0.3") is addresses.get("127.0.0.3")
+    assert len(addresses) == 2
+    assert addresses.get("127.0.0.1") is not received
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_udp_server_rejects_file_messages(backend: str) -> None:
     port = _free_port()
-    server = subprocess.Popen([sys.executable, "server.py", "--port", str(port)])
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(port), "--backend", backend]
+    )
     client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     client.settimeout(2)
 
@@ -52,9 +152,12 @@ def test_udp_server_rejects_file_messages() -> None:
         _stop_process(server)
 
 
-def test_tcp_server_registers_and_broadcasts_to_registered_clients() -> None:
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_registers_and_broadcasts_to_registered_clients(backend: str) -> None:
     port = _free_port()
-    server = subprocess.Popen([sys.executable, "server.py", "tcp", "--port", str(port)])
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--backend", backend]
+    )
     first_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     second_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     first_socket.settimeout(2)
@@ -155,9 +258,338 @@ def test_tcp_server_routes_small_file_attachments() -> None:
         _stop_process(server)
 
 
-def test_tcp_server_exits_after_last_client_disconnects() -> None:
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_relays_binary_attachments_to_newline_clients(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--backend", backend]
+    )
+    alice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bob_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    alice_socket.settimeout(2)
+    bob_socket.settimeout(2)
+    alice = FramedSocket(alice_socket)
+    bob = FramedSocket(bob_socket)
+    payload = bytes(range(256))
+
+    try:
+        _connect_tcp(alice_socket, port)
+        _connect_tcp(bob_socket, port)
+
+        alice.send(connect_message(binary=True))
+        alice.recv_until(wants_binary_frames)
+        alice.sock.sendall(binary_frame("{REGISTER}Alice"))
+        alice.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        bob.send("{REGISTER}Bob")
+        bob.recv_until(lambda text: text == "{MSG}Welcome Bob!")
+
+        alice.sock.sendall(binary_file_frame("Bob", "raw.bin", payload))
+        alice_file = alice.recv_file()
+        bob_delivery = parse_file_delivery(bob.recv_until(lambda text: text.startswith("{FILE}")))
+
+        assert alice_file == FileMessage("Alice", "raw.bin", payload)
+        assert bob_delivery is not None
+        assert bob_delivery.sender == "Alice"
+        assert bob_delivery.data == payload
+    finally:
+        alice_socket.close()
+        bob_socket.close()
+        _stop_process(server)
+
+
+def test_tcp_server_sends_binary_clients_an_error_for_undecodable_attachments() -> None:
     port = _free_port()
     server = subprocess.Popen([sys.executable, "server.py", "tcp", "--port", str(port)])
+    alice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bob_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    alice_socket.settimeout(2)
+    bob_socket.settimeout(2)
+    alice = FramedSocket(alice_socket)
+    bob = FramedSocket(bob_socket)
+
+    try:
+        _connect_tcp(alice_socket, port)
+        _connect_tcp(bob_socket, port)
+
+        alice.send("{REGISTER}Alice")
+        alice.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        bob.send(connect_message(binary=True))
+        bob.recv_until(wants_binary_frames)
+        bob.sock.sendall(binary_frame("{REGISTER}Bob"))
+        bob.recv_until(lambda text: text == "{MSG}Welcome Bob!")
+
+        # Valid base64 length and alphabet range, so the relay forwards it undecoded.
+        alice.send("{FILE}Bob|bad.bin|a!b@")
+        error = bob.recv_until(lambda text: text.startswith("{ERROR}"))
+
+        assert error == "{ERROR}Attachment could not be delivered."
+        assert not bob.has_message(lambda text: text.startswith("{FILE}"))
+        assert not any(isinstance(message, FileMessage) for message in bob.pending)
+    finally:
+        alice_socket.close()
+        bob_socket.close()
+        _stop_process(server)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_compresses_long_frames_for_clients_that_negotiated_it(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--backend", backend]
+    )
+    alice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bob_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    alice_socket.settimeout(2)
+    bob_socket.settimeout(2)
+    alice = FramedSocket(alice_socket)
+    bob = FramedSocket(bob_socket)
+    long_text = "status report from the east office " * 400
+
+    try:
+        _connect_tcp(alice_socket, port)
+        _connect_tcp(bob_socket, port)
+
+        alice.send("{REGISTER}Alice")
+        alice.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        bob.send(connect_message(binary=True, compressed=True))
+        bob.decoder.inflate = True
+        bob.recv_until(wants_compressed_frames)
+        bob.sock.sendall(binary_frame("{REGISTER}Bob"))
+        bob.recv_until(lambda text: text == "{MSG}Welcome Bob!")
+
+        received_before = bob.received_bytes
+        alice.send("{ALL}" + long_text)
+        relayed = bob.recv_until(lambda text: text.startswith("{MSG}") and "Alice:" in text)
+        assert relayed.endswith(long_text.strip())
+        assert bob.received_bytes - received_before < len(long_text) // 10
+
+        compressed = compress_frame(binary_frame("{TO}Alice|" + long_text))
+        assert len(compressed) < len(long_text) // 10
+        bob.sock.sendall(compressed)
+        direct = alice.recv_until(lambda text: "Bob -> Alice:" in text)
+        assert direct.endswith(long_text.strip())
+    finally:
+        alice_socket.close()
+        bob_socket.close()
+        _stop_process(server)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_streams_chunked_attachments_to_binary_clients(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--backend", backend]
+    )
+    alice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bob_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    alice_socket.settimeout(2)
+    bob_socket.settimeout(2)
+    alice = FramedSocket(alice_socket)
+    bob = FramedSocket(bob_socket)
+    payload = bytes(range(256)) * (FILE_CHUNK_BYTES // 128) + b"tail"
+
+    try:
+        _connect_tcp(alice_socket, port)
+        _connect_tcp(bob_socket, port)
+
+        alice.send("{REGISTER}Alice")
+        alice.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        bob.send(connect_message(binary=True))
+        bob.recv_until(wants_binary_frames)
+        bob.sock.sendall(binary_frame("{REGISTER}Bob"))
+        bob.recv_until(lambda text: text == "{MSG}Welcome Bob!")
+
+        alice.send(file_begin_message("Bob", "s1", "big.bin", len(payload)))
+        for offset in range(0, len(payload), FILE_CHUNK_BYTES):
+            alice.send(
+                file_chunk_message("s1", offset, payload[offset : offset + FILE_CHUNK_BYTES])
+            )
+        alice.send(file_end_message("s1"))
+
+        begin = parse_file_begin(bob.recv_until(lambda text: text.startswith("{FILEBEGIN}")))
+        assert begin is not None
+        assert (begin.peer, begin.filename, begin.byte_count) == ("Alice", "big.bin", len(payload))
+        received = b""
+        while len(received) < len(payload):
+            chunk = bob.recv_chunk()
+            assert chunk.transfer_id == begin.transfer_id
+            assert chunk.offset == len(received)
+            received += chunk.data
+        end = bob.recv_until(lambda text: text.startswith("{FILEEND}"))
+
+        assert received == payload
+        assert end == file_end_message(begin.transfer_id)
+    finally:
+        alice_socket.close()
+        bob_socket.close()
+        _stop_process(server)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_disconnects_clients_that_stop_reading(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "tcp",
+            "--port",
+            str(port),
+            "--backend",
+            backend,
+            "--high-water",
+            "65536",
+            "--low-water",
+            "0",
+            "--slow-consumer",
+            "disconnect",
+        ]
+    )
+    alice_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bob_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    alice_socket.settimeout(2)
+    bob_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    alice = FramedSocket(alice_socket)
+    bob = FramedSocket(bob_socket)
+    chunk = bytes(FILE_CHUNK_BYTES)
+
+    try:
+        _connect_tcp(alice_socket, port)
+        _connect_tcp(bob_socket, port)
+        alice.send("{REGISTER}Alice")
+        alice.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        bob.send("{REGISTER}Bob")
+        alice.recv_until(lambda text: text == "{JOINED}Bob")
+
+        alice.send(file_begin_message("Bob", "s1", "big.bin", 1024 * FILE_CHUNK_BYTES))
+        bob_left = False
+        for index in range(1024):
+            alice.send(file_chunk_message("s1", index * FILE_CHUNK_BYTES, chunk))
+            if index % 64 == 63:
+                bob_left = alice.has_message(lambda text: text == "{LEFT}Bob")
+                if bob_left:
+                    break
+
+        assert bob_left
+    finally:
+        alice_socket.close()
+        bob_socket.close()
+        _stop_process(server)
+
+
+def test_sharded_tcp_server_routes_across_worker_processes(tmp_path: Path) -> None:
+    port = _free_port()
+    log_file = tmp_path / "server.log"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "tcp",
+            "--port",
+            str(port),
+            "--workers",
+            "2",
+            "--log-file",
+            str(log_file),
+        ]
+    )
+    names = ["Alice", "Bob", "Cara", "Dev"]
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _name in names]
+    clients = [FramedSocket(sock) for sock in sockets]
+
+    try:
+        for name, sock, client in zip(names, sockets, clients, strict=True):
+            sock.settimeout(2)
+            _connect_tcp(sock, port)
+            client.send(f"{{REGISTER}}{name}")
+            client.recv_until(lambda text, name=name: text == f"{{MSG}}Welcome {name}!")
+        alice, bob, cara, dev = clients
+
+        assert alice.recv_until(lambda text: text == "{JOINED}Dev") == "{JOINED}Dev"
+
+        alice.send("{ALL}hello shards")
+        for client in clients:
+            assert " Alice: hello shards" in client.recv_until(lambda text: "hello shards" in text)
+
+        bob.send("{STATS}")
+        assert bob.recv_until(lambda text: text.startswith("{ERROR}")) == (
+            "{ERROR}Server stats are not available with --workers."
+        )
+
+        dev.send("{TO}alice|private ping")
+        assert "Dev -> alice: private ping" in alice.recv_until(lambda text: "ping" in text)
+        assert not bob.has_message(lambda text: "private ping" in text)
+
+        cara.send(file_message("Bob", "note.txt", b"hello file"))
+        delivery = parse_file_delivery(bob.recv_until(lambda text: text.startswith("{FILE}")))
+        assert delivery is not None
+        assert delivery.sender == "Cara"
+        assert delivery.data == b"hello file"
+
+        dev.send("{DISCONNECT}")
+        assert alice.recv_until(lambda text: text == "{LEFT}Dev") == "{LEFT}Dev"
+    finally:
+        for sock in sockets:
+            sock.close()
+        _stop_process(server)
+
+    parent_events = [json.loads(line)["event"] for line in log_file.read_text().splitlines()]
+    worker_events = [
+        json.loads(line)["event"]
+        for worker_log in sorted(tmp_path.glob("server.worker*.log"))
+        for line in worker_log.read_text().splitlines()
+    ]
+    assert parent_events[0] == "server.listening"
+    assert worker_events.count("connection.opened") == len(names)
+
+
+def test_sharded_tcp_server_relays_files_larger_than_the_worker_pipes() -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--workers", "2"]
+    )
+    names = ["Alice", "Bob", "Cara", "Dev"]
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _name in names]
+    clients = [FramedSocket(sock) for sock in sockets]
+    # Base64 makes each frame about 1.3 MB, several times a default socketpair buffer.
+    data = bytes(range(256)) * (MAX_FILE_BYTES // 256)
+
+    try:
+        for name, sock, client in zip(names, sockets, clients, strict=True):
+            sock.settimeout(2)
+            _connect_tcp(sock, port)
+            client.send(f"{{REGISTER}}{name}")
+            client.recv_until(lambda text, name=name: text == f"{{MSG}}Welcome {name}!")
+
+        frame = frame_message(file_message("ALL", "big.bin", data))
+        # Finish every frame together so both directions of the bus fill at once.
+        for sock in sockets:
+            sock.sendall(frame[:-1])
+        for sock in sockets:
+            sock.sendall(frame[-1:])
+
+        for client in clients:
+            senders = []
+            for _name in names:
+                delivery = parse_file_delivery(
+                    client.recv_until(lambda text: text.startswith("{FILE}"))
+                )
+                assert delivery is not None
+                assert delivery.data == data
+                senders.append(delivery.sender)
+            assert sorted(senders) == sorted(names)
+    finally:
+        for sock in sockets:
+            sock.close()
+        _stop_process(server)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_exits_after_last_client_disconnects(backend: str) -> None:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "tcp", "--port", str(port), "--backend", backend]
+    )
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client_socket.settimeout(2)
     client = FramedSocket(client_socket)
@@ -180,10 +612,100 @@ def test_tcp_server_exits_after_last_client_disconnects() -> None:
         _stop_process(server)
 
 
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_writes_json_log_lines_to_its_log_file(backend: str, tmp_path: Path) -> None:
+    port = _free_port()
+    log_file = tmp_path / "server.log"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "tcp",
+            "--port",
+            str(port),
+            "--backend",
+            backend,
+            "--log-file",
+            str(log_file),
+        ]
+    )
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(2)
+    client = FramedSocket(client_socket)
+
+    try:
+        _connect_tcp(client_socket, port)
+        client.send("{REGISTER}Alice")
+        client.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        client.send("{DISCONNECT}")
+        server.wait(timeout=5)
+    finally:
+        client_socket.close()
+        _stop_process(server)
+
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    events = [line["event"] for line in lines]
+    assert events == [
+        "server.listening",
+        "connection.opened",
+        "connection.closed",
+        "server.stopped",
+    ]
+    assert lines[0]["port"] == port
+    assert lines[-1]["stats"]["slow_disconnects"] == 0
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tcp_server_serves_metrics_and_answers_stats(backend: str) -> None:
+    port = _free_port()
+    metrics_port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "tcp",
+            "--port",
+            str(port),
+            "--backend",
+            backend,
+            "--metrics-port",
+            str(metrics_port),
+        ]
+    )
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.settimeout(2)
+    client = FramedSocket(client_socket)
+
+    try:
+        _connect_tcp(client_socket, port)
+        client.send("{REGISTER}Alice")
+        client.recv_until(lambda text: text == "{MSG}Welcome Alice!")
+        client.send("{ALL}hello")
+        client.recv_until(lambda text: " Alice: hello" in text)
+        client.send("{STATS}")
+        stats = client.recv_until(lambda text: text.startswith("{MSG}Server stats:"))
+
+        metrics = urllib.request.urlopen(f"http://{HOST}:{metrics_port}/metrics", timeout=5)
+        text = metrics.read().decode()
+
+        assert "all=1" in stats and "register=1" in stats
+        assert metrics.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'texte_commands_total{command="all"} 1' in text
+        assert 'texte_route_seconds_count{command="register"} 1' in text
+        assert "texte_connections 1" in text
+        assert "texte_registered_clients 1" in text
+        assert "texte_bytes_received_total 0" not in text
+    finally:
+        client_socket.close()
+        _stop_process(server)
+
+
 class FramedSocket:
     def __init__(self, sock: socket.socket) -> None:
         self.sock = sock
-        self.buffer = ""
+        self.decoder = FrameDecoder()
+        self.pending: list[str | FileMessage | FileChunk] = []
+        self.received_bytes = 0
 
     def send(self, message: str) -> None:
         self.sock.sendall(frame_message(message))
@@ -191,31 +713,46 @@ class FramedSocket:
     def recv_until(self, predicate) -> str:
         deadline = time.time() + 5
         while time.time() < deadline:
-            for message in self._pop_messages():
-                if predicate(message):
+            while self.pending:
+                message = self.pending.pop(0)
+                if isinstance(message, str) and predicate(message):
                     return message
-            self.buffer += self.sock.recv(4096).decode()
+            self.pending.extend(self._read())
         raise RuntimeError("TCP server did not send expected frame")
 
+    def recv_file(self) -> FileMessage:
+        return self._recv_instance(FileMessage)
+
+    def recv_chunk(self) -> FileChunk:
+        return self._recv_instance(FileChunk)
+
+    def _recv_instance(self, kind: type[FileT]) -> FileT:
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            while self.pending:
+                message = self.pending.pop(0)
+                if isinstance(message, kind):
+                    return message
+            self.pending.extend(self._read())
+        raise RuntimeError("TCP server did not send expected file frame")
+
+    def _read(self) -> list[str | FileMessage | FileChunk]:
+        data = self.sock.recv(4096)
+        self.received_bytes += len(data)
+        return self.decoder.feed(data)
+
     def has_message(self, predicate) -> bool:
         deadline = time.time() + 0.3
         while time.time() < deadline:
             try:
-                self.buffer += self.sock.recv(4096).decode()
+                self.pending.extend(self._read())
             except OSError:
                 break
-            for message in self._pop_messages():
-                if predicate(message):
+            for message in self.pending:
+                if isinstance(message, str) and predicate(message):
                     return True
         return False
 
-    def _pop_messages(self) -> list[str]:
-        if "\n" not in self.buffer:
-            return []
-        parts = self.buffer.split("\n")
-        self.buffer = parts.pop()
-        return [part.strip() for part in parts if part.strip()]
-
 
 def _send_udp_until(
     sock: socket.socket,
@@ -242,6 +779,12 @@ def _recv_udp_until(sock: socket.socket, predicate) -> str:
     raise RuntimeError("UDP server did not send expected datagram")
 
 
+def _reliable_ack(message: str) -> bytes:
+    parsed = parse_reliable_datagram(message.encode())
+    assert parsed is not None
+    return ack_datagram(parsed[0], parsed[1])
+
+
 def _connect_tcp(sock: socket.socket, port: int) -> None:
     deadline = time.time() + 5
     while time.time() < deadline:
@@ -0,0 +1,356 @@
+"""asyncio socket adapters for the Texte servers.
+
+These adapters mirror `texte.qt_server` without importing Qt, so a headless host
+can serve the same `ChatRoom` from plain asyncio streams and datagram endpoints.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections.abc import Callable
+from typing import cast
+
+from texte.backpressure import CONTROL, OutboundQueue, ServerStats, WriteLimits, frame_kind
+from texte.chat_room import ChatRoom, Delivery, Room, RoutingResult, is_udp_address
+from texte.metrics import InstrumentedRoom, ServerMetrics, http_response
+from texte.protocol import (
+    FrameDecoder,
+    ReliableEndpoint,
+    WriteCoalescer,
+    binary_frame,
+    connect_message,
+    datagram_text,
+    error_message,
+    frame_payload,
+    is_attachment_command,
+    wants_binary_frames,
+    wants_compressed_frames,
+)
+from texte.server_log import log_event
+
+READ_CHUNK_BYTES = 64 * 1024
+# Seconds a metrics scrape may take to send its request before it is dropped.
+METRICS_READ_TIMEOUT = 5.0
+
+
+class UdpServerProtocol(asyncio.DatagramProtocol):
+    """Route one command per datagram through a shared ChatRoom."""
+
+    def __init__(self, room: Room, metrics: ServerMetrics | None = None) -> None:
+        self.room = room
+        self.metrics = metrics or ServerMetrics()
+        self.endpoint = ReliableEndpoint()
+        self.transport: asyncio.DatagramTransport | None = None
+        self._retransmit: asyncio.TimerHandle | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self._retransmit is not None:
+            self._retransmit.cancel()
+
+    def datagram_received(self, data: bytes, addr: tuple[str | int, ...]) -> None:
+        sender_host, sender_port = str(addr[0]), int(addr[1])
+        peer = (sender_host, sender_port)
+        self.metrics.bytes_received += len(data)
+        payload, ack = self.endpoint.receive(peer, data, time.monotonic())
+        if ack is not None:
+            self._write(ack, peer)
+        if payload is not None:
+            message = datagram_text(payload)
+            if is_attachment_command(message):
+                self._send(error_message("Attachments require TCP.").encode(), peer)
+            else:
+                result = self.room.route(peer, message, f"{sender_host}:{sender_port}")
+                self.apply_result(result)
+                if result.close_connection:
+                    self.endpoint.forget(peer)
+        self._schedule_retransmit()
+
+    def apply_result(self, result: RoutingResult) -> None:
+        if result.log_line:
+            log_event("room.event", text=result.log_line)
+        for delivery in result.deliveries:
+            if is_udp_address(delivery.recipient):
+                self._send(frame_payload(delivery.frame), delivery.recipient)
+
+    def _send(self, data: bytes | memoryview, address: tuple[str, int]) -> None:
+        self._write(self.endpoint.wrap(address, data, time.monotonic()), address)
+
+    def _write(self, data: bytes | memoryview, address: tuple[str, int]) -> None:
+        if self.transport is not None:
+            self.metrics.bytes_sent += len(data)
+            self.transport.sendto(data, address)
+
+    def _schedule_retransmit(self) -> None:
+        if self._retransmit is not None:
+            self._retransmit.cancel()
+            self._retransmit = None
+        deadline = self.endpoint.next_deadline()
+        if deadline is not None and self.transport is not None:
+            delay = max(0.0, deadline - time.monotonic())
+            self._retransmit = asyncio.get_running_loop().call_later(delay, self._resend_due)
+
+    def _resend_due(self) -> None:
+        self._retransmit = None
+        for peer, datagram in self.endpoint.due(time.monotonic()):
+            if is_udp_address(peer):
+                self._write(datagram, peer)
+        self._schedule_retransmit()
+
+
+class AsyncTcpConnection:
+    """Handle one newline-framed or binary-framed TCP client on asyncio streams."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        room: Room,
+        connections: set["AsyncTcpConnection"],
+        on_empty_connections: Callable[[], None],
+        limits: WriteLimits | None = None,
+        stats: ServerStats | None = None,
+        metrics: ServerMetrics | None = None,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.room = room
+        self.connections = connections
+        self.on_empty_connections = on_empty_connections
+        self.decoder = FrameDecoder()
+        self.binary_frames = False
+        self.compressed_frames = False
+        stats = stats or ServerStats()
+        self.outbound = OutboundQueue(limits or WriteLimits(), stats)
+        self.coalescer = WriteCoalescer(stats.writes)
+        self.metrics = metrics or ServerMetrics(stats)
+        self._flush_handle: asyncio.Handle | None = None
+        self._drain_task: asyncio.Task[None] | None = None
+        # Pause at the low-water mark so StreamWriter.drain() waits until held frames may go.
+        low_water = self.outbound.limits.low_water
+        writer.transport.set_write_buffer_limits(low_water, low_water)
+
+    @property
+    def peer_label(self) -> str:
+        peer = self.writer.get_extra_info("peername") or ("unknown", 0)
+        return f"{peer[0]}:{peer[1]}"
+
+    @property
+    def pending_bytes(self) -> int:
+        return self.writer.transport.get_write_buffer_size() + self.coalescer.buffered_bytes
+
+    def write(self, frame: bytes, kind: str = CONTROL) -> None:
+        if self.writer.is_closing():
+            return
+        frames = self.outbound.push(frame, kind, self.pending_bytes)
+        if frames is None:
+            log_event("connection.slow_disconnect", logging.WARNING, peer=self.peer_label)
+            self.outbound.clear()
+            self.coalescer.clear()
+            self.writer.transport.abort()
+            return
+        for ready in frames:
+            self._queue(ready)
+        if self.outbound.congested and self._drain_task is None:
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+    def deliver(self, delivery: Delivery) -> None:
+        if self.compressed_frames:
+            frame = delivery.compressed_frame
+        else:
+            frame = delivery.binary_frame if self.binary_frames else delivery.frame
+        self.write(frame, frame_kind(delivery))
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self.coalescer and not self.writer.is_closing():
+            data = self.coalescer.flush()
+            self.metrics.bytes_sent += len(data)
+            self.writer.write(data)
+
+    def _queue(self, frame: bytes) -> None:
+        if self.coalescer.push(frame, time.monotonic()):
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self.flush)
+
+    async def _drain(self) -> None:
+        try:
+            while self.outbound.congested and not self.writer.is_closing():
+                # Coalesced bytes count as pending, so hand them to the transport first.
+                self.flush()
+                await self.writer.drain()
+                frames = self.outbound.drain(self.pending_bytes)
+                for frame in frames:
+                    self._queue(frame)
+                if not frames:
+                    # drain() returns at once when the transport is not paused.
+                    await asyncio.sleep(0)
+        except ConnectionError:
+            pass
+        finally:
+            self._drain_task = None
+
+    async def serve(self) -> None:
+        try:
+            while data := await self.reader.read(READ_CHUNK_BYTES):
+                if not self.read_data(data):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.flush()
+            self.writer.close()
+            self.close()
+
+    def read_data(self, data: bytes) -> bool:
+        """Route every complete frame; return False once the client asked to leave."""
+        self.metrics.bytes_received += len(data)
+        for message in self.decoder.feed(data):
+            if isinstance(message, str) and wants_binary_frames(message):
+                self.binary_frames = True
+                self.compressed_frames = wants_compressed_frames(message)
+                self.decoder.inflate = self.compressed_frames
+                self.write(
+                    binary_frame(connect_message(binary=True, compressed=self.compressed_frames))
+                )
+            result = self.room.route(self, message, self.peer_label)
+            self._apply_result(result)
+            if result.close_connection:
+                return False
+        return True
+
+    def close(self) -> None:
+        log_event("connection.closed", peer=self.peer_label)
+        result = self.room.unregister(self)
+        self.connections.discard(self)
+        self._apply_result(result)
+        if not self.connections:
+            self.on_empty_connections()
+
+    def _apply_result(self, result: RoutingResult) -> None:
+        if result.log_line:
+            log_event("room.event", text=result.log_line)
+        for delivery in result.deliveries:
+            recipient = delivery.recipient
+            if isinstance(recipient, AsyncTcpConnection) and recipient in self.connections:
+                recipient.deliver(delivery)
+
+
+def run_udp_server(
+    host: str = "127.0.0.1", port: int = 33002, metrics_port: int | None = None
+) -> None:
+    """Run the UDP server on an asyncio event loop."""
+    asyncio.run(_serve_udp(host, port, metrics_port))
+
+
+def run_tcp_server(
+    host: str = "127.0.0.1",
+    port: int = 33002,
+    limits: WriteLimits | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Run the TCP server on an asyncio event loop."""
+    asyncio.run(_serve_tcp(host, port, limits, metrics_port))
+
+
+async def serve_metrics(metrics: ServerMetrics, port: int) -> asyncio.Server | None:
+    """Serve `metrics` over HTTP on the loopback interface, or return None if the port is taken."""
+
+    async def handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request = b""
+        try:
+            while (response := http_response(request, metrics)) is None:
+                data = await asyncio.wait_for(reader.read(4096), METRICS_READ_TIMEOUT)
+                if not data:
+                    return
+                request += data
+            writer.write(response)
+            await writer.drain()
+        except (ConnectionError, TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    try:
+        server = await asyncio.start_server(handle_scrape, "127.0.0.1", port)
+    except OSError:
+        log_event("metrics.failed", logging.ERROR, port=port)
+        return None
+    log_event("metrics.listening", url=f"http://127.0.0.1:{port}/metrics")
+    return server
+
+
+async def _serve_udp(host: str, port: int, metrics_port: int | None) -> None:
+    loop = asyncio.get_running_loop()
+    metrics = ServerMetrics()
+    room = InstrumentedRoom(ChatRoom(), metrics)
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: UdpServerProtocol(room, metrics), local_addr=(host, port)
+        )
+    except OSError:
+        log_event("server.failed", logging.ERROR, protocol="udp", host=host, port=port)
+        sys.exit(1)
+    metrics.add_gauge(
+        "texte_unacked_datagrams",
+        "Reliable datagrams waiting for an acknowledgement.",
+        lambda: protocol.endpoint.in_flight,
+    )
+    log_event("server.listening", protocol="udp", host=host, port=port)
+    metrics_server = None if metrics_port is None else await serve_metrics(metrics, metrics_port)
+    try:
+        await loop.create_future()
+    finally:
+        transport.close()
+        if metrics_server is not None:
+            metrics_server.close()
+
+
+async def _serve_tcp(
+    host: str, port: int, limits: WriteLimits | None, metrics_port: int | None
+) -> None:
+    stats = ServerStats()
+    metrics = ServerMetrics(stats)
+    room = InstrumentedRoom(ChatRoom(), metrics)
+    connections: set[AsyncTcpConnection] = set()
+    metrics.add_gauge("texte_connections", "Open TCP client connections.", connections.__len__)
+    metrics.add_gauge(
+        "texte_outbound_queue_bytes",
+        "Bytes written or held for TCP clients but not yet sent.",
+        lambda: sum(
+            connection.pending_bytes + connection.outbound.held_bytes for connection in connections
+        ),
+    )
+    idle = asyncio.Event()
+
+    def stop_when_idle() -> None:
+        if not connections:
+            idle.set()
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = AsyncTcpConnection(
+            reader, writer, room, connections, stop_when_idle, limits, stats, metrics
+        )
+        connections.add(connection)
+        log_event("connection.opened", peer=connection.peer_label)
+        await connection.serve()
+
+    try:
+        server = await asyncio.start_server(handle_connection, host, port)
+    except OSError:
+        log_event("server.failed", logging.ERROR, protocol="tcp", host=host, port=port)
+        sys.exit(1)
+    log_event("server.listening", protocol="tcp", host=host, port=port)
+    metrics_server = None if metrics_port is None else await serve_metrics(metrics, metrics_port)
+
+    async with server:
+        await idle.wait()
+    if metrics_server is not None:
+        metrics_server.close()
+    log_event("server.stopped", protocol="tcp", stats=stats.fields())
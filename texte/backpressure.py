@@ -0,0 +1,147 @@
+"""Per-connection outbound limits for TCP clients that read slower than they are sent to."""
+
+from collections import deque
+from dataclasses import dataclass, field
+
+from texte.chat_room import Delivery
+from texte.protocol import SEQ, SERVER_MESSAGE, WriteStats, is_attachment_command
+
+DROP_CHAT = "drop-chat"
+DISCONNECT = "disconnect"
+PAUSE_ATTACHMENTS = "pause-attachments"
+SLOW_CONSUMER_POLICIES = (DROP_CHAT, DISCONNECT, PAUSE_ATTACHMENTS)
+
+DEFAULT_HIGH_WATER = 4 * 1024 * 1024
+DEFAULT_LOW_WATER = 1024 * 1024
+# Held frames past this multiple of the high-water mark drop the client under any policy.
+HARD_LIMIT_FACTOR = 4
+
+CHAT = "chat"
+ATTACHMENT = "attachment"
+CONTROL = "control"
+
+
+@dataclass(frozen=True, slots=True)
+class WriteLimits:
+    high_water: int = DEFAULT_HIGH_WATER
+    low_water: int = DEFAULT_LOW_WATER
+    policy: str = DROP_CHAT
+
+    @property
+    def hard_limit(self) -> int:
+        return self.high_water * HARD_LIMIT_FACTOR
+
+
+@dataclass(slots=True)
+class ServerStats:
+    """Slow-consumer and write-coalescing counters shared by every connection on one server."""
+
+    frames_dropped: int = 0
+    bytes_dropped: int = 0
+    frames_paused: int = 0
+    slow_disconnects: int = 0
+    peak_queued_bytes: int = 0
+    writes: WriteStats = field(default_factory=WriteStats)
+
+    def fields(self) -> dict[str, int | float]:
+        """Return the counters as flat log fields."""
+        return {
+            "frames_dropped": self.frames_dropped,
+            "bytes_dropped": self.bytes_dropped,
+            "frames_paused": self.frames_paused,
+            "slow_disconnects": self.slow_disconnects,
+            "peak_queued_bytes": self.peak_queued_bytes,
+            "frames_written": self.writes.frames,
+            "socket_writes": self.writes.writes,
+            "frames_per_write": round(self.writes.frames_per_write, 2),
+        }
+
+
+def frame_kind(delivery: Delivery) -> str:
+    outbound = delivery.outbound
+    if outbound.file is not None or is_attachment_command(outbound.text):
+        return ATTACHMENT
+    if outbound.text.startswith((SERVER_MESSAGE, SEQ)):
+        return CHAT
+    return CONTROL
+
+
+class OutboundQueue:
+    """Hold one connection's frames while its socket is above the high-water mark.
+
+    Callers pass the bytes the socket has not sent yet. `push` returns the frames
+    to write now, or None when the connection should be dropped; `drain` returns
+    held frames once the socket has fallen below the low-water mark.
+    """
+
+    __slots__ = ("_held", "congested", "held_bytes", "limits", "stats")
+
+    def __init__(self, limits: WriteLimits, stats: ServerStats) -> None:
+        self.limits = limits
+        self.stats = stats
+        self._held: deque[tuple[bytes, str]] = deque()
+        self.held_bytes = 0
+        self.congested = False
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def push(self, frame: bytes, kind: str, pending: int) -> list[bytes] | None:
+        queued = pending + self.held_bytes + len(frame)
+        self.stats.peak_queued_bytes = max(self.stats.peak_queued_bytes, queued)
+        idle = pending == 0 and not self._held
+        if idle or (not self.congested and queued <= self.limits.high_water):
+            return [frame]
+
+        self.congested = True
+        policy = self.limits.policy
+        if policy == DISCONNECT:
+            self.stats.slow_disconnects += 1
+            return None
+        if policy == PAUSE_ATTACHMENTS and kind != ATTACHMENT:
+            return [frame]
+
+        self._held.append((frame, kind))
+        self.held_bytes += len(frame)
+        if kind == ATTACHMENT:
+            self.stats.frames_paused += 1
+        if policy == DROP_CHAT:
+            self._drop_oldest_chat()
+        if self.held_bytes > self.limits.hard_limit:
+            self.stats.slow_disconnects += 1
+            return None
+        return []
+
+    def drain(self, pending: int) -> list[bytes]:
+        if not self.congested or pending > self.limits.low_water:
+            return []
+        frames: list[bytes] = []
+        # The first held frame always goes out, even if it alone exceeds the high-water mark.
+        while self._held and (
+            not frames or pending + len(self._held[0][0]) <= self.limits.high_water
+        ):
+            frame, _kind = self._held.popleft()
+            self.held_bytes -= len(frame)
+            pending += len(frame)
+            frames.append(frame)
+        if not self._held:
+            self.congested = False
+        return frames
+
+    def clear(self) -> None:
+        self._held.clear()
+        self.held_bytes = 0
+        self.congested = False
+
+    def _drop_oldest_chat(self) -> None:
+        if self.held_bytes <= self.limits.high_water:
+            return
+        kept: deque[tuple[bytes, str]] = deque()
+        for frame, kind in self._held:
+            if kind == CHAT and self.held_bytes > self.limits.high_water:
+                self.held_bytes -= len(frame)
+                self.stats.frames_dropped += 1
+                self.stats.bytes_dropped += len(frame)
+            else:
+                kept.append((frame, kind))
+        self._held = kept
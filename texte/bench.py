@@ -0,0 +1,498 @@
+"""Load generator that drives many simulated clients against a Texte server.
+
+Every simulated client is an asyncio TCP connection or UDP socket in this one
+process. After all of them sign in, each sends `{ALL}`, `{TO}`, or `{FILE}`
+traffic at a steady rate for the measured window. Sent messages carry their send
+time, so every client that receives one adds a delivery-latency sample.
+
+Usage:
+    python -m texte.bench
+    python -m texte.bench --protocol udp --clients 2000 --rate 0.5
+    python -m texte.bench --mix all=50,to=40,file=10 --json bench.json
+    python -m texte.bench --connect 127.0.0.1:33002 --server-pid 4242
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import cast
+
+from texte.protocol import (
+    FileMessage,
+    FrameDecoder,
+    binary_file_frame,
+    binary_frame,
+    chat_message,
+    connect_message,
+    file_message,
+    frame_message,
+    parse_file_delivery,
+    register_message,
+    wants_binary_frames,
+)
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 33050
+DEFAULT_CLIENTS = 200
+DEFAULT_DURATION = 10.0
+# Messages per second sent by each client.
+DEFAULT_RATE = 1.0
+DEFAULT_MIX = "all=70,to=25,file=5"
+FILE_BYTES = 4 * 1024
+# Time allowed for in-flight deliveries after senders stop, and for sign-in.
+DRAIN_SECONDS = 1.0
+START_TIMEOUT = 30.0
+READ_CHUNK_BYTES = 64 * 1024
+# Soft limit on open sockets requested for a run; well above any practical client count.
+OPEN_FILE_LIMIT = 65_536
+BENCH_TOKEN = re.compile(r"bench[ -](\d+)")
+PERCENTILES = (("p50", 0.5), ("p99", 0.99), ("p999", 0.999))
+
+
+@dataclass(frozen=True, slots=True)
+class TrafficMix:
+    """Relative weights of public, direct, and attachment messages."""
+
+    public: float = 70.0
+    direct: float = 25.0
+    file: float = 5.0
+
+    def choose(self, rng: random.Random) -> str:
+        kinds, weights = ("all", "to", "file"), (self.public, self.direct, self.file)
+        return rng.choices(kinds, weights)[0]
+
+
+@dataclass(frozen=True, slots=True)
+class BenchConfig:
+    protocol: str = "tcp"
+    clients: int = DEFAULT_CLIENTS
+    duration: float = DEFAULT_DURATION
+    rate: float = DEFAULT_RATE
+    mix: TrafficMix = TrafficMix()
+    host: str = HOST
+    port: int = DEFAULT_PORT
+    binary: bool = False
+    seed: int = 7
+
+
+@dataclass(slots=True)
+class BenchReport:
+    protocol: str
+    clients: int
+    elapsed: float = 0.0
+    sent: int = 0
+    delivered: int = 0
+    latencies: list[float] = field(default_factory=list)
+    server_rss: int | None = None
+    server_peak_rss: int | None = None
+
+    @property
+    def sent_per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def delivered_per_second(self) -> float:
+        return self.delivered / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> dict[str, object]:
+        report = asdict(self)
+        del report["latencies"]
+        report["sent_per_second"] = round(self.sent_per_second, 1)
+        report["delivered_per_second"] = round(self.delivered_per_second, 1)
+        ordered = sorted(self.latencies)
+        for label, fraction in PERCENTILES:
+            value = percentile(ordered, fraction)
+            report[f"{label}_ms"] = None if value is None else round(value * 1_000, 3)
+        return report
+
+
+def parse_mix(text: str) -> TrafficMix:
+    """Parse `all=70,to=25,file=5`; kinds left out get no traffic."""
+    weights = {"all": 0.0, "to": 0.0, "file": 0.0}
+    for part in text.split(","):
+        kind, _, value = part.partition("=")
+        kind = kind.strip().lower()
+        if kind not in weights:
+            raise ValueError(f"Unknown traffic kind {kind!r}; use all, to, or file.")
+        try:
+            weights[kind] = float(value)
+        except ValueError:
+            raise ValueError(f"Traffic weight for {kind!r} must be a number.") from None
+    if any(weight < 0 for weight in weights.values()) or not sum(weights.values()):
+        raise ValueError("Traffic weights must be non-negative and not all zero.")
+    return TrafficMix(weights["all"], weights["to"], weights["file"])
+
+
+def percentile(ordered: list[float], fraction: float) -> float | None:
+    """Return the nearest-rank percentile of already sorted samples."""
+    if not ordered:
+        return None
+    rank = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+def process_rss(pid: int) -> tuple[int | None, int | None]:
+    """Return current and peak resident bytes of `pid` and its children, where /proc exists."""
+    current = peak = 0
+    for member in _process_tree(pid):
+        try:
+            status = Path(f"/proc/{member}/status").read_text()
+        except OSError:
+            continue
+        fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+        current += _kilobytes(fields.get("VmRSS"))
+        peak += _kilobytes(fields.get("VmHWM"))
+    return (current or None), (peak or None)
+
+
+def _process_tree(pid: int) -> list[int]:
+    members = [pid]
+    for member in members:
+        try:
+            children = Path(f"/proc/{member}/task/{member}/children").read_text().split()
+        except OSError:
+            continue
+        members.extend(int(child) for child in children)
+    return members
+
+
+def _kilobytes(value: str | None) -> int:
+    if not value:
+        return 0
+    return int(value.split()[0]) * 1024
+
+
+class BenchClient(ABC):
+    """One simulated user: signs in, sends traffic, and timestamps what it receives."""
+
+    def __init__(self, index: int, config: BenchConfig, report: BenchReport) -> None:
+        self.name = f"bench{index}"
+        self.config = config
+        self.report = report
+        self.signed_in = asyncio.Event()
+        self.recording = False
+
+    @abstractmethod
+    async def connect(self) -> None: ...
+
+    @abstractmethod
+    def send(self, message: str) -> None: ...
+
+    def send_file(self, recipient: str, filename: str, data: bytes) -> None:
+        self.send(file_message(recipient, filename, data))
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+    def receive(self, message: str | FileMessage) -> None:
+        if isinstance(message, str) and message.startswith("{FILE}"):
+            delivery = parse_file_delivery(message)
+            text = delivery.filename if delivery is not None else ""
+        elif isinstance(message, FileMessage):
+            text = message.filename
+        else:
+            text = message
+            if not self.signed_in.is_set() and text.endswith(f"Welcome {self.name}!"):
+                self.signed_in.set()
+                return
+        if not self.recording:
+            return
+        token = BENCH_TOKEN.search(text)
+        if token is not None:
+            self.report.delivered += 1
+            self.report.latencies.append((time.perf_counter_ns() - int(token[1])) / 1e9)
+
+    async def sign_in(self) -> None:
+        # UDP registrations can be lost, so they are repeated until the welcome arrives.
+        while not self.signed_in.is_set():
+            self.send(register_message(self.name))
+            try:
+                await asyncio.wait_for(self.signed_in.wait(), 1.0)
+            except TimeoutError:
+                continue
+
+    async def drive(self, names: list[str], stop: asyncio.Event, rng: random.Random) -> None:
+        payload = bytes(rng.randrange(256) for _ in range(FILE_BYTES))
+        while not stop.is_set():
+            delay = rng.expovariate(self.config.rate) if self.config.rate > 0 else 1.0
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+                return
+            except TimeoutError:
+                pass
+            kind = self.config.mix.choose(rng)
+            stamp = time.perf_counter_ns()
+            peer = rng.choice(names)
+            if kind == "file" and self.config.protocol == "tcp":
+                self.send_file(peer, f"bench-{stamp}.bin", payload)
+            elif kind == "to":
+                self.send(chat_message(peer, f"bench {stamp}"))
+            else:
+                self.send(chat_message("ALL", f"bench {stamp}"))
+            self.report.sent += 1
+
+
+class TcpBenchClient(BenchClient):
+    def __init__(self, index: int, config: BenchConfig, report: BenchReport) -> None:
+        super().__init__(index, config, report)
+        self.decoder = FrameDecoder()
+        self.binary_frames = False
+        self.writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task[None] | None = None
+
+    async def connect(self) -> None:
+        reader, self.writer = await asyncio.open_connection(self.config.host, self.config.port)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read(reader))
+        if self.config.binary:
+            self.writer.write(frame_message(connect_message(binary=True)))
+
+    def send(self, message: str) -> None:
+        if self.writer is None or self.writer.is_closing():
+            return
+        self.writer.write(binary_frame(message) if self.binary_frames else frame_message(message))
+
+    def send_file(self, recipient: str, filename: str, data: bytes) -> None:
+        if self.binary_frames and self.writer is not None and not self.writer.is_closing():
+            self.writer.write(binary_file_frame(recipient, filename, data))
+        else:
+            super().send_file(recipient, filename, data)
+
+    def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while data := await reader.read(READ_CHUNK_BYTES):
+                for message in self.decoder.feed(data):
+                    if isinstance(message, str) and wants_binary_frames(message):
+                        self.binary_frames = True
+                    elif isinstance(message, (str, FileMessage)):
+                        self.receive(message)
+        except ConnectionError:
+            pass
+
+
+class UdpBenchClient(BenchClient, asyncio.DatagramProtocol):
+    def __init__(self, index: int, config: BenchConfig, report: BenchReport) -> None:
+        super().__init__(index, config, report)
+        self.transport: asyncio.DatagramTransport | None = None
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(
+            lambda: self, remote_addr=(self.config.host, self.config.port)
+        )
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def datagram_received(self, data: bytes, addr: tuple[str | int, ...]) -> None:
+        self.receive(data.decode(errors="ignore").strip())
+
+    def error_received(self, exc: Exception) -> None:
+        pass
+
+    def send(self, message: str) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(message.encode())
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def run_bench(config: BenchConfig, server_pid: int | None = None) -> BenchReport:
+    """Sign in every client, send traffic for `config.duration` seconds, and report."""
+    report = BenchReport(config.protocol, config.clients)
+    client_type = TcpBenchClient if config.protocol == "tcp" else UdpBenchClient
+    clients: list[BenchClient] = [
+        client_type(index, config, report) for index in range(config.clients)
+    ]
+    try:
+        await asyncio.wait_for(_start(clients), START_TIMEOUT)
+        names = [client.name for client in clients]
+        stop = asyncio.Event()
+        rng = random.Random(config.seed)
+        for client in clients:
+            client.recording = True
+        started = time.perf_counter()
+        senders = [
+            asyncio.create_task(client.drive(names, stop, random.Random(rng.random())))
+            for client in clients
+        ]
+        await asyncio.sleep(config.duration)
+        stop.set()
+        await asyncio.gather(*senders)
+        report.elapsed = time.perf_counter() - started
+        await asyncio.sleep(DRAIN_SECONDS)
+        if server_pid is not None:
+            report.server_rss, report.server_peak_rss = process_rss(server_pid)
+    finally:
+        for client in clients:
+            client.close()
+    return report
+
+
+async def _start(clients: list[BenchClient]) -> None:
+    for client in clients:
+        await client.connect()
+    await asyncio.gather(*(client.sign_in() for client in clients))
+
+
+class ServerProcess:
+    """A `texte.server` subprocess for the length of one run.
+
+    A TCP server exits once its last client leaves, so an idle probe connection
+    that never signs in stays open until the run is over.
+    """
+
+    def __init__(self, protocol: str, port: int, backend: str, workers: int = 1) -> None:
+        command = [sys.executable, "-m", "texte.server", protocol, "--port", str(port)]
+        command += ["--backend", backend, "--log-level", "warning"]
+        if workers > 1:
+            command += ["--workers", str(workers)]
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        self.probe: socket.socket | None = None
+        if protocol == "tcp":
+            self.probe = self._connect_probe(port)
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def stop(self) -> None:
+        if self.probe is not None:
+            self.probe.close()
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=5)
+
+    def _connect_probe(self, port: int) -> socket.socket:
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline and self.process.poll() is None:
+            try:
+                return socket.create_connection((HOST, port), timeout=0.2)
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("Texte server did not start")
+
+
+def raise_open_file_limit() -> None:
+    # Each simulated client holds a socket; lift the soft limit as far as allowed.
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # An unlimited hard limit (macOS) is not a valid soft limit, so cap the request.
+    limit = OPEN_FILE_LIMIT if hard == resource.RLIM_INFINITY else min(hard, OPEN_FILE_LIMIT)
+    if soft != resource.RLIM_INFINITY and soft < limit:
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+def format_report(report: BenchReport) -> str:
+    summary = report.summary()
+    lines = [
+        f"{report.protocol.upper()} clients   {report.clients}",
+        f"sent/s        {report.sent_per_second:,.0f}",
+        f"delivered/s   {report.delivered_per_second:,.0f}",
+    ]
+    for label, _fraction in PERCENTILES:
+        value = summary[f"{label}_ms"]
+        lines.append(f"{label:<13} {'-' if value is None else f'{value:.2f} ms'}")
+    for label, value in (("server RSS", report.server_rss), ("peak RSS", report.server_peak_rss)):
+        lines.append(f"{label:<13} {'-' if value is None else f'{value / 1024**2:.1f} MiB'}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive simulated clients against a Texte server.")
+    parser.add_argument("--protocol", choices=["tcp", "udp"], default="tcp")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument(
+        "--rate", type=float, default=DEFAULT_RATE, help="Messages per second per client."
+    )
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help="Traffic weights, e.g. all=70,to=25,file=5. UDP sends files as {ALL}.",
+    )
+    parser.add_argument("--binary", action="store_true", help="Use binary TCP frames.")
+    parser.add_argument("--backend", choices=["qt", "asyncio"], default="asyncio")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--connect",
+        metavar="HOST:PORT",
+        help="Drive an already running server instead of starting one.",
+    )
+    parser.add_argument(
+        "--server-pid", type=int, help="Process to measure RSS for when using --connect."
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", type=Path, help="Also write the report to this JSON file.")
+    args = parser.parse_args(argv)
+    if args.clients < 2:
+        parser.error("--clients must be at least 2")
+    if args.duration <= 0 or args.rate < 0:
+        parser.error("--duration must be positive and --rate non-negative")
+    try:
+        args.mix = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run one load test from command-line arguments and print its report."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    raise_open_file_limit()
+    host, port = HOST, args.port
+    server: ServerProcess | None = None
+    server_pid = args.server_pid
+    if args.connect:
+        host, _, port_text = args.connect.rpartition(":")
+        port = int(port_text)
+    else:
+        server = ServerProcess(args.protocol, port, args.backend, args.workers)
+        server_pid = server.pid
+    config = BenchConfig(
+        args.protocol,
+        args.clients,
+        args.duration,
+        args.rate,
+        args.mix,
+        host,
+        port,
+        args.binary,
+        args.seed,
+    )
+    try:
+        report = asyncio.run(run_bench(config, server_pid))
+    finally:
+        if server is not None:
+            server.stop()
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report.summary(), indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
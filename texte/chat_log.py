@@ -0,0 +1,970 @@
+"""Model/view chat log that lays out and paints only the message rows on screen."""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from texte.client_support import entry_bool, entry_int, entry_strings, entry_text
+from texte.message_store import MessageStore
+from texte.protocol import parse_display_message
+from texte.themes import THEMES, ThemePalette
+from texte.widgets import SmoothListView, emoji_font
+
+ENTRY_ROLE = QtCore.Qt.ItemDataRole.UserRole + 1
+CONTEXT_REACTIONS = ("👍", "❤", "😂", "😮", "😢", "👎")
+
+ROW_TOP = 18
+AVATAR_SIZE = 24
+AVATAR_GUTTER = 32
+SENDER_INSET = 36
+BADGE_SIZE = QtCore.QSize(40, 44)
+MEDIA_MAX_WIDTH = 420
+MEDIA_MAX_HEIGHT = 320
+MEDIA_MIN_SIZE = QtCore.QSize(220, 150)
+FILE_CARD_MIN_WIDTH = 220
+MODEL_CACHE_SIZE = 8
+HISTORY_PAGE_SIZE = 100
+# Older history loads once the view is scrolled within this many pixels of the top.
+OLDER_PAGE_MARGIN = 240
+HIGHLIGHT_MS = 1600
+TEXT_FLAGS = QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.TextFlag.TextWordWrap
+
+MESSAGE = "message"
+MEDIA = "media"
+THREAD = "thread"
+
+
+def bubble_width(viewport_width: int) -> int:
+    if viewport_width <= 0:
+        return 620
+    return max(180, min(520, int(viewport_width * 0.58)))
+
+
+def avatar_text(name: str) -> str:
+    stripped = name.strip()
+    return "#" if stripped == "ALL" else (stripped[:1].upper() or "?")
+
+
+@dataclass(frozen=True, slots=True)
+class MessageRow:
+    """Display fields for one history entry, derived once per row."""
+
+    entry: dict[str, object]
+    entry_type: str
+    kind: str
+    sender: str
+    body: str
+    time: str
+    show_sender: bool
+    grouped: bool
+
+
+@dataclass(slots=True)
+class RowGeometry:
+    """Row-relative rectangles shared by sizing, painting, and hit testing."""
+
+    height: int
+    card: QtCore.QRect
+    text: QtCore.QRect
+    sender: QtCore.QRect | None = None
+    avatar: QtCore.QRect | None = None
+    meta: QtCore.QRect | None = None
+    badge: QtCore.QRect | None = None
+    image: QtCore.QRect | None = None
+    chips: list[QtCore.QRect] = field(default_factory=list)
+    thread: QtCore.QRect | None = None
+
+
+def _row_identity(entry: dict[str, object]) -> tuple[str, str, str, str, str]:
+    entry_type = entry_text(entry, "type", "text")
+    if entry_type == "media":
+        kind = "outgoing" if entry_bool(entry, "outgoing") else "incoming"
+        return entry_type, kind, entry_text(entry, "sender"), entry_text(entry, "caption"), ""
+    if entry_type == "file":
+        return (
+            entry_type,
+            "incoming",
+            entry_text(entry, "sender"),
+            entry_text(entry, "filename"),
+            "",
+        )
+    kind = entry_text(entry, "kind", "incoming")
+    details = parse_display_message(entry_text(entry, "text"), kind, entry_text(entry, "time"))
+    return (
+        "text",
+        kind,
+        details["sender"] or "",
+        details["body"] or "",
+        details["time"] or "",
+    )
+
+
+class ChatMessageModel(QtCore.QAbstractListModel):
+    """One conversation's history list exposed as list rows.
+
+    The model reads the client's history list in place; callers append to that
+    list and then call `sync` so views only insert the new rows. Only the newest
+    page is exposed at first; `load_older` prepends earlier pages on demand,
+    reading stored entries from `store` once the in-memory list runs out.
+    Cached rows and heights are keyed by `row_key`, which prepends do not shift.
+    """
+
+    def __init__(
+        self,
+        conversation: str,
+        entries: list[dict[str, object]],
+        parent: QtCore.QObject | None = None,
+        page_size: int = HISTORY_PAGE_SIZE,
+        store: MessageStore | None = None,
+    ) -> None:
+        super().__init__(parent)
+        self.conversation = conversation
+        self.entries = entries
+        self.page_size = page_size
+        self.store = store
+        self.exhausted = store is None
+        self.base = 0
+        self.first = 0
+        self.end = len(entries)
+        self.heights: dict[int, tuple[int, int]] = {}
+        # Scrollbar value to restore when the view shows this model again; None follows the bottom.
+        self.scroll_value: int | None = None
+        self._rows: dict[int, MessageRow] = {}
+        if len(entries) < page_size:
+            self._prepend_stored(page_size - len(entries))
+        self.first = max(0, self.end - page_size)
+
+    def rowCount(self, parent: QtCore.QModelIndex | None = None) -> int:
+        return 0 if parent is not None and parent.isValid() else self.end - self.first
+
+    def data(
+        self,
+        index: QtCore.QModelIndex,
+        role: int = QtCore.Qt.ItemDataRole.DisplayRole,
+    ) -> object:
+        if not index.isValid() or not 0 <= index.row() < self.rowCount():
+            return None
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.message_row(index.row()).body
+        if role == ENTRY_ROLE:
+            return self.entries[self.first + index.row()]
+        return None
+
+    def sync(self) -> int:
+        """Insert rows for entries appended to the history list since the last sync."""
+        added = len(self.entries) - self.end
+        if added <= 0:
+            return 0
+        first_row = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + added - 1)
+        self.end = len(self.entries)
+        self.endInsertRows()
+        return added
+
+    def has_older(self) -> bool:
+        return self.first > 0 or not self.exhausted
+
+    def load_older(self) -> int:
+        """Prepend the previous page of history and return how many rows it added."""
+        if self.first == 0 and not self.exhausted:
+            self._prepend_stored(self.page_size)
+        added = min(self.first, self.page_size)
+        if added <= 0:
+            return 0
+        self.beginInsertRows(QtCore.QModelIndex(), 0, added - 1)
+        self.first -= added
+        self.endInsertRows()
+        return added
+
+    def reveal(self, entry_id: int) -> int | None:
+        """Expose rows back to the stored entry `entry_id` and return its row."""
+        position = self._position_of(entry_id)
+        if position is None and self.store is not None:
+            older = self.store.since(
+                self.conversation, entry_id, self.entries[0] if self.entries else None
+            )
+            self._prepend(older)
+            position = self._position_of(entry_id)
+        if position is None:
+            return None
+        if position < self.first:
+            self.beginInsertRows(QtCore.QModelIndex(), 0, self.first - position - 1)
+            self.first = position
+            self.endInsertRows()
+        return position - self.first
+
+    def trim(self, rows: int) -> int:
+        """Drop entries older than the newest `rows`, leaving them to be paged back from `store`.
+
+        Exposed rows that are dropped are removed from the model. Returns how many
+        entries were dropped.
+        """
+        start = max(0, self.end - rows)
+        if self.store is None or start == 0:
+            return 0
+        removed_rows = start - self.first
+        if removed_rows > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, removed_rows - 1)
+        del self.entries[:start]
+        self.base -= start
+        self.first = max(0, self.first - start)
+        self.end -= start
+        if removed_rows > 0:
+            self.endRemoveRows()
+        self.exhausted = False
+        # Row keys survive the drop; only keys of the dropped entries go stale.
+        self._rows = {key: row for key, row in self._rows.items() if key >= -self.base}
+        self.heights = {key: height for key, height in self.heights.items() if key >= -self.base}
+        return start
+
+    def row_key(self, row: int) -> int:
+        return self.first + row - self.base
+
+    def entry_changed(self, entry: dict[str, object]) -> None:
+        for position in range(self.end - 1, self.first - 1, -1):
+            if self.entries[position] is entry:
+                self._rows.pop(position - self.base, None)
+                self.heights.pop(position - self.base, None)
+                index = self.index(position - self.first)
+                self.dataChanged.emit(index, index)
+                return
+
+    def message_row(self, row: int) -> MessageRow:
+        key = self.row_key(row)
+        cached = self._rows.get(key)
+        if cached is not None:
+            return cached
+        position = self.first + row
+        entry = self.entries[position]
+        entry_type, kind, sender, body, time_text = _row_identity(entry)
+        grouped = False
+        if position > 0 and kind in {"incoming", "outgoing"}:
+            _type, previous_kind, previous_sender, _body, _time = _row_identity(
+                self.entries[position - 1]
+            )
+            grouped = previous_kind == kind and previous_sender == sender
+        cached = MessageRow(
+            entry=entry,
+            entry_type=entry_type,
+            kind=kind,
+            sender=sender,
+            body=body,
+            time=time_text,
+            show_sender=kind == "incoming" and self.conversation == "ALL",
+            grouped=grouped,
+        )
+        self._rows[key] = cached
+        return cached
+
+    def _position_of(self, entry_id: int) -> int | None:
+        for position in range(self.end - 1, -1, -1):
+            if self.entries[position].get("id") == entry_id:
+                return position
+        return None
+
+    def _prepend_stored(self, limit: int) -> None:
+        if self.store is None:
+            return
+        older = self.store.page(self.conversation, self.entries[0] if self.entries else None, limit)
+        if len(older) < limit:
+            self.exhausted = True
+        self._prepend(older)
+
+    def _prepend(self, older: list[dict[str, object]]) -> None:
+        # Stored entries join the list ahead of the exposed rows, so no rows are inserted yet.
+        self.entries[0:0] = older
+        self.base += len(older)
+        self.first += len(older)
+        self.end += len(older)
+
+
+class ChatModelCache:
+    """Most recently viewed conversation models, evicting the least recent past capacity.
+
+    A cached model keeps its derived rows, measured heights, and scroll position,
+    so switching back to it only inserts the entries that arrived meanwhile. With
+    a message store, models page older history from disk, and `trim` and eviction
+    cut history lists back to what their views show.
+    """
+
+    def __init__(
+        self,
+        history: dict[str, list[dict[str, object]]],
+        parent: QtCore.QObject | None = None,
+        capacity: int = MODEL_CACHE_SIZE,
+    ) -> None:
+        self.history = history
+        self.parent = parent
+        self.capacity = capacity
+        self.store: MessageStore | None = None
+        self._models: OrderedDict[str, ChatMessageModel] = OrderedDict()
+
+    def __contains__(self, conversation: str) -> bool:
+        return conversation in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get(self, conversation: str) -> ChatMessageModel:
+        model = self._models.get(conversation)
+        if model is None:
+            entries = self.history.setdefault(conversation, [])
+            model = ChatMessageModel(conversation, entries, self.parent, store=self.store)
+            self._models[conversation] = model
+            while len(self._models) > self.capacity:
+                _name, evicted = self._models.popitem(last=False)
+                self._release(evicted)
+        else:
+            self._models.move_to_end(conversation)
+            model.sync()
+        return model
+
+    def trim(self, active: ChatMessageModel | None = None, following: bool = True) -> None:
+        """Drop stored history from memory once the message store has written it.
+
+        Conversations without a model keep one page. A model keeps one page while
+        its view follows the newest row and every exposed row once scrolled up;
+        `following` tells whether the view showing `active` is at the bottom.
+        """
+        if self.store is None:
+            return
+        for conversation, entries in self.history.items():
+            model = self._models.get(conversation)
+            if model is None:
+                del entries[:-HISTORY_PAGE_SIZE]
+                continue
+            follows = following if model is active else model.scroll_value is None
+            model.trim(model.page_size if follows else model.rowCount())
+
+    def clear(self) -> None:
+        while self._models:
+            _name, model = self._models.popitem(last=False)
+            self._release(model)
+
+    def _release(self, model: ChatMessageModel) -> None:
+        if self.store is not None:
+            del model.entries[: -model.page_size]
+        # A parentless model belongs to its Python wrapper and goes with the last reference.
+        if model.parent() is not None:
+            model.deleteLater()
+
+
+@dataclass(frozen=True, slots=True)
+class RowFonts:
+    body: QtGui.QFont
+    sender: QtGui.QFont
+    meta: QtGui.QFont
+    avatar: QtGui.QFont
+    title: QtGui.QFont
+    small: QtGui.QFont
+    thread: QtGui.QFont
+    badge: QtGui.QFont
+
+
+def _sized_font(base: QtGui.QFont, point_size: float, weight: QtGui.QFont.Weight) -> QtGui.QFont:
+    font = QtGui.QFont(base)
+    font.setPointSizeF(point_size)
+    font.setWeight(weight)
+    return font
+
+
+class ChatMessageDelegate(QtWidgets.QStyledItemDelegate):
+    """Paint bubbles, file cards, and media cards straight from the model rows."""
+
+    def __init__(self, view: QtWidgets.QListView) -> None:
+        super().__init__(view)
+        self.view = view
+        self.palette: ThemePalette = THEMES["Light"]
+        # Entry outlined after a jump from search; held by identity so prepends do not move it.
+        self.highlighted: dict[str, object] | None = None
+        self._fonts: RowFonts | None = None
+        self._font_key = ""
+        self._image_sizes: dict[str, QtCore.QSize] = {}
+
+    def sizeHint(
+        self,
+        option: QtWidgets.QStyleOptionViewItem,
+        index: QtCore.QModelIndex,
+    ) -> QtCore.QSize:
+        model = index.model()
+        if not isinstance(model, ChatMessageModel):
+            return super().sizeHint(option, index)
+        width = self.row_width()
+        key = model.row_key(index.row())
+        cached = model.heights.get(key)
+        if cached is not None and cached[0] == width:
+            return QtCore.QSize(0, cached[1])
+        height = self.geometry(model.message_row(index.row()), width).height
+        model.heights[key] = (width, height)
+        return QtCore.QSize(0, height)
+
+    def paint(
+        self,
+        painter: QtGui.QPainter | None,
+        option: QtWidgets.QStyleOptionViewItem,
+        index: QtCore.QModelIndex,
+    ) -> None:
+        model = index.model()
+        if painter is None or not isinstance(model, ChatMessageModel):
+            return
+        row = model.message_row(index.row())
+        geometry = self.geometry(row, option.rect.width())
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+        painter.translate(option.rect.topLeft())
+        if row.entry_type == "file":
+            self._paint_file(painter, row, geometry)
+        elif row.entry_type == "media":
+            self._paint_media(painter, row, geometry)
+        else:
+            self._paint_text(painter, row, geometry)
+        if row.entry is self.highlighted:
+            painter.setPen(QtGui.QPen(QtGui.QColor(self.palette.accent_blue), 2))
+            painter.setBrush(QtCore.Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(QtCore.QRectF(geometry.card).adjusted(-2, -2, 2, 2), 20, 20)
+        painter.restore()
+
+    def row_width(self) -> int:
+        viewport = self.view.viewport()
+        width = viewport.width() if viewport is not None else 0
+        return max(0, width - 2 * self.view.spacing())
+
+    def hit(self, row: MessageRow, width: int, pos: QtCore.QPoint) -> tuple[str, QtCore.QRect]:
+        geometry = self.geometry(row, width)
+        if geometry.image is not None and geometry.image.contains(pos):
+            return MEDIA, geometry.image
+        if geometry.thread is not None and geometry.thread.contains(pos):
+            return THREAD, geometry.thread
+        if row.entry_type == "text" and geometry.card.contains(pos):
+            return MESSAGE, geometry.card
+        return "", QtCore.QRect()
+
+    def geometry(self, row: MessageRow, width: int) -> RowGeometry:
+        if row.entry_type == "file":
+            return self._file_geometry(row, width)
+        if row.entry_type == "media":
+            return self._media_geometry(row, width)
+        return self._text_geometry(row, width)
+
+    def fonts(self) -> RowFonts:
+        base = self.view.font()
+        if self._fonts is None or base.key() != self._font_key:
+            weight = QtGui.QFont.Weight
+            self._font_key = base.key()
+            self._fonts = RowFonts(
+                body=base,
+                sender=_sized_font(base, 7.5, weight.DemiBold),
+                meta=_sized_font(base, 7, weight.Normal),
+                avatar=_sized_font(base, 8.5, weight.Bold),
+                title=_sized_font(base, base.pointSizeF(), weight.Bold),
+                small=_sized_font(base, 8, weight.Normal),
+                thread=_sized_font(base, 8, weight.Bold),
+                badge=emoji_font(12),
+            )
+        return self._fonts
+
+    def thumbnail_size(self, path: str, max_width: int) -> QtCore.QSize:
+        source = self._image_sizes.get(path)
+        if source is None:
+            reader = QtGui.QImageReader(path)
+            source = reader.size()
+            if (
+                reader.transformation()
+                & QtGui.QImageIOHandler.Transformation.TransformationRotate90
+            ):
+                source = source.transposed()
+            self._image_sizes[path] = source
+        if not source.isValid():
+            return QtCore.QSize()
+        return source.scaled(
+            QtCore.QSize(max_width, MEDIA_MAX_HEIGHT),
+            QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+        )
+
+    def thumbnail(self, path: str, size: QtCore.QSize) -> QtGui.QPixmap | None:
+        key = f"texte-thumbnail:{path}:{size.width()}x{size.height()}"
+        cached = QtGui.QPixmapCache.find(key)
+        if cached is not None:
+            return cached
+        reader = QtGui.QImageReader(path)
+        reader.setAutoTransform(True)
+        rotated = (
+            reader.transformation() & QtGui.QImageIOHandler.Transformation.TransformationRotate90
+        )
+        # Decode straight to the thumbnail size instead of scaling a full-size image.
+        reader.setScaledSize(size.transposed() if rotated else size)
+        image = reader.read()
+        if image.isNull():
+            return None
+        pixmap = QtGui.QPixmap.fromImage(image)
+        QtGui.QPixmapCache.insert(key, pixmap)
+        return pixmap
+
+    def _avatar_rect(self, row: MessageRow, card: QtCore.QRect) -> QtCore.QRect | None:
+        if not row.show_sender or row.grouped:
+            return None
+        return QtCore.QRect(0, card.bottom() + 1 - AVATAR_SIZE, AVATAR_SIZE, AVATAR_SIZE)
+
+    def _sender_rect(self, row: MessageRow, y: int, width: int) -> QtCore.QRect | None:
+        if not row.show_sender or row.grouped or not row.sender:
+            return None
+        height = QtGui.QFontMetrics(self.fonts().sender).height()
+        return QtCore.QRect(SENDER_INSET, y, max(0, width - SENDER_INSET), height)
+
+    def _text_geometry(self, row: MessageRow, width: int) -> RowGeometry:
+        fonts = self.fonts()
+        pad_x, pad_y = (12, 6) if row.kind == "system" else (12, 8)
+        y = ROW_TOP
+        sender = self._sender_rect(row, y, width)
+        if sender is not None:
+            y += sender.height() + 2
+        text_size = (
+            QtGui.QFontMetrics(fonts.body)
+            .boundingRect(
+                QtCore.QRect(0, 0, bubble_width(width) - 2 * pad_x, 1_000_000),
+                TEXT_FLAGS,
+                row.body or " ",
+            )
+            .size()
+        )
+        card_size = text_size.grownBy(QtCore.QMargins(pad_x, pad_y, pad_x, pad_y))
+        if row.kind == "outgoing":
+            x = width - card_size.width()
+        elif row.kind == "system":
+            x = (width - card_size.width()) // 2
+        else:
+            x = AVATAR_GUTTER if row.show_sender else 0
+        card = QtCore.QRect(QtCore.QPoint(x, y), card_size)
+        text = QtCore.QRect(QtCore.QPoint(x + pad_x, y + pad_y), text_size)
+        y = card.bottom() + 3
+        meta = None
+        if row.kind == "outgoing" or (row.kind == "system" and row.time):
+            meta = QtCore.QRect(0, y, width, QtGui.QFontMetrics(fonts.meta).height())
+            y = meta.bottom() + 1
+        badge = None
+        if entry_strings(row.entry, "reactions"):
+            badge = QtCore.QRect(
+                QtCore.QPoint(
+                    card.right() + 1 - int(BADGE_SIZE.width() * 1.22),
+                    max(0, card.top() - int(BADGE_SIZE.height() * 0.62)),
+                ),
+                BADGE_SIZE,
+            )
+        return RowGeometry(
+            height=y + 8,
+            card=card,
+            text=text,
+            sender=sender,
+            avatar=self._avatar_rect(row, card),
+            meta=meta,
+            badge=badge,
+        )
+
+    def _file_geometry(self, row: MessageRow, width: int) -> RowGeometry:
+        fonts = self.fonts()
+        title_metrics = QtGui.QFontMetrics(fonts.title)
+        subtitle_metrics = QtGui.QFontMetrics(fonts.small)
+        content_width = max(
+            title_metrics.horizontalAdvance(row.body),
+            subtitle_metrics.horizontalAdvance(_file_subtitle(row)),
+        )
+        card_width = min(max(FILE_CARD_MIN_WIDTH, content_width + 26), max(0, width))
+        card_height = 10 + title_metrics.height() + 2 + subtitle_metrics.height() + 10
+        card = QtCore.QRect((width - card_width) // 2, 5, card_width, card_height)
+        text = QtCore.QRect(card.x() + 12, card.y() + 10, card_width - 24, title_metrics.height())
+        meta = QtCore.QRect(text.x(), text.bottom() + 3, text.width(), subtitle_metrics.height())
+        return RowGeometry(height=card_height + 14, card=card, text=text, meta=meta)
+
+    def _media_geometry(self, row: MessageRow, width: int) -> RowGeometry:
+        fonts = self.fonts()
+        y = 6
+        sender = self._sender_rect(row, y, width)
+        if sender is not None:
+            y += sender.height() + 2
+        preview_width = min(bubble_width(width), MEDIA_MAX_WIDTH)
+        thumbnail = self.thumbnail_size(entry_text(row.entry, "path"), preview_width)
+        image_size = thumbnail.expandedTo(MEDIA_MIN_SIZE)
+        image_size.setWidth(min(image_size.width(), max(preview_width, MEDIA_MIN_SIZE.width())))
+        caption_height = (
+            QtGui.QFontMetrics(fonts.body)
+            .boundingRect(
+                QtCore.QRect(0, 0, image_size.width(), 1_000_000), TEXT_FLAGS, row.body or " "
+            )
+            .height()
+        )
+        outgoing = row.kind == "outgoing"
+        card_size = QtCore.QSize(
+            image_size.width() + 20, 10 + image_size.height() + 8 + caption_height + 10
+        )
+        x = width - card_size.width() if outgoing else (AVATAR_GUTTER if row.show_sender else 0)
+        card = QtCore.QRect(QtCore.QPoint(x, y), card_size)
+        image = QtCore.QRect(QtCore.QPoint(x + 10, y + 10), image_size)
+        text = QtCore.QRect(x + 10, image.bottom() + 9, image_size.width(), caption_height)
+        y = card.bottom() + 3
+
+        chips: list[QtCore.QRect] = []
+        reactions = entry_strings(row.entry, "reactions")
+        if reactions:
+            chip_metrics = QtGui.QFontMetrics(fonts.small)
+            chip_height = chip_metrics.height() + 8
+            widths = [chip_metrics.horizontalAdvance(reaction) + 18 for reaction in reactions]
+            chip_x = width - 4 - sum(widths) - 6 * (len(widths) - 1) if outgoing else 34
+            for chip_width in widths:
+                chips.append(QtCore.QRect(chip_x, y, chip_width, chip_height))
+                chip_x += chip_width + 6
+            y += chip_height + 2
+
+        thread = None
+        thread_label = entry_text(row.entry, "thread_label")
+        if thread_label:
+            thread_metrics = QtGui.QFontMetrics(fonts.thread)
+            thread_width = thread_metrics.horizontalAdvance(thread_label) + 4
+            thread = QtCore.QRect(
+                width - thread_width if outgoing else 0,
+                y,
+                thread_width,
+                thread_metrics.height() + 4,
+            )
+            y = thread.bottom() + 3
+
+        return RowGeometry(
+            height=y + 12,
+            card=card,
+            text=text,
+            sender=sender,
+            avatar=self._avatar_rect(row, card),
+            image=image,
+            chips=chips,
+            thread=thread,
+        )
+
+    def _paint_header(
+        self, painter: QtGui.QPainter, row: MessageRow, geometry: RowGeometry
+    ) -> None:
+        palette = self.palette
+        fonts = self.fonts()
+        if geometry.sender is not None:
+            painter.setFont(fonts.sender)
+            painter.setPen(QtGui.QColor(palette.secondary_text))
+            painter.drawText(
+                geometry.sender,
+                QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter,
+                row.sender,
+            )
+        if geometry.avatar is not None:
+            fill = palette.system_bubble if row.entry_type == "media" else palette.incoming_bubble
+            painter.setPen(QtCore.Qt.PenStyle.NoPen)
+            painter.setBrush(QtGui.QColor(fill))
+            painter.drawEllipse(geometry.avatar)
+            painter.setFont(fonts.avatar)
+            painter.setPen(QtGui.QColor(palette.primary_text))
+            painter.drawText(
+                geometry.avatar, QtCore.Qt.AlignmentFlag.AlignCenter, avatar_text(row.sender)
+            )
+
+    def _paint_text(self, painter: QtGui.QPainter, row: MessageRow, geometry: RowGeometry) -> None:
+        palette = self.palette
+        fonts = self.fonts()
+        self._paint_header(painter, row, geometry)
+        if row.kind == "system":
+            fill, color, radius = palette.glass_fill, palette.primary_text, 12.0
+        elif row.kind == "outgoing":
+            fill, color, radius = palette.outgoing_bubble, "#FFFFFF", 17.0
+        else:
+            fill, color, radius = palette.incoming_bubble, palette.primary_text, 17.0
+        painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        painter.setBrush(QtGui.QColor(fill))
+        painter.drawRoundedRect(QtCore.QRectF(geometry.card), radius, radius)
+        painter.setFont(fonts.body)
+        painter.setPen(QtGui.QColor(color))
+        painter.drawText(geometry.text, TEXT_FLAGS, row.body)
+
+        if geometry.meta is not None:
+            painter.setFont(fonts.meta)
+            painter.setPen(QtGui.QColor(palette.secondary_text))
+            if row.kind == "outgoing":
+                align = QtCore.Qt.AlignmentFlag.AlignRight
+                meta_text = "Read"
+            else:
+                align = QtCore.Qt.AlignmentFlag.AlignHCenter
+                meta_text = row.time
+            painter.drawText(geometry.meta, align | QtCore.Qt.AlignmentFlag.AlignTop, meta_text)
+
+        if geometry.badge is not None:
+            painter.setFont(fonts.badge)
+            painter.setPen(QtGui.QColor(palette.primary_text))
+            painter.drawText(
+                geometry.badge,
+                QtCore.Qt.AlignmentFlag.AlignCenter,
+                entry_strings(row.entry, "reactions")[0],
+            )
+
+    def _paint_file(self, painter: QtGui.QPainter, row: MessageRow, geometry: RowGeometry) -> None:
+        palette = self.palette
+        fonts = self.fonts()
+        painter.setPen(QtGui.QPen(QtGui.QColor(palette.glass_border), 1))
+        painter.setBrush(QtGui.QColor(palette.system_bubble))
+        painter.drawRoundedRect(QtCore.QRectF(geometry.card).adjusted(0.5, 0.5, -0.5, -0.5), 16, 16)
+        painter.setFont(fonts.title)
+        painter.setPen(QtGui.QColor(palette.primary_text))
+        title = QtGui.QFontMetrics(fonts.title).elidedText(
+            row.body, QtCore.Qt.TextElideMode.ElideMiddle, geometry.text.width()
+        )
+        painter.drawText(geometry.text, QtCore.Qt.AlignmentFlag.AlignLeft, title)
+        if geometry.meta is not None:
+            painter.setFont(fonts.small)
+            painter.setPen(QtGui.QColor(palette.secondary_text))
+            painter.drawText(geometry.meta, QtCore.Qt.AlignmentFlag.AlignLeft, _file_subtitle(row))
+
+    def _paint_media(self, painter: QtGui.QPainter, row: MessageRow, geometry: RowGeometry) -> None:
+        palette = self.palette
+        fonts = self.fonts()
+        outgoing = row.kind == "outgoing"
+        self._paint_header(painter, row, geometry)
+        if outgoing:
+            painter.setPen(QtCore.Qt.PenStyle.NoPen)
+            painter.setBrush(QtGui.QColor(palette.outgoing_bubble))
+        else:
+            painter.setPen(QtGui.QPen(QtGui.QColor(palette.glass_border), 1))
+            painter.setBrush(QtGui.QColor(palette.system_bubble))
+        painter.drawRoundedRect(QtCore.QRectF(geometry.card).adjusted(0.5, 0.5, -0.5, -0.5), 18, 18)
+
+        if geometry.image is not None:
+            image_path = QtGui.QPainterPath()
+            image_path.addRoundedRect(QtCore.QRectF(geometry.image), 14, 14)
+            painter.fillPath(image_path, QtGui.QColor(palette.glass_fill))
+            size = self.thumbnail_size(entry_text(row.entry, "path"), geometry.image.width())
+            pixmap = self.thumbnail(entry_text(row.entry, "path"), size) if size.isValid() else None
+            if pixmap is not None:
+                target = QtCore.QRect(QtCore.QPoint(0, 0), pixmap.size())
+                target.moveCenter(geometry.image.center())
+                painter.save()
+                painter.setClipPath(image_path)
+                painter.drawPixmap(target, pixmap)
+                painter.restore()
+
+        painter.setFont(fonts.body)
+        painter.setPen(QtGui.QColor("#FFFFFF" if outgoing else palette.primary_text))
+        painter.drawText(geometry.text, TEXT_FLAGS, row.body)
+
+        painter.setFont(fonts.small)
+        for chip, reaction in zip(geometry.chips, entry_strings(row.entry, "reactions")):
+            painter.setPen(QtGui.QPen(QtGui.QColor(palette.glass_border), 1))
+            painter.setBrush(QtGui.QColor(palette.app_background))
+            painter.drawRoundedRect(QtCore.QRectF(chip).adjusted(0.5, 0.5, -0.5, -0.5), 12, 12)
+            painter.setPen(QtGui.QColor(palette.primary_text))
+            painter.drawText(chip, QtCore.Qt.AlignmentFlag.AlignCenter, reaction)
+
+        if geometry.thread is not None:
+            painter.setFont(fonts.thread)
+            painter.setPen(QtGui.QColor(palette.accent_blue_dark))
+            painter.drawText(
+                geometry.thread,
+                QtCore.Qt.AlignmentFlag.AlignCenter,
+                entry_text(row.entry, "thread_label"),
+            )
+
+
+def _file_subtitle(row: MessageRow) -> str:
+    return f"{row.sender} sent {entry_int(row.entry, 'byte_count')} bytes"
+
+
+class ChatLogView(SmoothListView):
+    """Chat transcript whose rows are painted by ChatMessageDelegate."""
+
+    messageClicked = QtCore.pyqtSignal(QtCore.QModelIndex, QtCore.QRect)
+    mediaClicked = QtCore.pyqtSignal(QtCore.QModelIndex)
+    threadClicked = QtCore.pyqtSignal(QtCore.QModelIndex)
+    reactionChosen = QtCore.pyqtSignal(QtCore.QModelIndex, str)
+
+    def __init__(self, parent: QtWidgets.QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.message_delegate = ChatMessageDelegate(self)
+        self.setItemDelegate(self.message_delegate)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setResizeMode(QtWidgets.QListView.ResizeMode.Adjust)
+        self.setMouseTracking(True)
+        self._older_pending = False
+        self.highlight_timer = QtCore.QTimer(self)
+        self.highlight_timer.setSingleShot(True)
+        self.highlight_timer.setInterval(HIGHLIGHT_MS)
+        self.highlight_timer.timeout.connect(self.clear_highlight)
+        scrollbar = self.verticalScrollBar()
+        assert scrollbar is not None
+        scrollbar.valueChanged.connect(self._schedule_older_page)
+        scrollbar.rangeChanged.connect(self._schedule_older_page)
+
+    def set_palette(self, palette: ThemePalette) -> None:
+        self.message_delegate.palette = palette
+        viewport = self.viewport()
+        if viewport is not None:
+            viewport.update()
+
+    def show_model(self, model: ChatMessageModel) -> None:
+        """Swap in another conversation's model, keeping each model's scroll position."""
+        scrollbar = self.verticalScrollBar()
+        assert scrollbar is not None
+        current = self.message_model()
+        if current is model:
+            return
+        if current is not None:
+            current.scroll_value = None if self.at_bottom() else scrollbar.value()
+        selection = self.selectionModel()
+        self.setModel(model)
+        if selection is not None:
+            selection.deleteLater()
+        if model.scroll_value is None:
+            self.scrollToBottom()
+        else:
+            self.executeDelayedItemsLayout()
+            scrollbar.setValue(model.scroll_value)
+
+    def at_bottom(self) -> bool:
+        scrollbar = self.verticalScrollBar()
+        return scrollbar is None or scrollbar.value() >= scrollbar.maximum()
+
+    def load_older_page(self) -> int:
+        """Prepend older rows and shift the scrollbar so the visible rows stay put."""
+        model = self.message_model()
+        scrollbar = self.verticalScrollBar()
+        assert scrollbar is not None
+        if model is None or not model.has_older():
+            return 0
+        animating = self.wheel_animation.state() == QtCore.QAbstractAnimation.State.Running
+        target = self.wheel_animation.endValue()
+        self.wheel_animation.stop()
+        previous_maximum = scrollbar.maximum()
+        previous_value = scrollbar.value()
+        added = model.load_older()
+        self.executeDelayedItemsLayout()
+        shift = scrollbar.maximum() - previous_maximum
+        scrollbar.setValue(previous_value + shift)
+        if animating and isinstance(target, int):
+            self.wheel_animation.setStartValue(scrollbar.value())
+            self.wheel_animation.setEndValue(target + shift)
+            self.wheel_animation.start()
+        return added
+
+    def highlight_row(self, row: int) -> None:
+        """Centre a row in the view and outline it until the highlight times out."""
+        model = self.message_model()
+        if model is None or not 0 <= row < model.rowCount():
+            return
+        self.wheel_animation.stop()
+        self.message_delegate.highlighted = model.message_row(row).entry
+        self.executeDelayedItemsLayout()
+        self.scrollTo(model.index(row), QtWidgets.QAbstractItemView.ScrollHint.PositionAtCenter)
+        self.highlight_timer.start()
+        viewport = self.viewport()
+        if viewport is not None:
+            viewport.update()
+
+    def clear_highlight(self) -> None:
+        self.message_delegate.highlighted = None
+        viewport = self.viewport()
+        if viewport is not None:
+            viewport.update()
+
+    def _schedule_older_page(self, *_args: int) -> None:
+        scrollbar = self.verticalScrollBar()
+        model = self.message_model()
+        if self._older_pending or scrollbar is None or model is None or not model.has_older():
+            return
+        if not self.isVisible():
+            return
+        if scrollbar.value() > OLDER_PAGE_MARGIN:
+            return
+        # Defer the insert so it never runs inside the layout pass that emitted this signal.
+        self._older_pending = True
+        QtCore.QTimer.singleShot(0, self._load_scheduled_page)
+
+    def _load_scheduled_page(self) -> None:
+        self._older_pending = False
+        scrollbar = self.verticalScrollBar()
+        if scrollbar is not None and scrollbar.value() <= OLDER_PAGE_MARGIN:
+            self.load_older_page()
+
+    def message_model(self) -> ChatMessageModel | None:
+        model = self.model()
+        return model if isinstance(model, ChatMessageModel) else None
+
+    def hit_test(self, pos: QtCore.QPoint) -> tuple[QtCore.QModelIndex, str, QtCore.QRect]:
+        """Return the row under a viewport point, the region hit, and its global rect."""
+        index = self.indexAt(pos)
+        model = self.message_model()
+        if not index.isValid() or model is None:
+            return index, "", QtCore.QRect()
+        row_rect = self.visualRect(index)
+        region, rect = self.message_delegate.hit(
+            model.message_row(index.row()), row_rect.width(), pos - row_rect.topLeft()
+        )
+        viewport = self.viewport()
+        if not region or viewport is None:
+            return index, "", QtCore.QRect()
+        global_rect = QtCore.QRect(
+            viewport.mapToGlobal(rect.topLeft() + row_rect.topLeft()), rect.size()
+        )
+        return index, region, global_rect
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent | None) -> None:
+        if event is None or event.button() != QtCore.Qt.MouseButton.LeftButton:
+            super().mouseReleaseEvent(event)
+            return
+        index, region, rect = self.hit_test(event.position().toPoint())
+        if region == MESSAGE:
+            self.messageClicked.emit(index, rect)
+        elif region == MEDIA:
+            self.mediaClicked.emit(index)
+        elif region == THREAD:
+            self.threadClicked.emit(index)
+        else:
+            super().mouseReleaseEvent(event)
+            return
+        event.accept()
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent | None) -> None:
+        super().mouseMoveEvent(event)
+        viewport = self.viewport()
+        if event is None or viewport is None:
+            return
+        _index, region, _rect = self.hit_test(event.position().toPoint())
+        if region in {MEDIA, THREAD}:
+            viewport.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
+        else:
+            viewport.unsetCursor()
+
+    def contextMenuEvent(self, event: QtGui.QContextMenuEvent | None) -> None:
+        if event is None:
+            return
+        index, region, _rect = self.hit_test(event.pos())
+        model = self.message_model()
+        if region != MESSAGE or model is None:
+            return
+        body = model.message_row(index.row()).body
+
+        menu = QtWidgets.QMenu(self)
+        copy_action = menu.addAction("Copy")
+        assert copy_action is not None
+        copy_action.triggered.connect(lambda: _copy_to_clipboard(body))
+        menu.addSeparator()
+        react_menu = menu.addMenu("React")
+        assert react_menu is not None
+        persistent = QtCore.QPersistentModelIndex(index)
+        for emoji in CONTEXT_REACTIONS:
+            action = react_menu.addAction(emoji)
+            assert action is not None
+            action.triggered.connect(
+                lambda _checked=False, value=emoji: self.reactionChosen.emit(
+                    QtCore.QModelIndex(persistent), value
+                )
+            )
+        menu.exec(event.globalPos())
+
+
+def _copy_to_clipboard(text: str) -> None:
+    clipboard = QtGui.QGuiApplication.clipboard()
+    assert clipboard is not None
+    clipboard.setText(text)
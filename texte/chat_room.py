@@ -1,33 +1,102 @@
 """Shared registration and routing logic for Texte servers."""
 
-from collections.abc import Hashable
+from collections.abc import Callable, Hashable, Iterable
 from dataclasses import dataclass, field
+from itertools import count
+from typing import Protocol, TypeGuard
 
 from texte.protocol import (
     ALL,
+    CATCH_UP_SINCE,
     CONNECT,
     DISCONNECT,
     FILE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_END,
+    HISTORY,
+    MAX_FILE_BYTES,
     REGISTER,
     TO,
     UNREGISTER,
+    FileChunk,
+    FileDelivery,
+    FileMessage,
+    OutboundMessage,
     chat_line,
     command_payload,
+    command_tag,
     direct_chat_line,
     display_name,
     error_message,
+    file_begin_message,
+    file_end_message,
+    history_end_message,
+    joined_message,
+    left_message,
     parse_direct_message,
-    parse_file_message,
-    routed_file_message,
+    parse_encoded_file_chunk,
+    parse_encoded_file_message,
+    parse_file_begin,
+    parse_file_end,
+    parse_history_request,
+    routed_encoded_file_message,
+    routed_file_chunk_message,
+    sequenced_message,
     server_message,
     users_message,
 )
+from texte.room_history import HistoryLimits, RoomHistory, StoredLine
 
 
 @dataclass(frozen=True, slots=True)
 class Delivery:
     recipient: Hashable
-    message: str
+    outbound: OutboundMessage
+
+    @property
+    def message(self) -> str:
+        return self.outbound.text
+
+    @property
+    def frame(self) -> bytes:
+        return self.outbound.line_frame
+
+    @property
+    def binary_frame(self) -> bytes:
+        return self.outbound.binary_frame
+
+    @property
+    def compressed_frame(self) -> bytes:
+        return self.outbound.compressed_frame
+
+
+def deliveries_for(
+    recipients: Iterable[Hashable], message: str | OutboundMessage
+) -> list[Delivery]:
+    """Build deliveries that share one lazily encoded message across every recipient."""
+    outbound = message if isinstance(message, OutboundMessage) else OutboundMessage(message)
+    return [Delivery(recipient, outbound) for recipient in recipients]
+
+
+def is_udp_address(value: object) -> TypeGuard[tuple[str, int]]:
+    """Return whether a client id is a UDP ``(host, port)`` peer address."""
+    return (
+        isinstance(value, tuple)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and isinstance(value[1], int)
+    )
+
+
+@dataclass(slots=True)
+class Transfer:
+    """A chunked attachment being relayed from one sender to its recipients."""
+
+    routed_id: str
+    recipients: list[Hashable]
+    byte_count: int
+    received: int = 0
 
 
 @dataclass(slots=True)
@@ -37,47 +106,84 @@ class RoutingResult:
     close_connection: bool = False
 
 
+# A text command handler: client id, the whole message, and the peer's display label.
+CommandHandler = Callable[[Hashable, str, str], RoutingResult]
+
+
+class Room(Protocol):
+    """The routing calls a server connection makes; `ChatRoom` or a wrapper or proxy for one."""
+
+    def route(
+        self, client_id: Hashable, message: str | FileMessage | FileChunk, peer_name: str
+    ) -> RoutingResult: ...
+
+    def unregister(self, client_id: Hashable) -> RoutingResult: ...
+
+
 class ChatRoom:
-    """Track registered clients and route protocol messages."""
+    """Track registered clients, route protocol messages, and keep recent chat history.
+
+    Clients that have sent `{HISTORY}` receive chat lines as `{SEQ}` frames so
+    they can resume from the last sequence they saw; everyone else gets `{MSG}`.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, history_limits: HistoryLimits | None = None) -> None:
         self._clients: dict[Hashable, str] = {}
+        self._names: dict[str, Hashable] = {}
+        self._transfers: dict[Hashable, dict[str, Transfer]] = {}
+        self._transfer_ids = count(1)
+        self._sequenced: set[Hashable] = set()
+        # One id per sign-in, so direct-message history never outlives the user it belongs to.
+        self._readers: dict[Hashable, int] = {}
+        self._reader_ids = count(1)
+        self.history = RoomHistory(history_limits)
+        self._handlers: dict[str, CommandHandler] = {
+            CONNECT: lambda _client_id, _message, _peer_name: RoutingResult(),
+            DISCONNECT: lambda client_id, _message, _peer_name: self._disconnect(client_id),
+            REGISTER: self._register,
+            UNREGISTER: self._unregister,
+            ALL: self._broadcast,
+            TO: self._direct,
+            FILE: self._file,
+            FILE_CHUNK: lambda client_id, message, _peer_name: self._file_chunk(client_id, message),
+            FILE_BEGIN: self._file_begin,
+            FILE_END: lambda client_id, message, _peer_name: self._file_end(client_id, message),
+            HISTORY: lambda client_id, message, _peer_name: self._catch_up(client_id, message),
+        }
 
     @property
     def usernames(self) -> list[str]:
         return sorted(self._clients.values(), key=str.casefold)
 
-    def unregister(self, client_id: Hashable) -> RoutingResult:
-        removed = self._clients.pop(client_id, None)
-        if removed is None:
-            return RoutingResult()
-        return RoutingResult(deliveries=self._presence_deliveries())
-
-    def route(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
-        if message.startswith(CONNECT):
-            return RoutingResult()
-
-        if message.startswith(DISCONNECT):
-            result = self.unregister(client_id)
-            result.close_connection = True
-            return result
-
-        if message.startswith(REGISTER):
-            return self._register(client_id, message, peer_name)
+    def client_count(self) -> int:
+        return len(self._clients)
 
-        if message.startswith(UNREGISTER):
-            return self._unregister(client_id, message, peer_name)
+    def unregister(self, client_id: Hashable) -> RoutingResult:
+        deliveries = self._cancel_transfers(client_id)
+        self._sequenced.discard(client_id)
+        removed = self._remove_client(client_id)
+        if removed is not None:
+            deliveries.extend(self._presence_deliveries(left_message(removed)))
+        return RoutingResult(deliveries=deliveries)
 
-        if message.startswith(ALL):
-            return self._broadcast(client_id, message, peer_name)
+    def route(
+        self, client_id: Hashable, message: str | FileMessage | FileChunk, peer_name: str
+    ) -> RoutingResult:
+        if isinstance(message, FileMessage):
+            return self._route_file(client_id, message, peer_name)
 
-        if message.startswith(TO):
-            return self._direct(client_id, message, peer_name)
+        if isinstance(message, FileChunk):
+            return self._file_chunk(client_id, message)
 
-        if message.startswith(FILE):
-            return self._file(client_id, message, peer_name)
+        handler = self._handlers.get(command_tag(message))
+        if handler is None:
+            return RoutingResult()
+        return handler(client_id, message, peer_name)
 
-        return RoutingResult()
+    def _disconnect(self, client_id: Hashable) -> RoutingResult:
+        result = self.unregister(client_id)
+        result.close_connection = True
+        return result
 
     def _register(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
         name = display_name(message, REGISTER, peer_name)
@@ -88,15 +194,26 @@ class ChatRoom:
         if owner is not None and owner != client_id:
             return self._error(client_id, f"Username '{name}' is already signed in.")
 
-        self._clients[client_id] = name
-        deliveries = [Delivery(client_id, server_message(f"Welcome {name}!"))]
-        deliveries.extend(self._presence_deliveries())
+        previous = self._clients.get(client_id)
+        self._add_client(client_id, name)
+        deliveries = deliveries_for([client_id], server_message(f"Welcome {name}!"))
+        if previous is None:
+            deliveries.extend(deliveries_for([client_id], users_message(self.usernames)))
+            deliveries.extend(self._presence_deliveries(joined_message(name), skip=client_id))
+        elif previous != name:
+            deliveries.extend(self._presence_deliveries(left_message(previous)))
+            deliveries.extend(self._presence_deliveries(joined_message(name)))
         return RoutingResult(deliveries=deliveries)
 
     def _unregister(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
-        name = self._clients.pop(client_id, display_name(message, UNREGISTER, peer_name))
-        deliveries = [Delivery(client_id, server_message(f"Bye {name}!"))]
-        deliveries.extend(self._presence_deliveries())
+        cancelled = self._cancel_transfers(client_id)
+        self._sequenced.discard(client_id)
+        removed = self._remove_client(client_id)
+        name = removed or display_name(message, UNREGISTER, peer_name)
+        deliveries = deliveries_for([client_id], server_message(f"Bye {name}!"))
+        deliveries.extend(cancelled)
+        if removed is not None:
+            deliveries.extend(self._presence_deliveries(left_message(removed)))
         return RoutingResult(deliveries=deliveries)
 
     def _broadcast(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
@@ -105,8 +222,8 @@ class ChatRoom:
             return self._error(client_id, "Write a message before sending.")
         sender = self._clients.get(client_id, peer_name)
         recipients = list(self._clients) or [client_id]
-        line = server_message(chat_line(sender, text))
-        return RoutingResult([Delivery(recipient, line) for recipient in recipients])
+        line = self.history.record_public(chat_line(sender, text))
+        return RoutingResult(self._chat_deliveries(recipients, line))
 
     def _direct(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
         direct = parse_direct_message(message)
@@ -118,42 +235,184 @@ class ChatRoom:
         if recipient is None:
             return self._error(client_id, f"User '{direct.recipient}' is not signed in.")
 
-        line = server_message(direct_chat_line(sender, direct.recipient, direct.text))
-        deliveries = [Delivery(recipient, line)]
+        line = self.history.record_direct(
+            self._readers.get(client_id),
+            self._readers[recipient],
+            direct_chat_line(sender, direct.recipient, direct.text),
+        )
+        recipients = [recipient]
         if recipient != client_id:
-            deliveries.append(Delivery(client_id, line))
+            recipients.append(client_id)
+        return RoutingResult(self._chat_deliveries(recipients, line))
+
+    def _catch_up(self, client_id: Hashable, message: str) -> RoutingResult:
+        reader = self._readers.get(client_id)
+        if reader is None:
+            return self._error(client_id, "Sign in before loading history.")
+        request = parse_history_request(message)
+        if request is None:
+            return self._error(client_id, "History request could not be read.")
+
+        self._sequenced.add(client_id)
+        if request.mode == CATCH_UP_SINCE:
+            lines = self.history.since(reader, request.value)
+        else:
+            lines = self.history.last(reader, request.value)
+        deliveries = [
+            Delivery(client_id, OutboundMessage(sequenced_message(line.seq, line.text)))
+            for line in lines
+        ]
+        deliveries.extend(deliveries_for([client_id], history_end_message(self.history.head)))
         return RoutingResult(deliveries)
 
+    def _chat_deliveries(self, recipients: list[Hashable], line: StoredLine) -> list[Delivery]:
+        plain = [recipient for recipient in recipients if recipient not in self._sequenced]
+        deliveries = deliveries_for(plain, server_message(line.text)) if plain else []
+        if len(plain) < len(recipients):
+            sequenced = [recipient for recipient in recipients if recipient in self._sequenced]
+            deliveries.extend(deliveries_for(sequenced, sequenced_message(line.seq, line.text)))
+        return deliveries
+
     def _file(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
-        parsed = parse_file_message(message)
+        # The base64 payload is forwarded as-is; only the header is rewritten.
+        parsed = parse_encoded_file_message(message)
         if parsed is None:
             return self._error(client_id, "Attachment could not be sent.")
+        sender = self._clients.get(client_id, peer_name)
+        routed = OutboundMessage(routed_encoded_file_message(sender, parsed))
+        return self._route_attachment(client_id, parsed.recipient, routed)
 
+    def _route_file(
+        self, client_id: Hashable, parsed: FileMessage, peer_name: str
+    ) -> RoutingResult:
         sender = self._clients.get(client_id, peer_name)
-        routed = routed_file_message(sender, parsed.filename, parsed.data)
+        routed = OutboundMessage(file=FileDelivery(sender, parsed.filename, parsed.data))
+        return self._route_attachment(client_id, parsed.recipient, routed)
 
-        if parsed.recipient == "ALL":
+    def _route_attachment(
+        self, client_id: Hashable, recipient_name: str, routed: OutboundMessage
+    ) -> RoutingResult:
+        if recipient_name == "ALL":
             recipients = list(self._clients) or [client_id]
         else:
-            recipient = self._client_for_name(parsed.recipient)
+            recipient = self._client_for_name(recipient_name)
             if recipient is None:
-                return self._error(client_id, f"User '{parsed.recipient}' is not signed in.")
+                return self._error(client_id, f"User '{recipient_name}' is not signed in.")
             recipients = [recipient]
             if recipient != client_id:
                 recipients.append(client_id)
 
-        return RoutingResult([Delivery(recipient, routed) for recipient in recipients])
+        return RoutingResult(deliveries_for(recipients, routed))
+
+    def _file_begin(self, client_id: Hashable, message: str, peer_name: str) -> RoutingResult:
+        begin = parse_file_begin(message)
+        if begin is None:
+            return self._error(client_id, "Attachment could not be sent.")
+
+        transfers = self._transfers.setdefault(client_id, {})
+        if begin.transfer_id in transfers:
+            return self._error(client_id, "Attachment is already being sent.")
+
+        if begin.peer == "ALL":
+            recipients = [other for other in self._clients if other != client_id]
+        else:
+            recipient = self._client_for_name(begin.peer)
+            if recipient is None:
+                return self._error(client_id, f"User '{begin.peer}' is not signed in.")
+            recipients = [recipient] if recipient != client_id else []
+
+        transfer = Transfer(f"t{next(self._transfer_ids)}", recipients, begin.byte_count)
+        transfers[begin.transfer_id] = transfer
+        sender = self._clients.get(client_id, peer_name)
+        routed = file_begin_message(sender, transfer.routed_id, begin.filename, begin.byte_count)
+        return RoutingResult(deliveries_for(recipients, routed))
+
+    def _file_chunk(self, client_id: Hashable, message: str | FileChunk) -> RoutingResult:
+        # Text chunks are relayed with their base64 payload untouched; only the
+        # header is read to check the offset and rewrite the transfer id.
+        chunk = message if isinstance(message, FileChunk) else parse_encoded_file_chunk(message)
+        if chunk is None:
+            return self._error(client_id, "Attachment chunk could not be read.")
+
+        transfer = self._transfers.get(client_id, {}).get(chunk.transfer_id)
+        if transfer is None:
+            return self._error(client_id, "Attachment transfer is not open.")
+
+        byte_count = len(chunk.data) if isinstance(chunk, FileChunk) else chunk.byte_count
+        if (
+            chunk.offset != transfer.received
+            or byte_count > MAX_FILE_BYTES
+            or transfer.received + byte_count > transfer.byte_count
+        ):
+            return self._abort_transfer(client_id, chunk.transfer_id)
+        transfer.received += byte_count
+
+        if isinstance(chunk, FileChunk):
+            routed = OutboundMessage(file=FileChunk(transfer.routed_id, chunk.offset, chunk.data))
+            return RoutingResult(deliveries_for(transfer.recipients, routed))
+        return RoutingResult(
+            deliveries_for(
+                transfer.recipients, routed_file_chunk_message(transfer.routed_id, chunk)
+            )
+        )
+
+    def _file_end(self, client_id: Hashable, message: str) -> RoutingResult:
+        end = parse_file_end(message)
+        if end is None:
+            return self._error(client_id, "Attachment transfer could not be finished.")
+
+        transfer = self._transfers.get(client_id, {}).get(end.transfer_id)
+        if transfer is None:
+            return self._error(client_id, "Attachment transfer is not open.")
+
+        if end.complete and transfer.received != transfer.byte_count:
+            return self._abort_transfer(client_id, end.transfer_id)
+
+        del self._transfers[client_id][end.transfer_id]
+        routed = file_end_message(transfer.routed_id, end.complete)
+        return RoutingResult(deliveries_for(transfer.recipients, routed))
+
+    def _abort_transfer(self, client_id: Hashable, transfer_id: str) -> RoutingResult:
+        transfer = self._transfers[client_id].pop(transfer_id)
+        deliveries = deliveries_for(
+            transfer.recipients, file_end_message(transfer.routed_id, False)
+        )
+        deliveries.extend(deliveries_for([client_id], file_end_message(transfer_id, False)))
+        deliveries.extend(
+            deliveries_for([client_id], error_message("Attachment transfer was cancelled."))
+        )
+        return RoutingResult(deliveries)
 
-    def _presence_deliveries(self) -> list[Delivery]:
-        message = users_message(self.usernames)
-        return [Delivery(client_id, message) for client_id in self._clients]
+    def _cancel_transfers(self, client_id: Hashable) -> list[Delivery]:
+        deliveries: list[Delivery] = []
+        for transfer in self._transfers.pop(client_id, {}).values():
+            cancelled = file_end_message(transfer.routed_id, False)
+            deliveries.extend(deliveries_for(transfer.recipients, cancelled))
+        return deliveries
+
+    def _presence_deliveries(self, message: str, skip: Hashable | None = None) -> list[Delivery]:
+        return deliveries_for(
+            (client_id for client_id in self._clients if client_id != skip), message
+        )
 
     def _client_for_name(self, name: str) -> Hashable | None:
-        target = name.casefold()
-        for client_id, username in self._clients.items():
-            if username.casefold() == target:
-                return client_id
-        return None
+        return self._names.get(name.casefold())
+
+    def _add_client(self, client_id: Hashable, name: str) -> None:
+        previous = self._clients.get(client_id)
+        if previous is None:
+            self._readers[client_id] = next(self._reader_ids)
+        else:
+            self._names.pop(previous.casefold(), None)
+        self._clients[client_id] = name
+        self._names[name.casefold()] = client_id
+
+    def _remove_client(self, client_id: Hashable) -> str | None:
+        removed = self._clients.pop(client_id, None)
+        if removed is not None:
+            self._names.pop(removed.casefold(), None)
+            self.history.forget(self._readers.pop(client_id))
+        return removed
 
     def _error(self, client_id: Hashable, message: str) -> RoutingResult:
-        return RoutingResult([Delivery(client_id, error_message(message))])
+        return RoutingResult(deliveries_for([client_id], error_message(message)))
@@ -18,58 +18,101 @@ import os
 import platform
 import subprocess
 import sys
+import time
+from bisect import bisect_left
+from collections.abc import Callable
 from datetime import datetime
-from functools import partial
+from itertools import count
 from pathlib import Path
 from typing import Literal
 
-from PyQt6 import QtCore, QtGui, QtWidgets, QtNetwork
+from PyQt6 import QtCore, QtGui, QtNetwork, QtWidgets
 
+from texte.chat_log import ChatLogView, ChatModelCache, avatar_text
 from texte.client_support import (
     ConversationListItem,
-    entry_bool,
-    entry_int,
+    IncomingTransfer,
+    OutgoingTransfer,
     entry_strings,
     entry_text,
-    qbytearray_to_text,
+    qbytearray_to_bytes,
     scrollbar_or_raise,
 )
-from texte.glass import animate_entry
-from texte.ui import setup_ui
-from texte.widgets import (
-    ClickableLabel,
-    ConversationRow,
-    PinnedConversationTile,
-    ReactionBarPopup,
-    ReactionLabel,
-    MessageOptionsPopup,
-    TransientScrollStyle,
-    emoji_font,
-)
-
+from texte.message_store import MessageStore
 from texte.protocol import (
-    CONNECT,
+    CATCH_UP_LAST,
+    CATCH_UP_SINCE,
     DISCONNECT,
     ERROR,
     FIELD,
+    FILE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_CHUNK_BYTES,
+    FILE_END,
+    HISTORY,
+    JOINED,
+    LEFT,
     MAX_FILE_BYTES,
+    MAX_TRANSFER_BYTES,
+    SEQ,
+    SERVER_MESSAGE,
+    USERS,
+    FileChunk,
+    FileMessage,
+    FrameDecoder,
+    ReliableChannel,
+    WriteCoalescer,
+    binary_chunk_frame,
+    binary_file_frame,
+    binary_frame,
     chat_message,
+    command_tag,
+    compress_frame,
+    connect_message,
     display_text,
+    file_begin_message,
+    file_chunk_message,
+    file_end_message,
     file_message,
     frame_message,
+    history_end_payload,
+    history_request,
+    joined_payload,
+    left_payload,
     message_has_chat_text,
     outgoing_payload,
+    parse_display_message,
+    parse_file_begin,
+    parse_file_chunk,
     parse_file_delivery,
+    parse_file_end,
+    parse_sequenced_message,
     register_message,
-    split_frames,
     unregister_message,
     users_payload,
+    wants_binary_frames,
+    wants_compressed_frames,
 )
 from texte.themes import ThemePalette, theme_palette
+from texte.ui import setup_ui
+from texte.widgets import (
+    ConversationRow,
+    MessageOptionsPopup,
+    PinnedConversationTile,
+    ReactionBarPopup,
+    TransientScrollStyle,
+)
 
 PACKAGE_DIR = Path(__file__).resolve().parent
 ASSET_DIR = PACKAGE_DIR / "assets"
 IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+# Stop reading attachment chunks from disk while this much is queued on the socket.
+TRANSFER_WRITE_WATERMARK = 4 * FILE_CHUNK_BYTES
+HISTORY_FLUSH_MS = 500
+SEARCH_DEBOUNCE_MS = 150
+# Messages replayed from the server the first time a profile signs in with no saved history.
+CATCH_UP_MESSAGES = 50
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -122,6 +165,7 @@ class ChatClient(QtWidgets.QWidget):
     setup_title: QtWidgets.QLabel
     setup_close_button: QtWidgets.QPushButton
     search_field: QtWidgets.QLineEdit
+    search_results: QtWidgets.QListWidget
     pinned_title: QtWidgets.QLabel
     pinned_widget: QtWidgets.QWidget
     pinned_layout: QtWidgets.QGridLayout
@@ -170,7 +214,7 @@ class ChatClient(QtWidgets.QWidget):
     theme_switch: QtWidgets.QWidget
     theme_light_button: QtWidgets.QPushButton
     theme_dark_button: QtWidgets.QPushButton
-    chat_log: QtWidgets.QListWidget
+    chat_log: ChatLogView
     composer_panel: QtWidgets.QFrame
     composer_shell: QtWidgets.QFrame
     message_field: QtWidgets.QLineEdit
@@ -182,18 +226,47 @@ class ChatClient(QtWidgets.QWidget):
         self.logger = logger
 
         self.socket = QtNetwork.QUdpSocket(self)
-        self.tcp_buffer = ""
+        self.tcp_decoder = FrameDecoder()
+        self.prefer_compressed_frames = os.environ.get("TEXTE_COMPRESS_FRAMES") == "1"
+        self.prefer_binary_frames = (
+            os.environ.get("TEXTE_BINARY_FRAMES") == "1" or self.prefer_compressed_frames
+        )
+        self.binary_frames = False
+        self.compressed_frames = False
+        self.reliable_udp = os.environ.get("TEXTE_RELIABLE_UDP", "1") != "0"
+        self.udp_channel: ReliableChannel | None = None
+        self.write_coalescer = WriteCoalescer()
         self.server_connected = False
         self.user_signed_in = False
+        # Last server-side history sequence seen, per (protocol, host, port).
+        self.history_seqs: dict[tuple[str, str, int], int] = {}
+        self.history_server: tuple[str, str, int] | None = None
         self.download_dir = Path.cwd() / "downloads"
+        self.history_dir = Path.cwd() / "history"
+        self.message_store: MessageStore | None = None
         self._icons: dict[str, QtGui.QIcon] = {}
         self.conversation_previews: dict[str, str] = {}
         self.conversation_times: dict[str, str] = {}
         self.conversation_history: dict[str, list[dict[str, object]]] = {"ALL": []}
+        self.online_users: list[str] = []
+        self.outgoing_transfers: dict[str, OutgoingTransfer] = {}
+        self.incoming_transfers: dict[str, IncomingTransfer] = {}
+        self._transfer_ids = count(1)
+        self.server_handlers: dict[str, Callable[[str], None]] = {
+            FILE: self._receive_file_message,
+            FILE_CHUNK: self._receive_chunk_message,
+            FILE_BEGIN: self._receive_file_begin,
+            FILE_END: self._receive_file_end,
+            USERS: self._receive_users,
+            JOINED: self._receive_joined,
+            LEFT: self._receive_left,
+            SEQ: self._receive_sequenced_message,
+            HISTORY: self._receive_history_end,
+            SERVER_MESSAGE: self._receive_display_message,
+            ERROR: self._receive_error,
+        }
         self.pinned_tiles: dict[str, PinnedConversationTile] = {}
         self._seeded_onboarding = False
-        self._last_message_kind: str | None = None
-        self._last_message_sender: str | None = None
         self.active_username: str = ""
         self.active_avatar_name: str = "user1"
         self.theme_preference: Literal["Light", "Dark"] | None = None
@@ -204,6 +277,24 @@ class ChatClient(QtWidgets.QWidget):
 
         self._setup_scaling()
         self._setup_ui()
+        self.chat_models = ChatModelCache(self.conversation_history, self)
+        self.chat_model = self.chat_models.get("ALL")
+        self.chat_log.setModel(self.chat_model)
+        self.history_flush_timer = QtCore.QTimer(self)
+        self.history_flush_timer.setSingleShot(True)
+        self.history_flush_timer.setInterval(HISTORY_FLUSH_MS)
+        self.history_flush_timer.timeout.connect(self._flush_message_store)
+        self.udp_retransmit_timer = QtCore.QTimer(self)
+        self.udp_retransmit_timer.setSingleShot(True)
+        self.udp_retransmit_timer.timeout.connect(self._retransmit_udp)
+        self.write_flush_timer = QtCore.QTimer(self)
+        self.write_flush_timer.setSingleShot(True)
+        self.write_flush_timer.setInterval(0)
+        self.write_flush_timer.timeout.connect(self._flush_writes)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self._run_history_search)
         self._connect_signals()
         app = QtWidgets.QApplication.instance()
         if isinstance(app, QtWidgets.QApplication):
@@ -276,8 +367,14 @@ class ChatClient(QtWidgets.QWidget):
         old_socket.blockSignals(True)
         old_socket.disconnect()
         self.socket = socket
-        self.tcp_buffer = ""
+        self.write_coalescer.clear()
+        self.tcp_decoder.clear()
+        self.binary_frames = False
+        self.compressed_frames = False
+        self._close_transfers()
         self.socket.readyRead.connect(self.receive_message)
+        if isinstance(self.socket, QtNetwork.QTcpSocket):
+            self.socket.bytesWritten.connect(self._pump_transfers)
         old_socket.deleteLater()
 
     def _use_protocol(self, protocol: str) -> None:
@@ -412,6 +509,7 @@ class ChatClient(QtWidgets.QWidget):
             return
 
         self.current_palette = palette
+        self.chat_log.set_palette(palette)
         self.chat_theme.setCurrentText(theme_name)
         self.native_backdrop_enabled = self._apply_native_backdrop(theme_name)
         self.setStyleSheet(self._app_style(palette))
@@ -617,15 +715,6 @@ class ChatClient(QtWidgets.QWidget):
             color: {palette.secondary_text};
             font-size: 7.5pt;
         }}
-        QLabel#Message_Sender {{
-            color: {palette.secondary_text};
-            font-size: 7.5pt;
-            font-weight: 600;
-        }}
-        QLabel#Message_Meta {{
-            color: {palette.secondary_text};
-            font-size: 7pt;
-        }}
         QLabel#Server_Connection_Status {{
             color: {palette.secondary_text};
             background: {system_bubble};
@@ -787,6 +876,23 @@ class ChatClient(QtWidgets.QWidget):
         QListWidget#Conversation_List::item:hover {{
             background: transparent;
         }}
+        QListWidget#Search_Results {{
+            color: {palette.primary_text};
+            background: {system_bubble};
+            border: none;
+            border-radius: 14px;
+            outline: none;
+            padding: 4px;
+            font-size: 8.5pt;
+        }}
+        QListWidget#Search_Results::item {{
+            border: none;
+            border-radius: 10px;
+            padding: 6px 8px;
+        }}
+        QListWidget#Search_Results::item:hover {{
+            background: {palette.glass_fill};
+        }}
         QWidget#Pinned_Widget {{
             background: transparent;
         }}
@@ -797,80 +903,21 @@ class ChatClient(QtWidgets.QWidget):
             background: transparent;
             border-bottom: 1px solid {palette.separator};
         }}
-        QListWidget#Chat_Log {{
+        QListView#Chat_Log {{
             color: {palette.primary_text};
             background: transparent;
             border: none;
             outline: none;
             padding: 8px 8px 6px 8px;
         }}
-        QListWidget#Chat_Log::item {{
+        QListView#Chat_Log::item {{
             border: none;
             padding: 2px;
         }}
-        QFrame#File_Card {{
-            background: {system_bubble};
-            border: 1px solid {palette.glass_border};
-            border-radius: 16px;
-            min-width: 220px;
-        }}
-        QFrame#Media_Card {{
-            background: {system_bubble};
-            border: 1px solid {palette.glass_border};
-            border-radius: 18px;
-            min-width: 220px;
-        }}
-        QLabel#File_Card_Title {{
-            color: {palette.primary_text};
-            font-weight: 700;
-        }}
         QLabel#File_Card_Subtitle {{
             color: {palette.secondary_text};
             font-size: 8pt;
         }}
-        QLabel#Media_Card_Image {{
-            background: {glass_fill};
-            border-radius: 14px;
-        }}
-        QPushButton#Reaction_Chip {{
-            color: {palette.primary_text};
-            background: {app_background};
-            border: 1px solid {palette.glass_border};
-            border-radius: 12px;
-            padding: 3px 8px;
-            font-size: 8pt;
-        }}
-        QPushButton#Reaction_Chip:hover {{
-            background: {system_bubble};
-        }}
-        QPushButton#Reaction_Chip:checked {{
-            background: {system_bubble};
-            border-color: {palette.accent_blue};
-        }}
-        QLabel#Reaction_Badge {{
-            color: {palette.primary_text};
-            background: transparent;
-            border: none;
-            min-width: 40px;
-            min-height: 44px;
-            max-height: 44px;
-            padding: 0;
-            font-size: 12pt;
-            font-weight: 700;
-        }}
-        QPushButton#Thread_Chip {{
-            color: {palette.accent_blue_dark};
-            background: transparent;
-            border: none;
-            font-size: 8pt;
-            font-weight: 700;
-            padding: 0 2px;
-            text-align: left;
-        }}
-        QPushButton#Thread_Chip:hover {{
-            color: {palette.accent_blue};
-            text-decoration: underline;
-        }}
         QFrame#Composer_Panel {{
             background: transparent;
             border: none;
@@ -923,6 +970,8 @@ class ChatClient(QtWidgets.QWidget):
         self.send_message(unregister_message(previous_username))
         self.send_message(register_message(new_username))
         self.active_username = new_username
+        if self.message_store is not None:
+            self._open_message_store(new_username)
         self._set_presence()
         self._refresh_status_text()
         self._update_profile_action_state()
@@ -942,7 +991,14 @@ class ChatClient(QtWidgets.QWidget):
                 self.server_button.setChecked(False)
                 return
             self.socket.connectToHost(QtNetwork.QHostAddress(host), port)
-            self.send_message(CONNECT, host, port)
+            self.history_server = (protocol, host, port)
+            if self.reliable_udp and isinstance(self.socket, QtNetwork.QUdpSocket):
+                self.udp_channel = ReliableChannel()
+            binary = self.prefer_binary_frames and isinstance(self.socket, QtNetwork.QTcpSocket)
+            compressed = binary and self.prefer_compressed_frames
+            # The server compresses only if it accepts this offer, so inflate from now on.
+            self.tcp_decoder.inflate = compressed
+            self.send_message(connect_message(binary, compressed), host, port)
             self.server_connected = True
             self.server_button.setText("Disconnect")
             self.host_address.setEnabled(False)
@@ -964,6 +1020,7 @@ class ChatClient(QtWidgets.QWidget):
             except Exception:
                 pass
 
+        self._flush_writes()
         self.socket.blockSignals(True)
         self.socket.disconnect()
         if isinstance(self.socket, QtNetwork.QTcpSocket):
@@ -971,6 +1028,12 @@ class ChatClient(QtWidgets.QWidget):
         else:
             self.socket.close()
 
+        self.tcp_decoder.clear()
+        self.binary_frames = False
+        self.compressed_frames = False
+        self.udp_channel = None
+        self.udp_retransmit_timer.stop()
+        self._close_transfers()
         self.server_connected = False
         self.user_signed_in = False
         self.server_button.setText("Connect")
@@ -1002,6 +1065,8 @@ class ChatClient(QtWidgets.QWidget):
             self.send_message(register_message(self.username.text()))
             self.user_signed_in = True
             self.active_username = username
+            self._open_message_store(username)
+            self._request_catch_up()
             self.sign_in_button.setText("Sign out")
             self.username.setEnabled(True)
             self.user_avatar.setEnabled(True)
@@ -1032,9 +1097,20 @@ class ChatClient(QtWidgets.QWidget):
             self._refresh_status_text()
             self.profile_popup.hide()
 
+    def _request_catch_up(self) -> None:
+        seq = self.history_seqs.get(self.history_server) if self.history_server else None
+        if seq is not None:
+            request = history_request(CATCH_UP_SINCE, seq)
+        elif self.message_store is not None and self.message_store.count("ALL"):
+            # Saved history already covers earlier sessions; only start tracking sequences.
+            request = history_request(CATCH_UP_LAST, 0)
+        else:
+            request = history_request(CATCH_UP_LAST, CATCH_UP_MESSAGES)
+        self.send_message(request)
+
     def _prime_chat_onboarding(self) -> None:
         """Seed a small amount of local guidance so the first thread feels inhabited."""
-        if self._seeded_onboarding or self.chat_log.count() > 1:
+        if self._seeded_onboarding or len(self.chat_model.entries) > 1:
             return
         timestamp = self._time_label()
         self._add_chat_text(
@@ -1088,29 +1164,84 @@ class ChatClient(QtWidgets.QWidget):
             return
 
         if isinstance(self.socket, QtNetwork.QUdpSocket):
-            self.socket.writeDatagram(payload.encode(), QtNetwork.QHostAddress(host), port)
+            datagram = payload.encode()
+            if self.udp_channel is not None:
+                datagram = self.udp_channel.wrap(datagram, time.monotonic())
+                self._schedule_udp_retransmit()
+            self.socket.writeDatagram(datagram, QtNetwork.QHostAddress(host), port)
+        elif self.binary_frames:
+            self._write_frame(binary_frame(payload))
         else:
-            self.socket.write(frame_message(payload))
+            self._write_frame(frame_message(payload))
 
         if is_field_message:
             self.message_field.setText("")
             self.message_field.setFocus()
 
+    def _write_frame(self, frame: bytes) -> None:
+        if self.compressed_frames:
+            frame = compress_frame(frame)
+        # Frames sent in one event-loop turn leave in one socket write.
+        if self.write_coalescer.push(frame, time.monotonic()):
+            self._flush_writes()
+        elif not self.write_flush_timer.isActive():
+            self.write_flush_timer.start()
+
+    def _flush_writes(self) -> None:
+        self.write_flush_timer.stop()
+        if self.write_coalescer and isinstance(self.socket, QtNetwork.QTcpSocket):
+            self.socket.write(self.write_coalescer.flush())
+
+    def _pending_write_bytes(self) -> int:
+        return self.socket.bytesToWrite() + self.write_coalescer.buffered_bytes
+
     def receive_message(self) -> None:
         """Append server messages to the chat log."""
         if isinstance(self.socket, QtNetwork.QUdpSocket):
             while self.socket.hasPendingDatagrams():
                 datagram = self.socket.receiveDatagram()
-                payload = datagram.data()
+                payload: bytes | None = qbytearray_to_bytes(datagram.data())
+                if self.udp_channel is not None and payload:
+                    payload, ack = self.udp_channel.receive(payload, time.monotonic())
+                    if ack is not None:
+                        self.socket.writeDatagram(
+                            ack, datagram.senderAddress(), datagram.senderPort()
+                        )
                 if not payload:
                     continue
-                self._handle_server_message(qbytearray_to_text(payload).strip())
+                self._handle_server_message(payload.decode(errors="ignore").strip())
+            self._schedule_udp_retransmit()
         else:
             if self.socket.bytesAvailable() > 0:
-                self.tcp_buffer += qbytearray_to_text(self.socket.readAll())
-                messages, self.tcp_buffer = split_frames(self.tcp_buffer)
-                for message in messages:
-                    self._handle_server_message(message)
+                data = qbytearray_to_bytes(self.socket.readAll())
+                for message in self.tcp_decoder.feed(data):
+                    if isinstance(message, FileMessage):
+                        self._save_file_delivery(message.recipient, message.filename, message.data)
+                    elif isinstance(message, FileChunk):
+                        self._receive_file_chunk(message)
+                    elif wants_binary_frames(message):
+                        self.binary_frames = True
+                        self.compressed_frames = wants_compressed_frames(message)
+                    else:
+                        self._handle_server_message(message)
+
+    def _schedule_udp_retransmit(self) -> None:
+        deadline = self.udp_channel.next_deadline() if self.udp_channel is not None else None
+        if deadline is None:
+            self.udp_retransmit_timer.stop()
+        else:
+            self.udp_retransmit_timer.start(max(0, int((deadline - time.monotonic()) * 1000)))
+
+    def _retransmit_udp(self) -> None:
+        if self.udp_channel is None or not isinstance(self.socket, QtNetwork.QUdpSocket):
+            return
+        try:
+            host, port = self._server_address()
+        except ValueError:
+            return
+        for datagram in self.udp_channel.due(time.monotonic()):
+            self.socket.writeDatagram(datagram, QtNetwork.QHostAddress(host), port)
+        self._schedule_udp_retransmit()
 
     def chat_target(self) -> None:
         """Enable or disable message entry for the selected chat target."""
@@ -1135,7 +1266,7 @@ class ChatClient(QtWidgets.QWidget):
             self.chat_subtitle.setText("Connected; sign in to start")
         else:
             self.chat_subtitle.setText("Connect, sign in, then start chatting")
-        self._render_conversation_history(recipient)
+        self._show_conversation_history(recipient)
         self._refresh_conversation_rows()
 
     def _sync_combo_text(self, combo: QtWidgets.QComboBox, text: str) -> None:
@@ -1179,14 +1310,22 @@ class ChatClient(QtWidgets.QWidget):
             return
 
         path = Path(image_tuple[0])
-        data = path.read_bytes()
-        if len(data) > MAX_FILE_BYTES:
-            limit = MAX_FILE_BYTES // 1_000_000
-            self._add_chat_text(f"Attachment is too large. Limit: {limit} MB.", "system")
+        byte_count = path.stat().st_size
+        if byte_count > MAX_TRANSFER_BYTES:
+            limit = MAX_TRANSFER_BYTES // 1024**3
+            self._add_chat_text(f"Attachment is too large. Limit: {limit} GB.", "system")
             return
 
         recipient = self.chat_selector.currentText() or "ALL"
-        self.send_message(FIELD + file_message(recipient, path.name, data))
+        if byte_count > MAX_FILE_BYTES:
+            self._start_transfer(recipient, path, byte_count)
+            return
+
+        data = path.read_bytes()
+        if self.binary_frames:
+            self._write_frame(binary_file_frame(recipient, path.name, data))
+        else:
+            self.send_message(FIELD + file_message(recipient, path.name, data))
         self._add_media_card(
             sender=self.username.text().strip() or "You",
             path=path,
@@ -1196,6 +1335,65 @@ class ChatClient(QtWidgets.QWidget):
             conversation=recipient,
         )
 
+    def _start_transfer(self, recipient: str, path: Path, byte_count: int) -> None:
+        transfer_id = f"s{next(self._transfer_ids)}"
+        source = path.open("rb")
+        self.outgoing_transfers[transfer_id] = OutgoingTransfer(
+            transfer_id, recipient, path, source, byte_count
+        )
+        self.send_message(file_begin_message(recipient, transfer_id, path.name, byte_count))
+        self._add_chat_text(f"Sending {path.name}...", "system", conversation=recipient)
+        self._pump_transfers()
+
+    def _pump_transfers(self, _written: int = 0) -> None:
+        # Chunks are read from disk only as the socket drains, so a large file is
+        # never held in memory and the UI keeps handling events between chunks.
+        if not isinstance(self.socket, QtNetwork.QTcpSocket):
+            return
+        while self.outgoing_transfers and self._pending_write_bytes() < TRANSFER_WRITE_WATERMARK:
+            transfer = next(iter(self.outgoing_transfers.values()))
+            data = transfer.source.read(FILE_CHUNK_BYTES)
+            if data:
+                if self.binary_frames:
+                    self._write_frame(binary_chunk_frame(transfer.transfer_id, transfer.sent, data))
+                else:
+                    self._write_frame(
+                        frame_message(file_chunk_message(transfer.transfer_id, transfer.sent, data))
+                    )
+                transfer.sent += len(data)
+            if not data or transfer.sent >= transfer.byte_count:
+                self._finish_outgoing_transfer(transfer)
+
+    def _finish_outgoing_transfer(self, transfer: OutgoingTransfer) -> None:
+        del self.outgoing_transfers[transfer.transfer_id]
+        transfer.source.close()
+        complete = transfer.sent == transfer.byte_count
+        self.send_message(file_end_message(transfer.transfer_id, complete))
+        if not complete:
+            self._add_chat_text(
+                f"{transfer.path.name} changed while sending and was cancelled.",
+                "system",
+                conversation=transfer.recipient,
+            )
+            return
+        self._add_media_card(
+            sender=self.username.text().strip() or "You",
+            path=transfer.path,
+            caption=transfer.path.name,
+            reactions=["Sent"],
+            outgoing=True,
+            conversation=transfer.recipient,
+        )
+
+    def _close_transfers(self) -> None:
+        for outgoing in self.outgoing_transfers.values():
+            outgoing.source.close()
+        for incoming in self.incoming_transfers.values():
+            incoming.target.close()
+            incoming.path.unlink(missing_ok=True)
+        self.outgoing_transfers.clear()
+        self.incoming_transfers.clear()
+
     # Widget signals and avatar selection
 
     def _connect_signals(self) -> None:
@@ -1209,6 +1407,9 @@ class ChatClient(QtWidgets.QWidget):
         self.setup_button.clicked.connect(self._toggle_setup_sheet)
         self.setup_close_button.clicked.connect(lambda: self._toggle_setup_sheet(False))
         self.new_message_button.clicked.connect(self.focus_current_chat)
+        self.search_field.textChanged.connect(lambda _text: self.search_timer.start())
+        self.search_results.itemClicked.connect(self._open_search_result)
+        self.search_results.itemActivated.connect(self._open_search_result)
         self.server_button.clicked.connect(self.connect_client)
         self.protocol_tcp_button.clicked.connect(lambda: self._select_protocol("TCP"))
         self.protocol_udp_button.clicked.connect(lambda: self._select_protocol("UDP"))
@@ -1226,6 +1427,10 @@ class ChatClient(QtWidgets.QWidget):
         self.message_field.returnPressed.connect(self._send_chat_text)
         self.attach_button.clicked.connect(self.attach_picture)
         self.emoji_button.clicked.connect(self.open_native_emoji_picker)
+        self.chat_log.messageClicked.connect(self._open_message_reaction_bar)
+        self.chat_log.mediaClicked.connect(self._open_clicked_media)
+        self.chat_log.threadClicked.connect(self._open_clicked_thread)
+        self.chat_log.reactionChosen.connect(self._react_to_message)
 
     def _handle_os_theme_changed(self, _scheme) -> None:
         if self.theme_preference is None:
@@ -1432,29 +1637,87 @@ class ChatClient(QtWidgets.QWidget):
     # Incoming messages and rendering
 
     def _handle_server_message(self, message: str) -> None:
+        handler = self.server_handlers.get(command_tag(message))
+        if handler is not None:
+            handler(message)
+
+    def _receive_file_message(self, message: str) -> None:
         file_delivery = parse_file_delivery(message)
         if file_delivery is not None:
             self._save_file_delivery(
                 file_delivery.sender, file_delivery.filename, file_delivery.data
             )
-            return
 
+    def _receive_chunk_message(self, message: str) -> None:
+        file_chunk = parse_file_chunk(message)
+        if file_chunk is not None:
+            self._receive_file_chunk(file_chunk)
+
+    def _receive_file_begin(self, message: str) -> None:
+        file_begin = parse_file_begin(message)
+        if file_begin is not None:
+            self._begin_incoming_transfer(
+                file_begin.peer, file_begin.transfer_id, file_begin.filename, file_begin.byte_count
+            )
+
+    def _receive_file_end(self, message: str) -> None:
+        file_end = parse_file_end(message)
+        if file_end is not None:
+            self._end_transfer(file_end.transfer_id, file_end.complete)
+
+    def _receive_users(self, message: str) -> None:
         users = users_payload(message)
         if users is not None:
             self._update_users(users)
-            return
 
-        text = display_text(message)
-        if text is not None:
-            if message.startswith(ERROR):
-                self._add_chat_text(
-                    text,
-                    "system",
-                    conversation=self.chat_selector.currentText() or "ALL",
-                )
+    def _receive_joined(self, message: str) -> None:
+        joined = joined_payload(message)
+        if joined is not None:
+            self._add_online_user(joined)
+
+    def _receive_left(self, message: str) -> None:
+        left = left_payload(message)
+        if left is not None:
+            self._remove_online_user(left)
+
+    def _receive_sequenced_message(self, message: str) -> None:
+        sequenced = parse_sequenced_message(message)
+        if sequenced is not None:
+            self._receive_sequenced_line(sequenced.seq, sequenced.text)
+
+    def _receive_history_end(self, message: str) -> None:
+        head = history_end_payload(message)
+        if head is not None:
+            self._finish_catch_up(head)
+
+    def _receive_display_message(self, message: str) -> None:
+        text = display_text(message) or ""
+        kind, conversation = self._message_route(text)
+        self._add_chat_text(text, kind, conversation=conversation)
+
+    def _receive_error(self, message: str) -> None:
+        self._add_chat_text(
+            display_text(message) or "",
+            "system",
+            conversation=self.chat_selector.currentText() or "ALL",
+        )
+
+    def _receive_sequenced_line(self, seq: int, text: str) -> None:
+        if self.history_server is not None:
+            seen = self.history_seqs.get(self.history_server)
+            if seen is not None and seq <= seen:
                 return
-            kind, conversation = self._message_route(text)
-            self._add_chat_text(text, kind, conversation=conversation)
+            self.history_seqs[self.history_server] = seq
+        kind, conversation = self._message_route(text)
+        self._add_chat_text(text, kind, conversation=conversation)
+
+    def _finish_catch_up(self, head: int) -> None:
+        if self.history_server is None:
+            return
+        seen = self.history_seqs.get(self.history_server)
+        # A head behind what we have seen means the server restarted and its sequence did too.
+        if seen is None or head < seen:
+            self.history_seqs[self.history_server] = head
 
     def _message_route(self, text: str) -> tuple[str, str]:
         details = self._parse_display_message(text, "incoming")
@@ -1486,19 +1749,71 @@ class ChatClient(QtWidgets.QWidget):
         self.chat_selector.blockSignals(False)
         self._set_conversations(recipients)
 
+    def _add_online_user(self, username: str) -> None:
+        if username.casefold() == self.username.text().strip().casefold():
+            return
+        index = self._online_user_index(username)
+        if index < len(self.online_users) and self.online_users[index] == username:
+            return
+        self.online_users.insert(index, username)
+
+        self.chat_selector.blockSignals(True)
+        self.chat_selector.insertItem(index + 1, username)
+        self.chat_selector.blockSignals(False)
+        item = ConversationListItem(username)
+        row = self._conversation_row(username)
+        item.setSizeHint(row.sizeHint())
+        self.conversation_list.blockSignals(True)
+        self.conversation_list.insertItem(index + 1, item)
+        self.conversation_list.setItemWidget(item, row)
+        self.conversation_list.blockSignals(False)
+        palette = getattr(self, "current_palette", theme_palette("Light"))
+        if palette is not None:
+            row.apply_palette(palette, selected=False)
+        self._refresh_pinned_after_presence(index)
+
+    def _remove_online_user(self, username: str) -> None:
+        index = self._online_user_index(username)
+        if index >= len(self.online_users) or self.online_users[index] != username:
+            return
+        del self.online_users[index]
+        was_active = self.chat_selector.currentText() == username
+
+        self.chat_selector.blockSignals(True)
+        self.chat_selector.removeItem(index + 1)
+        self.chat_selector.blockSignals(False)
+        self.conversation_list.blockSignals(True)
+        self.conversation_list.takeItem(index + 1)
+        self.conversation_list.blockSignals(False)
+        self._refresh_pinned_after_presence(index)
+        if was_active:
+            self._set_active_recipient("ALL")
+
+    def _online_user_index(self, username: str) -> int:
+        return bisect_left(self.online_users, username.casefold(), key=str.casefold)
+
+    def _refresh_pinned_after_presence(self, index: int) -> None:
+        # Only the first six direct conversations are pinned, so later changes leave them alone.
+        if index < 6:
+            self._rebuild_pinned_conversations(self.online_users[:6])
+
+    def _conversation_row(self, recipient: str) -> ConversationRow:
+        return ConversationRow(
+            recipient,
+            self._conversation_preview(recipient),
+            self._conversation_time(recipient),
+            self._avatar_text(recipient),
+        )
+
     def _set_conversations(self, recipients: list[str]) -> None:
         current_item = self.conversation_list.currentItem()
         current = self._conversation_name(current_item) if current_item is not None else "ALL"
+        self.online_users = [recipient for recipient in recipients if recipient != "ALL"]
         self.conversation_list.blockSignals(True)
         self.conversation_list.clear()
         for recipient in recipients:
             item = ConversationListItem(recipient)
-            row = ConversationRow(
-                recipient,
-                self._conversation_preview(recipient),
-                self._conversation_time(recipient),
-                self._avatar_text(recipient),
-            )
+            row = self._conversation_row(recipient)
             item.setSizeHint(row.sizeHint())
             self.conversation_list.addItem(item)
             self.conversation_list.setItemWidget(item, row)
@@ -1544,8 +1859,7 @@ class ChatClient(QtWidgets.QWidget):
         return "Now" if recipient == "ALL" else ""
 
     def _avatar_text(self, recipient: str) -> str:
-        stripped = recipient.strip()
-        return "#" if stripped == "ALL" else (stripped[:1].upper() or "?")
+        return avatar_text(recipient)
 
     def _refresh_conversation_rows(self) -> None:
         palette = getattr(self, "current_palette", theme_palette("Light"))
@@ -1571,7 +1885,90 @@ class ChatClient(QtWidgets.QWidget):
         self._refresh_conversation_content()
 
     def _store_conversation_entry(self, recipient: str, entry: dict[str, object]) -> None:
-        self.conversation_history.setdefault(recipient or "ALL", []).append(entry)
+        conversation = recipient or "ALL"
+        self.conversation_history.setdefault(conversation, []).append(entry)
+        if self.message_store is not None:
+            self.message_store.append(conversation, entry)
+            self.history_flush_timer.start()
+        if self.chat_model.conversation == conversation and self.chat_model.sync():
+            self.chat_log.scrollToBottom()
+
+    def _open_message_store(self, username: str) -> None:
+        """Persist history for this profile and page earlier sessions back in.
+
+        Switching to another profile closes the previous profile's store and drops
+        its conversations from memory, so histories never mix across profiles.
+        """
+        safe_name = "".join(char if char.isalnum() or char in "-_" else "_" for char in username)
+        path = self.history_dir / f"{safe_name or 'default'}.sqlite3"
+        if self.message_store is not None:
+            if self.message_store.path == path:
+                return
+            self._close_message_store()
+            self._forget_conversation_history()
+        self.history_dir.mkdir(exist_ok=True)
+        store = MessageStore(path)
+        for conversation, entries in self.conversation_history.items():
+            for entry in entries:
+                if "id" not in entry:
+                    store.append(conversation, entry)
+        self.message_store = store
+        self.chat_models.clear()
+        self.chat_models.store = store
+        self._show_conversation_history(self.chat_model.conversation)
+
+    def _close_message_store(self) -> None:
+        if self.message_store is not None:
+            self.history_flush_timer.stop()
+            self.message_store.close()
+            self.message_store = None
+
+    def _forget_conversation_history(self) -> None:
+        self.chat_models.clear()
+        self.chat_models.store = None
+        self.conversation_history.clear()
+        self.conversation_previews.clear()
+        self.conversation_times.clear()
+        # Catch-up positions belong to the old profile's saved history.
+        self.history_seqs.clear()
+        self.search_results.clear()
+        self.search_results.setVisible(False)
+        self._refresh_conversation_content()
+
+    def _run_history_search(self) -> None:
+        query = self.search_field.text().strip()
+        self.search_results.clear()
+        if not query or self.message_store is None:
+            self.search_results.setVisible(False)
+            return
+        hits = self.message_store.search(query)
+        for hit in hits:
+            item = QtWidgets.QListWidgetItem(
+                f"{hit.conversation} · {hit.sender or 'Texte'}\n{hit.snippet}"
+            )
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, (hit.conversation, hit.entry_id))
+            self.search_results.addItem(item)
+        if not hits:
+            empty = QtWidgets.QListWidgetItem("No matching messages")
+            empty.setFlags(QtCore.Qt.ItemFlag.NoItemFlags)
+            self.search_results.addItem(empty)
+        self.search_results.setVisible(True)
+
+    def _open_search_result(self, item: QtWidgets.QListWidgetItem) -> None:
+        target = item.data(QtCore.Qt.ItemDataRole.UserRole)
+        if not isinstance(target, tuple):
+            return
+        conversation, entry_id = target
+        self._set_active_recipient(conversation)
+        row = self.chat_model.reveal(entry_id)
+        if row is not None:
+            self.chat_log.highlight_row(row)
+
+    def _flush_message_store(self) -> None:
+        if self.message_store is not None:
+            self.message_store.flush()
+            # Written entries page back in from the store, so memory keeps only what is shown.
+            self.chat_models.trim(self.chat_model, self.chat_log.at_bottom())
 
     def _update_message_reaction(
         self, recipient: str, entry: dict[str, object], reaction: str
@@ -1582,9 +1979,12 @@ class ChatClient(QtWidgets.QWidget):
         else:
             reactions = [reaction]
         entry["reactions"] = reactions
+        if self.message_store is not None:
+            self.message_store.update(entry)
+            self.history_flush_timer.start()
         self._hide_message_action_popup()
-        if self.chat_selector.currentText() == (recipient or "ALL"):
-            self._render_conversation_history(recipient)
+        if self.chat_model.conversation == (recipient or "ALL"):
+            self.chat_model.entry_changed(entry)
         self._refresh_conversation_content()
 
     def _hide_message_action_popup(self) -> None:
@@ -1599,7 +1999,7 @@ class ChatClient(QtWidgets.QWidget):
 
     def _show_message_action_popup(
         self,
-        anchor: QtWidgets.QWidget,
+        anchor: QtCore.QRect,
         *,
         entry: dict[str, object],
         sender: str,
@@ -1620,23 +2020,31 @@ class ChatClient(QtWidgets.QWidget):
         popup.raise_()
         self._show_message_options_popup(anchor, body_text=body_text, sender=sender)
 
-    def _open_message_reaction_bar(
-        self,
-        anchor: QtWidgets.QWidget,
-        entry: dict[str, object],
-        sender: str,
-        conversation: str,
-    ) -> None:
+    def _open_message_reaction_bar(self, index: QtCore.QModelIndex, anchor: QtCore.QRect) -> None:
+        row = self.chat_model.message_row(index.row())
         self._show_message_action_popup(
             anchor,
-            entry=entry,
-            sender=sender,
-            conversation=conversation,
+            entry=row.entry,
+            sender=row.sender or self.chat_title.text(),
+            conversation=self.chat_model.conversation,
         )
 
+    def _react_to_message(self, index: QtCore.QModelIndex, reaction: str) -> None:
+        if index.isValid():
+            entry = self.chat_model.message_row(index.row()).entry
+            self._update_message_reaction(self.chat_model.conversation, entry, reaction)
+
+    def _open_clicked_media(self, index: QtCore.QModelIndex) -> None:
+        row = self.chat_model.message_row(index.row())
+        self._open_media_preview(Path(entry_text(row.entry, "path")), row.body)
+
+    def _open_clicked_thread(self, index: QtCore.QModelIndex) -> None:
+        row = self.chat_model.message_row(index.row())
+        self._show_thread_preview(row.sender, entry_text(row.entry, "thread_label"), row.body)
+
     def _show_message_options_popup(
         self,
-        anchor: QtWidgets.QWidget,
+        anchor: QtCore.QRect,
         *,
         body_text: str,
         sender: str,
@@ -1662,18 +2070,16 @@ class ChatClient(QtWidgets.QWidget):
     def _position_message_action_popup(
         self,
         popup: QtWidgets.QWidget,
-        anchor: QtWidgets.QWidget,
+        anchor: QtCore.QRect,
     ) -> None:
-        anchor_top_left = anchor.mapToGlobal(QtCore.QPoint(0, 0))
-        anchor_rect = anchor.rect()
         popup_size = popup.sizeHint()
         popup.resize(popup_size)
 
-        x = anchor_top_left.x() + (anchor_rect.width() - popup_size.width()) // 2
-        y_above = anchor_top_left.y() - popup_size.height() - 10
-        y_below = anchor_top_left.y() + anchor_rect.height() + 8
+        x = anchor.x() + (anchor.width() - popup_size.width()) // 2
+        y_above = anchor.y() - popup_size.height() - 10
+        y_below = anchor.y() + anchor.height() + 8
 
-        screen = QtWidgets.QApplication.screenAt(anchor_top_left)
+        screen = QtWidgets.QApplication.screenAt(anchor.topLeft())
         available = screen.availableGeometry() if screen is not None else self.geometry()
         y = y_above if y_above >= available.top() + 8 else y_below
         x = max(available.left() + 8, min(x, available.right() - popup_size.width() - 8))
@@ -1685,35 +2091,20 @@ class ChatClient(QtWidgets.QWidget):
     def _position_message_options_popup(
         self,
         popup: QtWidgets.QWidget,
-        anchor: QtWidgets.QWidget,
+        anchor: QtCore.QRect,
     ) -> None:
-        anchor_top_left = anchor.mapToGlobal(QtCore.QPoint(0, 0))
-        anchor_rect = anchor.rect()
         popup_size = popup.sizeHint()
         popup.resize(popup_size)
 
-        x = anchor_top_left.x()
-        y = anchor_top_left.y() + anchor_rect.height() + 14
+        x = anchor.x()
+        y = anchor.y() + anchor.height() + 14
 
-        screen = QtWidgets.QApplication.screenAt(anchor_top_left)
+        screen = QtWidgets.QApplication.screenAt(anchor.topLeft())
         available = screen.availableGeometry() if screen is not None else self.geometry()
         x = max(available.left() + 8, min(x, available.right() - popup_size.width() - 8))
         y = max(available.top() + 8, min(y, available.bottom() - popup_size.height() - 8))
         popup.move(self.mapFromGlobal(QtCore.QPoint(x, y)))
 
-    def _position_reaction_badge(
-        self,
-        container: QtWidgets.QWidget,
-        bubble: QtWidgets.QWidget,
-        badge: QtWidgets.QLabel,
-    ) -> None:
-        bubble_top_right = bubble.mapTo(container, QtCore.QPoint(bubble.width(), 0))
-        badge_size = badge.sizeHint()
-        x = bubble_top_right.x() - int(badge_size.width() * 1.22)
-        y = max(0, bubble_top_right.y() - int(badge_size.height() * 0.62))
-        badge.move(x, y)
-        badge.raise_()
-
     def _prepare_reply(self, sender: str, body_text: str) -> None:
         self._hide_message_action_popup()
         reply_text = f"> {sender}: {body_text}\n"
@@ -1773,44 +2164,9 @@ class ChatClient(QtWidgets.QWidget):
 
         dialog.exec()
 
-    def _render_conversation_history(self, recipient: str) -> None:
-        self.chat_log.clear()
-        self._last_message_kind = None
-        self._last_message_sender = None
-        for entry in self.conversation_history.get(recipient or "ALL", []):
-            entry_type = str(entry.get("type", "text"))
-            if entry_type == "media":
-                path_value = entry_text(entry, "path")
-                if not path_value:
-                    continue
-                self._add_media_card(
-                    sender=str(entry.get("sender", recipient)),
-                    path=Path(path_value),
-                    caption=entry_text(entry, "caption"),
-                    reactions=entry_strings(entry, "reactions"),
-                    thread_label=entry_text(entry, "thread_label") or None,
-                    outgoing=entry_bool(entry, "outgoing"),
-                    conversation=recipient,
-                    store=False,
-                )
-            elif entry_type == "file":
-                self._add_file_card(
-                    sender=str(entry.get("sender", recipient)),
-                    filename=entry_text(entry, "filename"),
-                    byte_count=entry_int(entry, "byte_count"),
-                    conversation=recipient,
-                    store=False,
-                )
-            else:
-                self._add_chat_text(
-                    entry_text(entry, "text"),
-                    str(entry.get("kind", "incoming")),
-                    conversation=recipient,
-                    reactions=entry_strings(entry, "reactions"),
-                    entry=entry,
-                    store=False,
-                )
-        self.chat_log.scrollToBottom()
+    def _show_conversation_history(self, recipient: str) -> None:
+        self.chat_model = self.chat_models.get(recipient or "ALL")
+        self.chat_log.show_model(self.chat_model)
 
     def _refresh_conversation_content(self) -> None:
         for index in range(self.conversation_list.count()):
@@ -1864,197 +2220,22 @@ class ChatClient(QtWidgets.QWidget):
         *,
         conversation: str | None = None,
         reactions: list[str] | None = None,
-        entry: dict[str, object] | None = None,
-        store: bool = True,
     ) -> None:
         target_conversation = conversation or "ALL"
-        if entry is None:
-            entry = {"type": "text", "text": text, "kind": kind, "reactions": list(reactions or [])}
-        if store:
-            self._store_conversation_entry(target_conversation, entry)
-
-        item = QtWidgets.QListWidgetItem()
-        details = self._parse_display_message(text, kind)
-        sender_name = str(details["sender"] or self.chat_title.text())
-        grouped_with_previous = self._grouped_with_previous(kind, sender_name)
-        bubble = QtWidgets.QFrame()
-        bubble.setObjectName("Message_Bubble")
-        bubble.setAttribute(QtCore.Qt.WidgetAttribute.WA_StyledBackground, True)
-        body_label = ReactionLabel(str(details["body"] or ""))
-        body_label.setWordWrap(True)
-        bubble.setMaximumWidth(self._bubble_width())
-        body_label.setTextInteractionFlags(QtCore.Qt.TextInteractionFlag.TextSelectableByMouse)
-
-        palette = getattr(self, "current_palette", theme_palette("Dark"))
-        if palette is None:
-            raise RuntimeError("Dark theme is unavailable.")
-
+        entry: dict[str, object] = {
+            "type": "text",
+            "text": text,
+            "kind": kind,
+            "reactions": list(reactions or []),
+        }
         if kind == "system":
-            bubble.setStyleSheet(
-                f"QFrame#Message_Bubble {{ background: {palette.glass_fill}; "
-                "border: none; border-radius: 12px; padding: 6px 12px;"
-                "}"
-            )
-            # Use primary text for system messages to ensure contrast in dark themes
-            body_label.setStyleSheet(f"color: {palette.primary_text}; background: transparent;")
-            align = QtCore.Qt.AlignmentFlag.AlignHCenter
-        elif kind == "outgoing":
-            bubble.setStyleSheet(
-                f"QFrame#Message_Bubble {{ background: {palette.outgoing_bubble}; "
-                "border-radius: 17px; padding: 8px 12px;"
-                "}"
-            )
-            body_label.setStyleSheet("color: #FFFFFF; background: transparent;")
-            align = QtCore.Qt.AlignmentFlag.AlignRight
-        else:
-            bubble.setStyleSheet(
-                f"QFrame#Message_Bubble {{ background: {palette.incoming_bubble}; "
-                "border: none; border-radius: 17px; padding: 8px 12px;"
-                "}"
-            )
-            body_label.setStyleSheet(f"color: {palette.primary_text}; background: transparent;")
-            align = QtCore.Qt.AlignmentFlag.AlignLeft
-
-        bubble_layout = QtWidgets.QVBoxLayout(bubble)
-        bubble_layout.setContentsMargins(0, 0, 0, 0)
-        bubble_layout.addWidget(body_label)
-
-        current_reactions = entry_strings(entry, "reactions") or list(reactions or [])
-        reaction_badge = None
-
-        container = QtWidgets.QWidget()
-        layout = QtWidgets.QHBoxLayout(container)
-        layout.setContentsMargins(0, 18, 0, 4)
-        row = QtWidgets.QVBoxLayout()
-        row.setContentsMargins(0, 0, 0, 0)
-        row.setSpacing(1 if grouped_with_previous else 2)
-
-        show_sender = target_conversation == "ALL"
-        if kind == "incoming" and details["sender"] and show_sender and not grouped_with_previous:
-            sender_label = QtWidgets.QLabel(str(details["sender"]))
-            sender_label.setObjectName("Message_Sender")
-            # Reserve horizontal space for the avatar so the sender text can't peek out
-            sender_row = QtWidgets.QHBoxLayout()
-            sender_row.setContentsMargins(0, 0, 0, 0)
-            sender_row.setSpacing(0)
-            sender_row.addSpacing(36)  # avatar + gap
-            sender_row.addWidget(sender_label, 0, QtCore.Qt.AlignmentFlag.AlignLeft)
-            row.addLayout(sender_row)
-
-        bubble_row = QtWidgets.QHBoxLayout()
-        bubble_row.setContentsMargins(0, 0, 0, 0)
-        bubble_row.setSpacing(8 if not grouped_with_previous else 4)
-        if align in (QtCore.Qt.AlignmentFlag.AlignHCenter, QtCore.Qt.AlignmentFlag.AlignRight):
-            bubble_row.addStretch(1)
-
-        if kind == "incoming" and show_sender:
-            if grouped_with_previous:
-                bubble_row.addSpacing(28)
-            else:
-                avatar = QtWidgets.QLabel(self._avatar_text(sender_name))
-                avatar.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-                avatar.setFixedSize(24, 24)
-                avatar.setStyleSheet(
-                    # Ensure avatar circle contrasts with current theme
-                    f"color: {palette.primary_text}; background: {palette.incoming_bubble}; "
-                    "border-radius: 12px; font-weight: 700; font-size: 8.5pt;"
-                )
-                bubble_row.addWidget(avatar, 0, QtCore.Qt.AlignmentFlag.AlignBottom)
-
-        bubble_row.addWidget(bubble, 0, QtCore.Qt.AlignmentFlag.AlignLeft)
-        if align in (QtCore.Qt.AlignmentFlag.AlignHCenter, QtCore.Qt.AlignmentFlag.AlignLeft):
-            bubble_row.addStretch(1)
-        row.addLayout(bubble_row)
-
-        if kind == "outgoing":
-            receipt = QtWidgets.QLabel("Read")
-            receipt.setObjectName("Message_Meta")
-            row.addWidget(receipt, 0, QtCore.Qt.AlignmentFlag.AlignRight)
-        elif kind == "system" and details["time"]:
-            system_time = QtWidgets.QLabel(str(details["time"]))
-            system_time.setObjectName("Message_Meta")
-            row.addWidget(system_time, 0, QtCore.Qt.AlignmentFlag.AlignHCenter)
-
-        layout.addLayout(row, 1)
-
-        self.chat_log.addItem(item)
-        self.chat_log.setItemWidget(item, container)
-        item.setSizeHint(QtCore.QSize(0, container.sizeHint().height() + 4))
-        if current_reactions:
-            reaction_badge = QtWidgets.QLabel(current_reactions[0], container)
-            reaction_badge.setObjectName("Reaction_Badge")
-            reaction_badge.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            reaction_badge.setFont(emoji_font(14))
-            reaction_badge.show()
-            QtCore.QTimer.singleShot(
-                0,
-                lambda c=container, b=bubble, badge=reaction_badge: self._position_reaction_badge(
-                    c, b, badge
-                ),
-            )
-        if isinstance(body_label, ReactionLabel):
-            body_label.click_handler = partial(
-                self._open_message_reaction_bar,
-                bubble,
-                entry,
-                sender_name,
-                target_conversation,
-            )
-        else:
-            body_label.clicked.connect(
-                partial(
-                    self._open_message_reaction_bar,
-                    bubble,
-                    entry,
-                    sender_name,
-                    target_conversation,
-                )
-            )
-        if isinstance(body_label, ReactionLabel):
-            body_label.reactionChosen.connect(
-                partial(
-                    self._update_message_reaction,
-                    target_conversation,
-                    entry,
-                )
-            )
-        if target_conversation == (self.chat_selector.currentText() or "ALL"):
-            self.chat_log.scrollToBottom()
-        animate_entry(container)
+            entry["time"] = self._time_label()
+        self._store_conversation_entry(target_conversation, entry)
+        details = self._parse_display_message(text, kind)
         self._touch_conversation(target_conversation, str(details["body"] or ""))
-        self._remember_last_message(kind, sender_name)
 
     def _parse_display_message(self, text: str, kind: str) -> dict[str, str | None]:
-        if kind == "system":
-            return {"time": self._time_label(), "sender": None, "recipient": None, "body": text}
-        marker = "] "
-        if text.startswith("[") and marker in text:
-            time_text, rest = text.split(marker, 1)
-            time_text = time_text.removeprefix("[")
-            if ": " in rest:
-                sender_field, message = rest.split(": ", 1)
-                if " -> " in sender_field:
-                    sender, recipient = sender_field.split(" -> ", 1)
-                else:
-                    sender, recipient = sender_field, "ALL"
-                return {
-                    "time": time_text,
-                    "sender": sender,
-                    "recipient": recipient,
-                    "body": message,
-                }
-        return {"time": self._time_label(), "sender": None, "recipient": None, "body": text}
-
-    def _grouped_with_previous(self, kind: str, sender: str) -> bool:
-        return (
-            kind in {"incoming", "outgoing"}
-            and self._last_message_kind == kind
-            and self._last_message_sender == sender
-        )
-
-    def _remember_last_message(self, kind: str, sender: str | None) -> None:
-        self._last_message_kind = kind
-        self._last_message_sender = sender
+        return parse_display_message(text, kind, self._time_label())
 
     def _open_media_preview(self, path: Path, caption: str) -> None:
         dialog = QtWidgets.QDialog(self)
@@ -2139,8 +2320,58 @@ class ChatClient(QtWidgets.QWidget):
         self.download_dir.mkdir(exist_ok=True)
         path = self._unique_download_path(filename)
         path.write_bytes(data)
+        self._show_received_file(sender, path, len(data))
+
+    def _begin_incoming_transfer(
+        self, sender: str, transfer_id: str, filename: str, byte_count: int
+    ) -> None:
+        self.download_dir.mkdir(exist_ok=True)
+        path = self._unique_download_path(filename)
+        previous = self.incoming_transfers.pop(transfer_id, None)
+        if previous is not None:
+            previous.target.close()
+            previous.path.unlink(missing_ok=True)
+        self.incoming_transfers[transfer_id] = IncomingTransfer(
+            sender, path, path.open("wb"), byte_count
+        )
+
+    def _receive_file_chunk(self, chunk: FileChunk) -> None:
+        transfer = self.incoming_transfers.get(chunk.transfer_id)
+        if transfer is None:
+            return
+        if chunk.offset != transfer.received:
+            self._end_transfer(chunk.transfer_id, False)
+            return
+        transfer.target.write(chunk.data)
+        transfer.received += len(chunk.data)
+
+    def _end_transfer(self, transfer_id: str, complete: bool) -> None:
+        outgoing = self.outgoing_transfers.pop(transfer_id, None)
+        if outgoing is not None:
+            outgoing.source.close()
+            self._add_chat_text(
+                f"Sending {outgoing.path.name} was cancelled.",
+                "system",
+                conversation=outgoing.recipient,
+            )
+            return
+
+        incoming = self.incoming_transfers.pop(transfer_id, None)
+        if incoming is None:
+            return
+        incoming.target.close()
+        if complete and incoming.received == incoming.byte_count:
+            self._show_received_file(incoming.sender, incoming.path, incoming.byte_count)
+            return
+        incoming.path.unlink(missing_ok=True)
+        self._add_chat_text(
+            f"{incoming.sender} stopped sending {incoming.path.name}.",
+            "system",
+            conversation=incoming.sender,
+        )
 
-        self._touch_conversation(sender, f"Sent {filename}")
+    def _show_received_file(self, sender: str, path: Path, byte_count: int) -> None:
+        self._touch_conversation(sender, f"Sent {path.name}")
         if path.suffix.lower() in IMAGE_SUFFIXES:
             self._add_media_card(
                 sender=sender,
@@ -2152,7 +2383,7 @@ class ChatClient(QtWidgets.QWidget):
                 conversation=sender,
             )
         else:
-            self._add_file_card(sender, path.name, len(data), conversation=sender)
+            self._add_file_card(sender, path.name, byte_count, conversation=sender)
 
     def _add_file_card(
         self,
@@ -2161,47 +2392,16 @@ class ChatClient(QtWidgets.QWidget):
         byte_count: int,
         *,
         conversation: str | None = None,
-        store: bool = True,
     ) -> None:
-        target_conversation = conversation or sender or "ALL"
-        if store:
-            self._store_conversation_entry(
-                target_conversation,
-                {
-                    "type": "file",
-                    "sender": sender,
-                    "filename": filename,
-                    "byte_count": byte_count,
-                },
-            )
-        item = QtWidgets.QListWidgetItem()
-        card = QtWidgets.QFrame()
-        card.setObjectName("File_Card")
-        layout = QtWidgets.QVBoxLayout(card)
-        layout.setContentsMargins(12, 10, 12, 10)
-        layout.setSpacing(2)
-
-        title = QtWidgets.QLabel(filename)
-        title.setObjectName("File_Card_Title")
-        subtitle = QtWidgets.QLabel(f"{sender} sent {byte_count} bytes")
-        subtitle.setObjectName("File_Card_Subtitle")
-        layout.addWidget(title)
-        layout.addWidget(subtitle)
-
-        container = QtWidgets.QWidget()
-        row = QtWidgets.QHBoxLayout(container)
-        row.setContentsMargins(2, 5, 2, 5)
-        row.addStretch(1)
-        row.addWidget(card)
-        row.addStretch(1)
-
-        self.chat_log.addItem(item)
-        self.chat_log.setItemWidget(item, container)
-        item.setSizeHint(QtCore.QSize(0, card.sizeHint().height() + 14))
-        if target_conversation == (self.chat_selector.currentText() or "ALL"):
-            self.chat_log.scrollToBottom()
-        animate_entry(container)
-        self._remember_last_message("incoming", sender)
+        self._store_conversation_entry(
+            conversation or sender or "ALL",
+            {
+                "type": "file",
+                "sender": sender,
+                "filename": filename,
+                "byte_count": byte_count,
+            },
+        )
 
     def _add_media_card(
         self,
@@ -2213,160 +2413,27 @@ class ChatClient(QtWidgets.QWidget):
         thread_label: str | None = None,
         outgoing: bool,
         conversation: str | None = None,
-        store: bool = True,
     ) -> None:
         target_conversation = conversation or (
             sender if not outgoing else (self.chat_selector.currentText() or "ALL")
         )
-        if store:
-            self._store_conversation_entry(
-                target_conversation,
-                {
-                    "type": "media",
-                    "sender": sender,
-                    "path": str(path),
-                    "caption": caption,
-                    "reactions": list(reactions or []),
-                    "thread_label": thread_label,
-                    "outgoing": outgoing,
-                },
-            )
-        item = QtWidgets.QListWidgetItem()
-        container = QtWidgets.QWidget()
-        layout = QtWidgets.QVBoxLayout(container)
-        layout.setContentsMargins(0, 6, 0, 6)
-        layout.setSpacing(2)
-
-        palette = getattr(self, "current_palette", theme_palette("Light"))
-        if palette is None:
-            return
-
-        grouped_with_previous = self._grouped_with_previous(
-            "outgoing" if outgoing else "incoming",
-            sender,
+        self._store_conversation_entry(
+            target_conversation,
+            {
+                "type": "media",
+                "sender": sender,
+                "path": str(path),
+                "caption": caption,
+                "reactions": list(reactions or []),
+                "thread_label": thread_label,
+                "outgoing": outgoing,
+            },
         )
-        show_sender = target_conversation == "ALL"
-        if not outgoing and show_sender and not grouped_with_previous:
-            sender_label = QtWidgets.QLabel(sender)
-            sender_label.setObjectName("Message_Sender")
-            layout.addWidget(sender_label, 0, QtCore.Qt.AlignmentFlag.AlignLeft)
-
-        row = QtWidgets.QHBoxLayout()
-        row.setContentsMargins(0, 0, 0, 0)
-        row.setSpacing(8 if not grouped_with_previous else 4)
-        if outgoing:
-            row.addStretch(1)
-
-        if not outgoing and show_sender:
-            if grouped_with_previous:
-                row.addSpacing(28)
-            else:
-                avatar = QtWidgets.QLabel(self._avatar_text(sender))
-                avatar.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-                avatar.setFixedSize(24, 24)
-                avatar.setStyleSheet(
-                    f"color: {palette.primary_text}; background: {palette.system_bubble}; "
-                    "border-radius: 12px; font-weight: 700; font-size: 8.5pt;"
-                )
-                row.addWidget(avatar, 0, QtCore.Qt.AlignmentFlag.AlignBottom)
-
-        card = QtWidgets.QFrame()
-        card.setObjectName("Media_Card")
-        card_layout = QtWidgets.QVBoxLayout(card)
-        card_layout.setContentsMargins(10, 10, 10, 10)
-        card_layout.setSpacing(8)
-
-        image = ClickableLabel()
-        image.setObjectName("Media_Card_Image")
-        image.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-        image.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
-        image.setMinimumSize(220, 150)
-        image.setMaximumWidth(min(self._bubble_width(), 420))
-        image.setScaledContents(False)
-        image.clicked.connect(lambda: self._open_media_preview(path, caption))
-
-        reader = QtGui.QImageReader(str(path))
-        reader.setAutoTransform(True)
-        source_image = reader.read()
-        if not source_image.isNull():
-            pixmap = QtGui.QPixmap.fromImage(source_image)
-            preview_width = min(self._bubble_width(), 420)
-            image.setPixmap(
-                pixmap.scaled(
-                    QtCore.QSize(preview_width, 320),
-                    QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-                    QtCore.Qt.TransformationMode.SmoothTransformation,
-                )
-            )
-        caption_label = QtWidgets.QLabel(caption)
-        caption_label.setWordWrap(True)
-        caption_label.setStyleSheet(
-            "color: #FFFFFF;" if outgoing else f"color: {palette.primary_text};"
-        )
-        caption_label.setTextInteractionFlags(QtCore.Qt.TextInteractionFlag.TextSelectableByMouse)
-
-        if outgoing:
-            card.setStyleSheet(
-                f"QFrame#Media_Card {{ background: {palette.outgoing_bubble}; "
-                "border: none; border-radius: 18px; }}"
-            )
-            image.setStyleSheet("border-radius: 14px; background: rgba(255, 255, 255, 0.08);")
-        card_layout.addWidget(image)
-        card_layout.addWidget(caption_label)
-        row.addWidget(card, 0, QtCore.Qt.AlignmentFlag.AlignLeft)
-        if not outgoing:
-            row.addStretch(1)
-        layout.addLayout(row)
-
-        if reactions:
-            reactions_row = QtWidgets.QHBoxLayout()
-            reactions_row.setContentsMargins(34 if not outgoing else 0, 0, 4 if outgoing else 0, 0)
-            reactions_row.setSpacing(6)
-            if outgoing:
-                reactions_row.addStretch(1)
-            for reaction in reactions:
-                chip = QtWidgets.QPushButton(reaction)
-                chip.setObjectName("Reaction_Chip")
-                chip.setCheckable(True)
-                chip.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
-                reactions_row.addWidget(chip)
-            if not outgoing:
-                reactions_row.addStretch(1)
-            layout.addLayout(reactions_row)
-
-        if thread_label:
-            thread = QtWidgets.QPushButton(thread_label)
-            thread.setObjectName("Thread_Chip")
-            thread.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
-            thread.clicked.connect(lambda: self._show_thread_preview(sender, thread_label, caption))
-            layout.addWidget(
-                thread,
-                0,
-                QtCore.Qt.AlignmentFlag.AlignRight
-                if outgoing
-                else QtCore.Qt.AlignmentFlag.AlignLeft,
-            )
-
-        self.chat_log.addItem(item)
-        self.chat_log.setItemWidget(item, container)
-        item.setSizeHint(QtCore.QSize(0, container.sizeHint().height() + 6))
-        if target_conversation == (self.chat_selector.currentText() or "ALL"):
-            self.chat_log.scrollToBottom()
-        animate_entry(container)
         self._touch_conversation(target_conversation, caption)
-        self._remember_last_message("outgoing" if outgoing else "incoming", sender)
-
-    def _bubble_width(self) -> int:
-        viewport = self.chat_log.viewport()
-        if viewport is None:
-            return 620
-        viewport_width = viewport.width()
-        if viewport_width <= 0:
-            return 620
-        return max(180, min(520, int(viewport_width * 0.58)))
 
     def closeEvent(self, event: QtGui.QCloseEvent | None) -> None:
         self._disconnect_client_session()
+        self._close_message_store()
         super().closeEvent(event)
 
     def resizeEvent(self, event: QtGui.QResizeEvent | None) -> None:
@@ -1,6 +1,8 @@
 """Small client-side helpers shared across the Texte UI."""
 
-from typing import cast
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, cast
 
 from PyQt6 import QtCore, QtWidgets
 
@@ -18,6 +20,29 @@ class ConversationListItem(QtWidgets.QListWidgetItem):
         return self._display_text
 
 
+@dataclass(slots=True)
+class OutgoingTransfer:
+    """A large attachment streamed from disk one chunk at a time."""
+
+    transfer_id: str
+    recipient: str
+    path: Path
+    source: BinaryIO
+    byte_count: int
+    sent: int = 0
+
+
+@dataclass(slots=True)
+class IncomingTransfer:
+    """A large attachment written to downloads as its chunks arrive."""
+
+    sender: str
+    path: Path
+    target: BinaryIO
+    byte_count: int
+    received: int = 0
+
+
 def strings_from(value: object) -> list[str]:
     if isinstance(value, list | tuple | set):
         return [str(item) for item in value]
@@ -47,10 +72,6 @@ def qbytearray_to_bytes(data: QtCore.QByteArray) -> bytes:
     return cast(bytes, data.data())
 
 
-def qbytearray_to_text(data: QtCore.QByteArray) -> str:
-    return qbytearray_to_bytes(data).decode(errors="ignore")
-
-
 def scrollbar_or_raise(area: QtWidgets.QAbstractScrollArea) -> QtWidgets.QScrollBar:
     scrollbar = area.verticalScrollBar()
     assert scrollbar is not None
@@ -0,0 +1,249 @@
+"""SQLite-backed conversation history for the desktop client."""
+
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from texte.protocol import parse_display_message
+
+DEFAULT_BATCH_SIZE = 256
+SEARCH_LIMIT = 50
+# Only this many of the newest matches are ranked, which bounds the cost of broad queries.
+SEARCH_WINDOW = 5_000
+SNIPPET_TOKENS = 12
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    created REAL NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation, created, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    body,
+    sender,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+SEARCH_SQL = f"""
+SELECT hits.id, messages.conversation, hits.sender, hits.snippet FROM (
+    SELECT rowid AS id, sender, rank,
+        snippet(messages_fts, 0, '', '', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM messages_fts WHERE messages_fts MATCH ? AND rowid >= ? ORDER BY rank LIMIT ?
+) AS hits JOIN messages ON messages.id = hits.id
+ORDER BY hits.rank
+"""
+SEARCH_WINDOW_SQL = (
+    "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?"
+)
+SEARCH_TERM = re.compile(r"\w+")
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    entry_id: int
+    conversation: str
+    sender: str
+    snippet: str
+
+
+def _encode(entry: dict[str, object]) -> str:
+    return json.dumps(
+        {key: value for key, value in entry.items() if key != "id"},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def _decode(row_id: int, payload: str) -> dict[str, object]:
+    entry = json.loads(payload)
+    if not isinstance(entry, dict):
+        entry = {"type": "text", "text": str(entry), "kind": "system"}
+    entry["id"] = row_id
+    return entry
+
+
+def _field(entry: dict[str, object], key: str) -> str:
+    value = entry.get(key)
+    return value if isinstance(value, str) else ""
+
+
+def search_text(entry: dict[str, object]) -> tuple[str, str]:
+    """Return the `(body, sender)` an entry is indexed under."""
+    entry_type = entry.get("type")
+    if entry_type == "media":
+        return _field(entry, "caption") or Path(_field(entry, "path")).name, _field(entry, "sender")
+    if entry_type == "file":
+        return _field(entry, "filename"), _field(entry, "sender")
+    details = parse_display_message(_field(entry, "text"), _field(entry, "kind"), "")
+    return details["body"] or "", details["sender"] or ""
+
+
+def match_query(query: str) -> str:
+    """Turn free text into an FTS5 query where every word must match as a prefix."""
+    return " ".join(f'"{term}"*' for term in SEARCH_TERM.findall(query))
+
+
+class MessageStore:
+    """Conversation entries in one WAL-mode SQLite file, written in batches.
+
+    `append` and `update` only queue work; `flush` writes everything queued in
+    a single transaction and gives each new entry its row id under `"id"`.
+    Reads flush first, so they always see every queued entry. The full-text
+    index is written in the same transaction, so it never lags the messages.
+    """
+
+    def __init__(self, path: Path | str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._index_missing()
+        self._pending: list[tuple[str, float, dict[str, object]]] = []
+        self._updates: dict[int, dict[str, object]] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._updates)
+
+    def append(self, conversation: str, entry: dict[str, object]) -> None:
+        self._pending.append((conversation, time.time(), entry))
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def update(self, entry: dict[str, object]) -> None:
+        # Queued entries are encoded at flush time, so only stored rows need an update.
+        row_id = entry.get("id")
+        if isinstance(row_id, int):
+            self._updates[row_id] = entry
+            if self.pending >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._pending and not self._updates:
+            return
+        with self.connection:
+            for conversation, created, entry in self._pending:
+                cursor = self.connection.execute(
+                    "INSERT INTO messages (conversation, created, entry) VALUES (?, ?, ?)",
+                    (conversation, created, _encode(entry)),
+                )
+                entry["id"] = cursor.lastrowid
+                self.connection.execute(
+                    "INSERT INTO messages_fts (rowid, body, sender) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, *search_text(entry)),
+                )
+            self.connection.executemany(
+                "UPDATE messages SET entry = ? WHERE id = ?",
+                [(_encode(entry), row_id) for row_id, entry in self._updates.items()],
+            )
+        self._pending.clear()
+        self._updates.clear()
+
+    def count(self, conversation: str) -> int:
+        self.flush()
+        row = self.connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation = ?", (conversation,)
+        ).fetchone()
+        return int(row[0])
+
+    def conversations(self) -> list[str]:
+        self.flush()
+        rows = self.connection.execute("SELECT DISTINCT conversation FROM messages").fetchall()
+        return sorted(str(row[0]) for row in rows)
+
+    def page(
+        self,
+        conversation: str,
+        before: dict[str, object] | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, object]]:
+        """Return up to `limit` entries older than `before`, oldest first.
+
+        Without `before` this is the newest page. An entry that was never stored
+        has nothing older in the store.
+        """
+        self.flush()
+        if before is None:
+            rows = self.connection.execute(
+                "SELECT id, entry FROM messages WHERE conversation = ? "
+                "ORDER BY created DESC, id DESC LIMIT ?",
+                (conversation, limit),
+            ).fetchall()
+        else:
+            before_id = before.get("id")
+            if not isinstance(before_id, int):
+                return []
+            rows = self.connection.execute(
+                "SELECT id, entry FROM messages WHERE conversation = ? "
+                "AND (created, id) < (SELECT created, id FROM messages WHERE id = ?) "
+                "ORDER BY created DESC, id DESC LIMIT ?",
+                (conversation, before_id, limit),
+            ).fetchall()
+        return [_decode(row_id, payload) for row_id, payload in reversed(rows)]
+
+    def since(
+        self,
+        conversation: str,
+        entry_id: int,
+        before: dict[str, object] | None = None,
+    ) -> list[dict[str, object]]:
+        """Return stored entries from `entry_id` up to, not including, `before`, oldest first."""
+        self.flush()
+        query = (
+            "SELECT id, entry FROM messages WHERE conversation = ? "
+            "AND (created, id) >= (SELECT created, id FROM messages WHERE id = ?) "
+        )
+        parameters: tuple[object, ...] = (conversation, entry_id)
+        before_id = before.get("id") if before is not None else None
+        if isinstance(before_id, int):
+            query += "AND (created, id) < (SELECT created, id FROM messages WHERE id = ?) "
+            parameters += (before_id,)
+        rows = self.connection.execute(query + "ORDER BY created, id", parameters).fetchall()
+        return [_decode(row_id, payload) for row_id, payload in rows]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[SearchHit]:
+        """Return the best `limit` matches across every conversation, best first.
+
+        Matches are ranked by BM25 among the newest `SEARCH_WINDOW` matches, so a
+        short prefix shared by most of the history still answers quickly.
+        """
+        match = match_query(query)
+        if not match:
+            return []
+        self.flush()
+        oldest = self.connection.execute(SEARCH_WINDOW_SQL, (match, SEARCH_WINDOW - 1)).fetchone()
+        first_id = 0 if oldest is None else int(oldest[0])
+        rows = self.connection.execute(SEARCH_SQL, (match, first_id, limit)).fetchall()
+        return [
+            SearchHit(row_id, conversation, sender, snippet)
+            for row_id, conversation, sender, snippet in rows
+        ]
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def _index_missing(self) -> None:
+        # Rows written before the index existed are indexed once, on open.
+        last = self.connection.execute(
+            "SELECT rowid FROM messages_fts ORDER BY rowid DESC LIMIT 1"
+        ).fetchone()
+        indexed = 0 if last is None else int(last[0])
+        rows = self.connection.execute(
+            "SELECT id, entry FROM messages WHERE id > ? ORDER BY id", (indexed,)
+        ).fetchall()
+        if not rows:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO messages_fts (rowid, body, sender) VALUES (?, ?, ?)",
+                [(row_id, *search_text(_decode(row_id, payload))) for row_id, payload in rows],
+            )
@@ -0,0 +1,293 @@
+"""Server counters and latency histograms, exposed as Prometheus text and through `{STATS}`.
+
+`InstrumentedRoom` wraps a `ChatRoom` and times every routed command. The socket
+adapters add the bytes they read and write. `render_metrics` writes the text
+exposition format served on the loopback metrics port, and `http_response` is the
+sans-IO HTTP side of that endpoint, shared by the Qt and asyncio backends.
+"""
+
+import ipaddress
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Hashable
+
+from texte.backpressure import ServerStats
+from texte.chat_room import ChatRoom, RoutingResult, deliveries_for
+from texte.protocol import (
+    ALL,
+    CONNECT,
+    DISCONNECT,
+    FILE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_END,
+    HISTORY,
+    REGISTER,
+    STATS,
+    TO,
+    UNREGISTER,
+    FileChunk,
+    FileMessage,
+    command_tag,
+    error_message,
+    server_message,
+)
+
+# Routing latency bucket upper bounds in seconds, from 10 microseconds to 100 ms.
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+)  # fmt: skip
+# Commands get their own label; anything else is counted as "other" so a client
+# cannot grow the label set.
+COMMANDS = (
+    CONNECT,
+    DISCONNECT,
+    REGISTER,
+    UNREGISTER,
+    ALL,
+    TO,
+    FILE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_END,
+    HISTORY,
+    STATS,
+)
+COMMAND_LABELS = {command: command.strip("{}").lower() for command in COMMANDS}
+OTHER = "other"
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Requests whose headers do not end within this many bytes are refused.
+MAX_REQUEST_BYTES = 8 * 1024
+
+
+def command_label(message: str | FileMessage | FileChunk) -> str:
+    if isinstance(message, FileMessage):
+        return COMMAND_LABELS[FILE]
+    if isinstance(message, FileChunk):
+        return COMMAND_LABELS[FILE_CHUNK]
+    return COMMAND_LABELS.get(command_tag(message), OTHER)
+
+
+def is_loopback_peer(peer_name: str) -> bool:
+    """Return whether a `host:port` peer label names this machine."""
+    host = peer_name.rpartition(":")[0] or peer_name
+    try:
+        address = ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+        return address.ipv4_mapped.is_loopback
+    return address.is_loopback
+
+
+class LatencyHistogram:
+    """Observation counts per latency bucket, kept non-cumulative until rendered."""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self) -> None:
+        # One slot per bound plus a last slot for anything slower than every bound.
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def quantile(self, fraction: float) -> float | None:
+        """Return the upper bound of the bucket holding `fraction` of observations."""
+        count = self.count
+        if not count:
+            return None
+        rank = fraction * count
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.counts, strict=False):
+            seen += bucket
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class ServerMetrics:
+    """Counters one server updates as it routes, reads, and writes.
+
+    Gauges are read when metrics are rendered: each is a name, a help line, and a
+    callable that returns the current value.
+    """
+
+    __slots__ = ("bytes_received", "bytes_sent", "commands", "gauges", "routing", "stats")
+
+    def __init__(self, stats: ServerStats | None = None) -> None:
+        self.stats = stats
+        self.commands: dict[str, int] = {}
+        self.routing: dict[str, LatencyHistogram] = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.gauges: dict[str, tuple[str, Callable[[], int]]] = {}
+
+    def add_gauge(self, name: str, help_text: str, read: Callable[[], int]) -> None:
+        self.gauges[name] = (help_text, read)
+
+    def observe_route(self, label: str, seconds: float) -> None:
+        self.commands[label] = self.commands.get(label, 0) + 1
+        histogram = self.routing.get(label)
+        if histogram is None:
+            histogram = self.routing[label] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def summary(self) -> str:
+        """Return one line of headline numbers for the `{STATS}` reply."""
+        overall = LatencyHistogram()
+        for histogram in self.routing.values():
+            for index, bucket in enumerate(histogram.counts):
+                overall.counts[index] += bucket
+        p50, p99 = overall.quantile(0.5), overall.quantile(0.99)
+        commands = " ".join(f"{label}={count}" for label, count in sorted(self.commands.items()))
+        gauges = ", ".join(
+            f"{name.removeprefix('texte_')}={read()}" for name, (_help, read) in self.gauges.items()
+        )
+        latency = (
+            "no commands routed"
+            if p50 is None or p99 is None
+            else f"route p50<={_milliseconds(p50)} p99<={_milliseconds(p99)}"
+        )
+        parts = [
+            f"Server stats: {commands or 'no commands'}",
+            latency,
+            f"{self.bytes_received} bytes in",
+            f"{self.bytes_sent} bytes out",
+        ]
+        if gauges:
+            parts.append(gauges)
+        return "; ".join(parts)
+
+
+class InstrumentedRoom:
+    """Time every routed command and answer `{STATS}` before it reaches the room.
+
+    Only peers on this machine get the stats; anyone else gets an error, because
+    usernames are not authenticated and there is no other notion of an admin.
+    """
+
+    def __init__(self, room: ChatRoom, metrics: ServerMetrics) -> None:
+        self.room = room
+        self.metrics = metrics
+        metrics.add_gauge(
+            "texte_registered_clients", "Clients signed in with a username.", room.client_count
+        )
+
+    def route(
+        self, client_id: Hashable, message: str | FileMessage | FileChunk, peer_name: str
+    ) -> RoutingResult:
+        label = command_label(message)
+        started = time.perf_counter()
+        if label == COMMAND_LABELS[STATS]:
+            result = self._stats(client_id, peer_name)
+        else:
+            result = self.room.route(client_id, message, peer_name)
+        self.metrics.observe_route(label, time.perf_counter() - started)
+        return result
+
+    def unregister(self, client_id: Hashable) -> RoutingResult:
+        return self.room.unregister(client_id)
+
+    def _stats(self, client_id: Hashable, peer_name: str) -> RoutingResult:
+        if not is_loopback_peer(peer_name):
+            reply = error_message("Server stats are only available from the server host.")
+        else:
+            reply = server_message(self.metrics.summary())
+        return RoutingResult(deliveries_for([client_id], reply))
+
+
+def render_metrics(metrics: ServerMetrics) -> str:
+    """Return every metric in the Prometheus text exposition format."""
+    lines: list[str] = []
+    _family(lines, "texte_commands_total", "counter", "Commands routed, by command.")
+    for label, count in sorted(metrics.commands.items()):
+        lines.append(f'texte_commands_total{{command="{label}"}} {count}')
+
+    _family(lines, "texte_route_seconds", "histogram", "Time spent routing one command.")
+    for label, histogram in sorted(metrics.routing.items()):
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, histogram.counts, strict=False):
+            cumulative += bucket
+            lines.append(
+                f'texte_route_seconds_bucket{{command="{label}",le="{bound}"}} {cumulative}'
+            )
+        count = histogram.count
+        lines.append(f'texte_route_seconds_bucket{{command="{label}",le="+Inf"}} {count}')
+        lines.append(f'texte_route_seconds_sum{{command="{label}"}} {histogram.total:.9f}')
+        lines.append(f'texte_route_seconds_count{{command="{label}"}} {count}')
+
+    counters = [
+        ("texte_bytes_received_total", "Bytes read from client sockets.", metrics.bytes_received),
+        ("texte_bytes_sent_total", "Bytes written to client sockets.", metrics.bytes_sent),
+    ]
+    stats = metrics.stats
+    if stats is not None:
+        counters += [
+            ("texte_frames_sent_total", "Frames written to TCP clients.", stats.writes.frames),
+            ("texte_socket_writes_total", "Socket writes to TCP clients.", stats.writes.writes),
+            ("texte_frames_dropped_total", "Chat frames dropped for slow clients.", stats.frames_dropped),
+            ("texte_frames_paused_total", "Attachment frames held for slow clients.", stats.frames_paused),
+            ("texte_slow_disconnects_total", "Slow clients disconnected.", stats.slow_disconnects),
+        ]  # fmt: skip
+    for name, help_text, value in counters:
+        _family(lines, name, "counter", help_text)
+        lines.append(f"{name} {value}")
+
+    for name, (help_text, read) in metrics.gauges.items():
+        _family(lines, name, "gauge", help_text)
+        lines.append(f"{name} {read()}")
+    return "\n".join(lines) + "\n"
+
+
+def http_response(request: bytes, metrics: ServerMetrics) -> bytes | None:
+    """Answer one HTTP request for the metrics endpoint.
+
+    Returns None while the request headers are still incomplete, so callers keep
+    reading and call again with everything received so far.
+    """
+    head, separator, _body = request.partition(b"\r\n\r\n")
+    if not separator:
+        if len(request) > MAX_REQUEST_BYTES:
+            return _http(431, "Request Header Fields Too Large")
+        return None
+    method, _space, rest = head.split(b"\r\n", 1)[0].decode("latin-1").partition(" ")
+    path = rest.split(" ", 1)[0].split("?", 1)[0]
+    if path != METRICS_PATH:
+        return _http(404, "Not Found")
+    if method not in ("GET", "HEAD"):
+        return _http(405, "Method Not Allowed")
+    response = _http(200, "OK", render_metrics(metrics), CONTENT_TYPE)
+    if method == "HEAD":
+        return response.partition(b"\r\n\r\n")[0] + b"\r\n\r\n"
+    return response
+
+
+def _http(
+    status: int, reason: str, text: str | None = None, content_type: str = "text/plain"
+) -> bytes:
+    body = (f"{reason}\n" if text is None else text).encode()
+    head = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def _family(lines: list[str], name: str, kind: str, help_text: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _milliseconds(seconds: float) -> str:
+    return "inf" if seconds == float("inf") else f"{seconds * 1000:g}ms"
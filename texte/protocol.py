@@ -1,6 +1,10 @@
 """Message helpers for the Texte client and server."""
 
 import base64
+import secrets
+import struct
+import zlib
+from collections.abc import Callable, Hashable
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -12,13 +16,97 @@ UNREGISTER = "{UNREGISTER}"
 ALL = "{ALL}"
 TO = "{TO}"
 USERS = "{USERS}"
+JOINED = "{JOINED}"
+LEFT = "{LEFT}"
 FILE = "{FILE}"
+FILE_BEGIN = "{FILEBEGIN}"
+FILE_CHUNK = "{FILECHUNK}"
+FILE_END = "{FILEEND}"
 ERROR = "{ERROR}"
+HISTORY = "{HISTORY}"
+SEQ = "{SEQ}"
+RELIABLE = "{RUDP}"
+ACK = "{ACK}"
 FIELD = "{FIELD}"
 SERVER_MESSAGE = "{MSG}"
+STATS = "{STATS}"
 
 DIRECT_SEPARATOR = "|"
 MAX_FILE_BYTES = 1_000_000
+# Larger attachments stream as chunked transfers; each chunk is one frame.
+FILE_CHUNK_BYTES = 64 * 1024
+MAX_TRANSFER_BYTES = 4 * 1024**3
+TRANSFER_COMPLETE = "complete"
+TRANSFER_CANCELLED = "cancelled"
+UNDELIVERABLE_ATTACHMENT = "Attachment could not be delivered."
+CATCH_UP_LAST = "last"
+CATCH_UP_SINCE = "since"
+
+RELIABLE_PREFIX = RELIABLE.encode()
+ACK_PREFIX = ACK.encode()
+# Retransmit timeouts in seconds, following RFC 6298 with a floor suited to a LAN.
+INITIAL_RTO = 0.5
+MIN_RTO = 0.05
+MAX_RTO = 4.0
+MAX_SEND_ATTEMPTS = 8
+# Sequences this far behind the newest one received count as already delivered.
+RECEIVE_WINDOW = 4096
+# A server drops a peer's reliable channel after this many seconds without hearing
+# from it, once nothing it sent is still waiting for an acknowledgement.
+RELIABLE_IDLE_SECONDS = 300.0
+# Frames written in one event-loop turn share a socket write until they reach this size,
+# or until the oldest has waited this many seconds, so a long turn cannot hold it back.
+COALESCE_BYTES = 64 * 1024
+COALESCE_DELAY = 0.005
+
+BINARY_FRAMES = "binary"
+BINARY_MARKER = 0x00
+# Binary frames: marker byte, command byte, big-endian body length, then the body.
+BINARY_HEADER = struct.Struct("!BBI")
+BINARY_COMMANDS = (
+    CONNECT,
+    DISCONNECT,
+    REGISTER,
+    UNREGISTER,
+    ALL,
+    TO,
+    USERS,
+    JOINED,
+    LEFT,
+    FILE,
+    ERROR,
+    SERVER_MESSAGE,
+    FILE_BEGIN,
+    FILE_CHUNK,
+    FILE_END,
+    HISTORY,
+    SEQ,
+    STATS,
+)
+BINARY_CODES = {command: code for code, command in enumerate(BINARY_COMMANDS, start=1)}
+COMMAND_TAGS = frozenset(BINARY_COMMANDS)
+# Peers that negotiated compression may set this bit in the command byte of a binary
+# frame whose body is zlib-compressed. Only chat commands are worth compressing;
+# attachments, whole or chunked, are mostly images that zlib cannot shrink.
+COMPRESSED_FRAMES = "zlib"
+COMPRESSED_FLAG = 0x80
+COMPRESSIBLE_CODES = frozenset(BINARY_CODES[command] for command in (ALL, TO, SERVER_MESSAGE, SEQ))
+COMPRESS_THRESHOLD = 512
+COMPRESS_LEVEL = 6
+# A compressed body that inflates past this is dropped rather than buffered.
+MAX_INFLATED_BYTES = 2 * MAX_FILE_BYTES
+
+
+@dataclass(frozen=True, slots=True)
+class Command:
+    """A text message with its `{TAG}` identified; `tag` is empty for unknown or missing tags."""
+
+    tag: str
+    text: str
+
+    @property
+    def payload(self) -> str:
+        return self.text[len(self.tag) :]
 
 
 @dataclass(frozen=True, slots=True)
@@ -35,6 +123,18 @@ class DirectMessage:
     text: str
 
 
+@dataclass(frozen=True, slots=True)
+class HistoryRequest:
+    mode: str
+    value: int
+
+
+@dataclass(frozen=True, slots=True)
+class SequencedLine:
+    seq: int
+    text: str
+
+
 @dataclass(frozen=True, slots=True)
 class FileMessage:
     recipient: str
@@ -49,6 +149,153 @@ class FileDelivery:
     data: bytes
 
 
+@dataclass(frozen=True, slots=True)
+class FileBegin:
+    peer: str
+    transfer_id: str
+    filename: str
+    byte_count: int
+
+
+@dataclass(frozen=True, slots=True)
+class FileChunk:
+    transfer_id: str
+    offset: int
+    data: bytes
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedFileMessage:
+    """A text-framed attachment whose base64 payload has not been decoded."""
+
+    recipient: str
+    filename: str
+    encoded: str
+
+    @property
+    def byte_count(self) -> int:
+        return encoded_byte_count(self.encoded)
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedFileChunk:
+    """A text-framed chunk whose base64 payload has not been decoded."""
+
+    transfer_id: str
+    offset: int
+    encoded: str
+
+    @property
+    def byte_count(self) -> int:
+        return encoded_byte_count(self.encoded)
+
+
+@dataclass(frozen=True, slots=True)
+class FileEnd:
+    transfer_id: str
+    complete: bool
+
+
+class OutboundMessage:
+    """A routed message encoded at most once per wire format and shared by its recipients."""
+
+    __slots__ = ("_binary_frame", "_compressed_frame", "_file", "_line_frame", "_text")
+
+    def __init__(
+        self, text: str | None = None, *, file: FileDelivery | FileChunk | None = None
+    ) -> None:
+        if text is None and file is None:
+            raise ValueError("OutboundMessage needs text or a file delivery.")
+        self._text = text
+        self._file = file
+        self._line_frame: bytes | None = None
+        self._binary_frame: bytes | None = None
+        self._compressed_frame: bytes | None = None
+
+    @property
+    def file(self) -> FileDelivery | FileChunk | None:
+        return self._file
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            if isinstance(self._file, FileChunk):
+                self._text = file_chunk_message(
+                    self._file.transfer_id, self._file.offset, self._file.data
+                )
+            else:
+                assert self._file is not None
+                self._text = routed_file_message(
+                    self._file.sender, self._file.filename, self._file.data
+                )
+        return self._text
+
+    @property
+    def line_frame(self) -> bytes:
+        if self._line_frame is None:
+            self._line_frame = frame_message(self.text)
+        return self._line_frame
+
+    @property
+    def binary_frame(self) -> bytes:
+        if self._binary_frame is None:
+            if isinstance(self._file, FileChunk):
+                self._binary_frame = binary_chunk_frame(
+                    self._file.transfer_id, self._file.offset, self._file.data
+                )
+            elif self._file is not None:
+                self._binary_frame = binary_file_frame(
+                    self._file.sender, self._file.filename, self._file.data
+                )
+            else:
+                self._binary_frame = binary_frame(self.text)
+        return self._binary_frame
+
+    @property
+    def compressed_frame(self) -> bytes:
+        if self._compressed_frame is None:
+            self._compressed_frame = compress_frame(self.binary_frame)
+        return self._compressed_frame
+
+
+def connect_message(binary: bool = False, compressed: bool = False) -> str:
+    if not binary:
+        return CONNECT
+    if compressed:
+        return f"{CONNECT}{BINARY_FRAMES}{DIRECT_SEPARATOR}{COMPRESSED_FRAMES}"
+    return f"{CONNECT}{BINARY_FRAMES}"
+
+
+def _connect_options(message: str) -> list[str]:
+    if not message.startswith(CONNECT):
+        return []
+    return command_payload(message, CONNECT).split(DIRECT_SEPARATOR)
+
+
+def wants_binary_frames(message: str) -> bool:
+    return _connect_options(message)[:1] == [BINARY_FRAMES]
+
+
+def wants_compressed_frames(message: str) -> bool:
+    options = _connect_options(message)
+    return options[:1] == [BINARY_FRAMES] and COMPRESSED_FRAMES in options[1:]
+
+
+def command_tag(message: str) -> str:
+    """Find a message's command tag with one scan for the closing brace.
+
+    Every tag is `{...}` delimited and none is a prefix of another, so callers can
+    dispatch on the tag through a dict instead of trying each prefix in turn.
+    Unknown tags and untagged text come back as "".
+    """
+    tag = message[: message.find("}") + 1] if message.startswith("{") else ""
+    return tag if tag in COMMAND_TAGS else ""
+
+
+def parse_command(message: str) -> Command:
+    return Command(command_tag(message), message)
+
+
 def server_message(text: str) -> str:
     return f"{SERVER_MESSAGE}{text}"
 
@@ -61,6 +308,14 @@ def users_message(usernames: list[str]) -> str:
     return f"{USERS}{','.join(sorted(usernames, key=str.casefold))}"
 
 
+def joined_message(username: str) -> str:
+    return f"{JOINED}{normalize_username(username)}"
+
+
+def left_message(username: str) -> str:
+    return f"{LEFT}{normalize_username(username)}"
+
+
 def register_message(username: str) -> str:
     return f"{REGISTER}{normalize_username(username)}"
 
@@ -110,6 +365,18 @@ def users_payload(message: str) -> list[str] | None:
     return [name for name in payload.split(",") if name]
 
 
+def joined_payload(message: str) -> str | None:
+    if not message.startswith(JOINED):
+        return None
+    return normalize_username(message.removeprefix(JOINED)) or None
+
+
+def left_payload(message: str) -> str | None:
+    if not message.startswith(LEFT):
+        return None
+    return normalize_username(message.removeprefix(LEFT)) or None
+
+
 def command_payload(message: str, command: str) -> str:
     return message.removeprefix(command).strip()
 
@@ -133,6 +400,43 @@ def parse_direct_message(message: str) -> DirectMessage | None:
     return DirectMessage(recipient, text)
 
 
+def history_request(mode: str, value: int) -> str:
+    return f"{HISTORY}{mode}{DIRECT_SEPARATOR}{value}"
+
+
+def parse_history_request(message: str) -> HistoryRequest | None:
+    if not message.startswith(HISTORY):
+        return None
+    mode, _separator, value = message.removeprefix(HISTORY).partition(DIRECT_SEPARATOR)
+    if mode not in {CATCH_UP_LAST, CATCH_UP_SINCE} or not value.isdigit():
+        return None
+    return HistoryRequest(mode, int(value))
+
+
+def history_end_message(head: int) -> str:
+    return f"{HISTORY}{head}"
+
+
+def history_end_payload(message: str) -> int | None:
+    if not message.startswith(HISTORY):
+        return None
+    payload = message.removeprefix(HISTORY)
+    return int(payload) if payload.isdigit() else None
+
+
+def sequenced_message(seq: int, text: str) -> str:
+    return f"{SEQ}{seq}{DIRECT_SEPARATOR}{text}"
+
+
+def parse_sequenced_message(message: str) -> SequencedLine | None:
+    if not message.startswith(SEQ):
+        return None
+    seq, separator, text = message.removeprefix(SEQ).partition(DIRECT_SEPARATOR)
+    if not separator or not seq.isdigit():
+        return None
+    return SequencedLine(int(seq), text)
+
+
 def file_message(recipient: str, filename: str, data: bytes) -> str:
     encoded = base64.b64encode(data).decode("ascii")
     return f"{FILE}{normalize_username(recipient)}{DIRECT_SEPARATOR}{safe_filename(filename)}{DIRECT_SEPARATOR}{encoded}"
@@ -164,13 +468,122 @@ def parse_file_message(message: str) -> FileMessage | None:
     return FileMessage(recipient, filename, data)
 
 
-def parse_file_delivery(message: str) -> FileDelivery | None:
-    parsed = parse_file_message(message)
+def parse_encoded_file_message(message: str) -> EncodedFileMessage | None:
+    """Read an attachment header and size without decoding its payload.
+
+    Only the base64 length and ASCII range are checked, so the server can
+    relay attachments without a decode and re-encode pass. Clients still decode
+    with validation before saving anything.
+    """
+    if not message.startswith(FILE):
+        return None
+    recipient_end = message.find(DIRECT_SEPARATOR, len(FILE))
+    filename_end = message.find(DIRECT_SEPARATOR, recipient_end + 1)
+    if recipient_end < 0 or filename_end < 0:
+        return None
+    recipient = normalize_username(message[len(FILE) : recipient_end])
+    filename = safe_filename(message[recipient_end + 1 : filename_end])
+    encoded = message[filename_end + 1 :]
+    if not recipient or not encoded or len(encoded) % 4 or not encoded.isascii():
+        return None
+    if not 0 < encoded_byte_count(encoded) <= MAX_FILE_BYTES:
+        return None
+    return EncodedFileMessage(recipient, filename, encoded)
+
+
+def routed_encoded_file_message(sender: str, parsed: EncodedFileMessage) -> str:
+    return f"{FILE}{normalize_username(sender)}{DIRECT_SEPARATOR}{parsed.filename}{DIRECT_SEPARATOR}{parsed.encoded}"
+
+
+def encoded_byte_count(encoded: str) -> int:
+    return len(encoded) * 3 // 4 - encoded[-2:].count("=")
+
+
+def parse_file_delivery(message: str | FileMessage) -> FileDelivery | None:
+    parsed = message if isinstance(message, FileMessage) else parse_file_message(message)
     if parsed is None:
         return None
     return FileDelivery(parsed.recipient, parsed.filename, parsed.data)
 
 
+def is_attachment_command(message: str) -> bool:
+    return message.startswith((FILE, FILE_BEGIN, FILE_CHUNK, FILE_END))
+
+
+def file_begin_message(peer: str, transfer_id: str, filename: str, byte_count: int) -> str:
+    return (
+        f"{FILE_BEGIN}{normalize_username(peer)}{DIRECT_SEPARATOR}{transfer_id}"
+        f"{DIRECT_SEPARATOR}{safe_filename(filename)}{DIRECT_SEPARATOR}{byte_count}"
+    )
+
+
+def parse_file_begin(message: str) -> FileBegin | None:
+    if not message.startswith(FILE_BEGIN):
+        return None
+    parts = message.removeprefix(FILE_BEGIN).split(DIRECT_SEPARATOR)
+    if len(parts) != 4 or not parts[3].isdigit():
+        return None
+    peer = normalize_username(parts[0])
+    transfer_id = parts[1].strip()
+    byte_count = int(parts[3])
+    if not peer or not transfer_id or not 0 < byte_count <= MAX_TRANSFER_BYTES:
+        return None
+    return FileBegin(peer, transfer_id, safe_filename(parts[2]), byte_count)
+
+
+def file_chunk_message(transfer_id: str, offset: int, data: bytes) -> str:
+    encoded = base64.b64encode(data).decode("ascii")
+    return f"{FILE_CHUNK}{transfer_id}{DIRECT_SEPARATOR}{offset}{DIRECT_SEPARATOR}{encoded}"
+
+
+def parse_encoded_file_chunk(message: str) -> EncodedFileChunk | None:
+    """Read a chunk header and keep the payload encoded, for relaying."""
+    if not message.startswith(FILE_CHUNK):
+        return None
+    parts = message.removeprefix(FILE_CHUNK).split(DIRECT_SEPARATOR, 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    transfer_id, offset, encoded = parts[0].strip(), int(parts[1]), parts[2]
+    if not transfer_id or not encoded or len(encoded) % 4 or not encoded.isascii():
+        return None
+    return EncodedFileChunk(transfer_id, offset, encoded)
+
+
+def parse_file_chunk(message: str | FileChunk) -> FileChunk | None:
+    if isinstance(message, FileChunk):
+        return message
+    encoded = parse_encoded_file_chunk(message)
+    if encoded is None:
+        return None
+    try:
+        data = base64.b64decode(encoded.encoded.encode("ascii"), validate=True)
+    except (ValueError, UnicodeEncodeError):
+        return None
+    return FileChunk(encoded.transfer_id, encoded.offset, data)
+
+
+def routed_file_chunk_message(transfer_id: str, chunk: EncodedFileChunk) -> str:
+    return (
+        f"{FILE_CHUNK}{transfer_id}{DIRECT_SEPARATOR}{chunk.offset}"
+        f"{DIRECT_SEPARATOR}{chunk.encoded}"
+    )
+
+
+def file_end_message(transfer_id: str, complete: bool = True) -> str:
+    status = TRANSFER_COMPLETE if complete else TRANSFER_CANCELLED
+    return f"{FILE_END}{transfer_id}{DIRECT_SEPARATOR}{status}"
+
+
+def parse_file_end(message: str) -> FileEnd | None:
+    if not message.startswith(FILE_END):
+        return None
+    transfer_id, _, status = message.removeprefix(FILE_END).partition(DIRECT_SEPARATOR)
+    transfer_id = transfer_id.strip()
+    if not transfer_id:
+        return None
+    return FileEnd(transfer_id, status.strip() != TRANSFER_CANCELLED)
+
+
 def timestamp(now: datetime | None = None) -> str:
     moment = now or datetime.now()
     return moment.strftime("%H:%M")
@@ -184,10 +597,143 @@ def direct_chat_line(sender: str, recipient: str, text: str, now: datetime | Non
     return f"[{timestamp(now)}] {sender} -> {recipient}: {text}"
 
 
+def parse_display_message(text: str, kind: str, fallback_time: str) -> dict[str, str | None]:
+    if kind == "system":
+        return {"time": fallback_time, "sender": None, "recipient": None, "body": text}
+    marker = "] "
+    if text.startswith("[") and marker in text:
+        time_text, rest = text.split(marker, 1)
+        time_text = time_text.removeprefix("[")
+        if ": " in rest:
+            sender_field, message = rest.split(": ", 1)
+            if " -> " in sender_field:
+                sender, recipient = sender_field.split(" -> ", 1)
+            else:
+                sender, recipient = sender_field, "ALL"
+            return {
+                "time": time_text,
+                "sender": sender,
+                "recipient": recipient,
+                "body": message,
+            }
+    return {"time": fallback_time, "sender": None, "recipient": None, "body": text}
+
+
 def frame_message(message: str) -> bytes:
     return f"{message.rstrip(chr(10)).rstrip(chr(13))}\n".encode()
 
 
+def binary_frame(message: str) -> bytes:
+    """Frame a command message with a length-prefixed binary header.
+
+    Attachment payloads are decoded from base64 so binary frames always carry raw bytes.
+    The server relays text attachments without decoding them, so a payload that fails
+    to decode here becomes an `{ERROR}` instead of a frame of base64 text.
+    """
+    if message.startswith(FILE):
+        delivery = parse_file_delivery(message)
+        if delivery is None:
+            return binary_frame(error_message(UNDELIVERABLE_ATTACHMENT))
+        return binary_file_frame(delivery.sender, delivery.filename, delivery.data)
+    if message.startswith(FILE_CHUNK):
+        chunk = parse_file_chunk(message)
+        if chunk is None:
+            return binary_frame(error_message(UNDELIVERABLE_ATTACHMENT))
+        return binary_chunk_frame(chunk.transfer_id, chunk.offset, chunk.data)
+    command = parse_command(message)
+    code = BINARY_CODES.get(command.tag, 0)
+    body = command.payload.encode()
+    return BINARY_HEADER.pack(BINARY_MARKER, code, len(body)) + body
+
+
+def binary_file_frame(peer: str, filename: str, data: bytes) -> bytes:
+    """Frame an attachment with raw bytes instead of base64 text."""
+    prefix = (
+        f"{normalize_username(peer)}{DIRECT_SEPARATOR}{safe_filename(filename)}{DIRECT_SEPARATOR}"
+    ).encode()
+    header = BINARY_HEADER.pack(BINARY_MARKER, BINARY_CODES[FILE], len(prefix) + len(data))
+    return b"".join((header, prefix, data))
+
+
+def binary_chunk_frame(transfer_id: str, offset: int, data: bytes) -> bytes:
+    """Frame one transfer chunk with raw bytes instead of base64 text."""
+    prefix = f"{transfer_id}{DIRECT_SEPARATOR}{offset}{DIRECT_SEPARATOR}".encode()
+    header = BINARY_HEADER.pack(BINARY_MARKER, BINARY_CODES[FILE_CHUNK], len(prefix) + len(data))
+    return b"".join((header, prefix, data))
+
+
+def compress_frame(frame: bytes) -> bytes:
+    """Return a binary frame with its body compressed, if that makes it smaller.
+
+    Newline frames, short bodies, and commands outside `COMPRESSIBLE_CODES` come
+    back unchanged, so any frame can be passed through here.
+    """
+    if len(frame) < BINARY_HEADER.size + COMPRESS_THRESHOLD or frame[0] != BINARY_MARKER:
+        return frame
+    code = frame[1]
+    if code not in COMPRESSIBLE_CODES:
+        return frame
+    body = zlib.compress(memoryview(frame)[BINARY_HEADER.size :], COMPRESS_LEVEL)
+    if len(body) >= len(frame) - BINARY_HEADER.size:
+        return frame
+    return BINARY_HEADER.pack(BINARY_MARKER, code | COMPRESSED_FLAG, len(body)) + body
+
+
+def _inflate(body: bytes) -> bytes | None:
+    inflater = zlib.decompressobj()
+    try:
+        data = inflater.decompress(body, MAX_INFLATED_BYTES)
+    except zlib.error:
+        return None
+    if inflater.unconsumed_tail or not inflater.eof:
+        return None
+    return data
+
+
+def parse_binary_body(
+    code: int, body: bytes, inflate: bool = False
+) -> str | FileMessage | FileChunk:
+    """Decode one binary frame body; compressed bodies only when `inflate` was negotiated."""
+    compressed = code & COMPRESSED_FLAG
+    code &= ~COMPRESSED_FLAG
+    command = BINARY_COMMANDS[code - 1] if 0 < code <= len(BINARY_COMMANDS) else ""
+    if compressed:
+        inflated = _inflate(body) if inflate else None
+        if inflated is None:
+            return command
+        body = inflated
+    if command == FILE_CHUNK:
+        return _parse_binary_chunk(body)
+    if command != FILE:
+        return f"{command}{body.decode(errors='ignore')}".strip()
+
+    parts = body.split(DIRECT_SEPARATOR.encode(), 2)
+    if len(parts) != 3:
+        return FILE
+    peer = normalize_username(parts[0].decode(errors="ignore"))
+    filename = safe_filename(parts[1].decode(errors="ignore"))
+    data = parts[2]
+    if not peer or not data or len(data) > MAX_FILE_BYTES:
+        return FILE
+    return FileMessage(peer, filename, data)
+
+
+def _parse_binary_chunk(body: bytes) -> str | FileChunk:
+    parts = body.split(DIRECT_SEPARATOR.encode(), 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return FILE_CHUNK
+    transfer_id = parts[0].decode(errors="ignore").strip()
+    data = parts[2]
+    if not transfer_id or not data or len(data) > MAX_FILE_BYTES:
+        return FILE_CHUNK
+    return FileChunk(transfer_id, int(parts[1]), data)
+
+
+def frame_payload(frame: bytes) -> memoryview:
+    """Return the datagram bytes of a framed message without copying them."""
+    return memoryview(frame)[:-1]
+
+
 def split_frames(buffer: str) -> tuple[list[str], str]:
     parts = buffer.splitlines(keepends=True)
     messages: list[str] = []
@@ -202,6 +748,356 @@ def split_frames(buffer: str) -> tuple[list[str], str]:
     return [message for message in messages if message], remainder
 
 
+class FrameDecoder:
+    """Split a TCP byte stream into newline-framed messages as chunks arrive.
+
+    Only newly received bytes are scanned for the frame delimiter, and only complete
+    frames are decoded, so a large frame arriving in many chunks costs linear time.
+    Length-prefixed binary frames start with a zero byte, which never begins a text
+    frame, so both kinds can share one stream. Binary attachments decode to
+    `FileMessage` or `FileChunk` values; every other frame decodes to its command text.
+    Set `inflate` once the peer negotiated compression; until then a frame with the
+    compressed flag is treated as a bad frame.
+    """
+
+    __slots__ = ("_buffer", "_scanned", "inflate")
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._scanned = 0
+        self.inflate = False
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[str | FileMessage | FileChunk]:
+        self._buffer += data
+        messages: list[str | FileMessage | FileChunk] = []
+        start = 0
+        search_from = self._scanned
+        while start < len(self._buffer):
+            message: str | FileMessage | FileChunk
+            if self._buffer[start] == BINARY_MARKER:
+                body_start = start + BINARY_HEADER.size
+                if len(self._buffer) < body_start:
+                    break
+                _marker, code, length = BINARY_HEADER.unpack_from(self._buffer, start)
+                end = body_start + length
+                if len(self._buffer) < end:
+                    break
+                message = parse_binary_body(code, bytes(self._buffer[body_start:end]), self.inflate)
+            else:
+                newline = self._buffer.find(b"\n", max(start, search_from))
+                if newline < 0:
+                    break
+                message = self._buffer[start:newline].decode(errors="ignore").strip()
+                end = newline + 1
+            if message:
+                messages.append(message)
+            start = end
+        if start:
+            del self._buffer[:start]
+        self._scanned = len(self._buffer)
+        return messages
+
+    def clear(self) -> None:
+        self._buffer.clear()
+        self._scanned = 0
+        self.inflate = False
+
+
+@dataclass(slots=True)
+class WriteStats:
+    writes: int = 0
+    frames: int = 0
+    byte_count: int = 0
+
+    @property
+    def frames_per_write(self) -> float:
+        return self.frames / self.writes if self.writes else 0.0
+
+
+class WriteCoalescer:
+    """Gather the frames written to one stream during an event-loop turn into one write.
+
+    `push` buffers a frame and returns True when the caller should flush at once,
+    because the buffer reached `max_bytes` or its oldest frame has waited
+    `max_delay` seconds; otherwise the caller flushes when the turn ends. `flush`
+    returns everything buffered as one bytes object and counts it in `stats`.
+    """
+
+    __slots__ = ("_first_at", "_frames", "buffered_bytes", "max_bytes", "max_delay", "stats")
+
+    def __init__(
+        self,
+        stats: WriteStats | None = None,
+        max_bytes: int = COALESCE_BYTES,
+        max_delay: float = COALESCE_DELAY,
+    ) -> None:
+        self.stats = stats or WriteStats()
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._frames: list[bytes] = []
+        self._first_at = 0.0
+        self.buffered_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def push(self, frame: bytes, now: float) -> bool:
+        if not self._frames:
+            self._first_at = now
+        self._frames.append(frame)
+        self.buffered_bytes += len(frame)
+        return self.buffered_bytes >= self.max_bytes or now - self._first_at >= self.max_delay
+
+    def flush(self) -> bytes:
+        if not self._frames:
+            return b""
+        # A lone frame, often a large attachment chunk, is returned without copying.
+        data = self._frames[0] if len(self._frames) == 1 else b"".join(self._frames)
+        self.stats.writes += 1
+        self.stats.frames += len(self._frames)
+        self.stats.byte_count += len(data)
+        self.clear()
+        return data
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self.buffered_bytes = 0
+
+
+def reliable_datagram(session: int, seq: int, payload: bytes | memoryview) -> bytes:
+    return b"%s%d|%d|" % (RELIABLE_PREFIX, session, seq) + payload
+
+
+def ack_datagram(session: int, seq: int) -> bytes:
+    return b"%s%d|%d" % (ACK_PREFIX, session, seq)
+
+
+def parse_reliable_datagram(datagram: bytes) -> tuple[int, int, bytes] | None:
+    if not datagram.startswith(RELIABLE_PREFIX):
+        return None
+    parts = datagram[len(RELIABLE_PREFIX) :].split(b"|", 2)
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return int(parts[0]), int(parts[1]), parts[2]
+
+
+def parse_ack_datagram(datagram: bytes) -> tuple[int, int] | None:
+    if not datagram.startswith(ACK_PREFIX):
+        return None
+    parts = datagram[len(ACK_PREFIX) :].split(b"|")
+    if len(parts) != 2 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return int(parts[0]), int(parts[1])
+
+
+def datagram_text(payload: bytes) -> str:
+    """Decode one UDP command the way TCP frames are decoded, dropping invalid UTF-8."""
+    return payload.decode(errors="ignore").strip()
+
+
+@dataclass(slots=True)
+class UnackedDatagram:
+    datagram: bytes
+    sent_at: float
+    deadline: float
+    attempts: int = 1
+
+
+class ReliableChannel:
+    """Sequence, acknowledge, and retransmit the datagrams exchanged with one peer.
+
+    The channel does no I/O: callers pass a monotonic clock reading and send the
+    bytes it returns. Each outgoing datagram carries this channel's random session
+    id and the next sequence number, and is resent after an RTT-based timeout
+    until it is acknowledged or has been sent `MAX_SEND_ATTEMPTS` times. Each
+    incoming datagram is acknowledged on its own and delivered once, in arrival
+    order, so one lost datagram never holds back the ones behind it.
+    """
+
+    __slots__ = (
+        "_above",
+        "_next_seq",
+        "_through",
+        "_unacked",
+        "duplicates",
+        "lost",
+        "peer_session",
+        "retransmits",
+        "rto",
+        "rttvar",
+        "session",
+        "srtt",
+    )
+
+    def __init__(self, session: int | None = None) -> None:
+        self.session = secrets.randbits(32) if session is None else session
+        self._next_seq = 1
+        self._unacked: dict[int, UnackedDatagram] = {}
+        self.srtt: float | None = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+        self.peer_session: int | None = None
+        self._through = 0
+        self._above: set[int] = set()
+        self.retransmits = 0
+        self.lost = 0
+        self.duplicates = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._unacked)
+
+    def wrap(self, payload: bytes | memoryview, now: float) -> bytes:
+        seq = self._next_seq
+        self._next_seq += 1
+        datagram = reliable_datagram(self.session, seq, payload)
+        self._unacked[seq] = UnackedDatagram(datagram, now, now + self.rto)
+        return datagram
+
+    def receive(self, datagram: bytes, now: float) -> tuple[bytes | None, bytes | None]:
+        """Return the payload to deliver, if any, and the acknowledgement to send, if any."""
+        ack = parse_ack_datagram(datagram)
+        if ack is not None:
+            self._acknowledge(*ack, now)
+            return None, None
+        parsed = parse_reliable_datagram(datagram)
+        if parsed is None:
+            return datagram, None
+        session, seq, payload = parsed
+        if session != self.peer_session:
+            # A new session means the peer restarted its channel and its sequence.
+            self.peer_session = session
+            self._through = 0
+            self._above.clear()
+        reply = ack_datagram(session, seq)
+        if not self._first_delivery(seq):
+            self.duplicates += 1
+            return None, reply
+        return payload, reply
+
+    def due(self, now: float) -> list[bytes]:
+        """Return the datagrams whose retransmit timeout has passed."""
+        resend: list[bytes] = []
+        for seq, pending in list(self._unacked.items()):
+            if pending.deadline > now:
+                continue
+            if pending.attempts >= MAX_SEND_ATTEMPTS:
+                del self._unacked[seq]
+                self.lost += 1
+                continue
+            pending.attempts += 1
+            pending.deadline = now + min(self.rto * 2 ** (pending.attempts - 1), MAX_RTO)
+            resend.append(pending.datagram)
+        self.retransmits += len(resend)
+        return resend
+
+    def next_deadline(self) -> float | None:
+        return min((pending.deadline for pending in self._unacked.values()), default=None)
+
+    def _acknowledge(self, session: int, seq: int, now: float) -> None:
+        if session != self.session:
+            return
+        pending = self._unacked.pop(seq, None)
+        # Karn's rule: a retransmitted datagram's ack cannot say which send it answers.
+        if pending is not None and pending.attempts == 1:
+            self._sample_rtt(now - pending.sent_at)
+
+    def _sample_rtt(self, sample: float) -> None:
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(max(self.srtt + 4 * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def _first_delivery(self, seq: int) -> bool:
+        if seq <= self._through or seq in self._above:
+            return False
+        self._above.add(seq)
+        while self._through + 1 in self._above:
+            self._through += 1
+            self._above.discard(self._through)
+        if seq - self._through > RECEIVE_WINDOW:
+            # Give up on gaps the sender has long since abandoned.
+            self._through = seq - RECEIVE_WINDOW
+            self._above = {above for above in self._above if above > self._through}
+        return True
+
+
+class ReliableEndpoint:
+    """Reliable channels for every peer of one UDP socket.
+
+    A peer gets a channel the first time it sends a well-formed `{RUDP}` datagram.
+    Datagrams from other peers pass through untouched and replies to them are
+    sent unwrapped, so clients without the reliable layer keep working; an
+    `{ACK}` from a peer without a channel is dropped. Channels whose peer has been
+    silent for `idle_seconds` with nothing left in flight are removed, so peers
+    that vanish without `{DISCONNECT}` do not accumulate.
+    """
+
+    __slots__ = ("_last_heard", "_next_sweep", "channels", "idle_seconds")
+
+    def __init__(self, idle_seconds: float = RELIABLE_IDLE_SECONDS) -> None:
+        self.channels: dict[Hashable, ReliableChannel] = {}
+        self.idle_seconds = idle_seconds
+        self._last_heard: dict[Hashable, float] = {}
+        self._next_sweep = idle_seconds
+
+    def receive(
+        self, peer: Hashable, datagram: bytes, now: float
+    ) -> tuple[bytes | None, bytes | None]:
+        if now >= self._next_sweep:
+            self.expire(now)
+        channel = self.channels.get(peer)
+        if channel is None:
+            if datagram.startswith(ACK_PREFIX):
+                return None, None
+            if parse_reliable_datagram(datagram) is None:
+                return datagram, None
+            channel = self.channels[peer] = ReliableChannel()
+        self._last_heard[peer] = now
+        return channel.receive(datagram, now)
+
+    def expire(self, now: float) -> list[Hashable]:
+        """Remove idle channels with nothing in flight and return their peers."""
+        self._next_sweep = now + self.idle_seconds
+        idle = [
+            peer
+            for peer, channel in self.channels.items()
+            if not channel.in_flight and now - self._last_heard[peer] >= self.idle_seconds
+        ]
+        for peer in idle:
+            self.forget(peer)
+        return idle
+
+    def wrap(self, peer: Hashable, payload: bytes | memoryview, now: float) -> bytes | memoryview:
+        channel = self.channels.get(peer)
+        return payload if channel is None else channel.wrap(payload, now)
+
+    def due(self, now: float) -> list[tuple[Hashable, bytes]]:
+        return [
+            (peer, datagram)
+            for peer, channel in self.channels.items()
+            for datagram in channel.due(now)
+        ]
+
+    def next_deadline(self) -> float | None:
+        deadlines = [channel.next_deadline() for channel in self.channels.values()]
+        return min((deadline for deadline in deadlines if deadline is not None), default=None)
+
+    def forget(self, peer: Hashable) -> None:
+        self.channels.pop(peer, None)
+        self._last_heard.pop(peer, None)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(channel.in_flight for channel in self.channels.values())
+
+
 def message_has_chat_text(message: str) -> bool:
     if message.startswith(ALL):
         return bool(clean_chat_text(command_payload(message, ALL)))
@@ -210,33 +1106,45 @@ def message_has_chat_text(message: str) -> bool:
 
 
 def handle_server_message(message: str, peer: str, peer_port: int) -> ServerResult:
-    peer_label = f"{peer}:{peer_port}"
+    command = parse_command(message)
+    handler = _SERVER_HANDLERS.get(command.tag)
+    return ServerResult() if handler is None else handler(command, peer, f"{peer}:{peer_port}")
 
-    if message.startswith(CONNECT):
-        return ServerResult(log_line=f"{peer_label} has connected.")
 
-    if message.startswith(DISCONNECT):
-        return ServerResult(
-            log_line=f"{peer_label} has disconnected.",
-            close_connection=True,
-        )
+def _connected(_command: Command, _peer: str, peer_label: str) -> ServerResult:
+    return ServerResult(log_line=f"{peer_label} has connected.")
 
-    if message.startswith(REGISTER):
-        name = display_name(message, REGISTER, peer)
-        return ServerResult(reply=server_message(f"Welcome {name}!"))
 
-    if message.startswith(UNREGISTER):
-        name = display_name(message, UNREGISTER, peer)
-        return ServerResult(reply=server_message(f"Bye {name}!"))
+def _disconnected(_command: Command, _peer: str, peer_label: str) -> ServerResult:
+    return ServerResult(log_line=f"{peer_label} has disconnected.", close_connection=True)
 
-    if message.startswith(ALL):
-        text = command_payload(message, ALL)
-        return ServerResult(reply=server_message(chat_line(peer, text)))
 
-    direct = parse_direct_message(message)
-    if direct is not None:
-        return ServerResult(
-            reply=server_message(direct_chat_line(peer, direct.recipient, direct.text))
-        )
+def _welcome(command: Command, peer: str, _peer_label: str) -> ServerResult:
+    name = display_name(command.text, REGISTER, peer)
+    return ServerResult(reply=server_message(f"Welcome {name}!"))
+
+
+def _goodbye(command: Command, peer: str, _peer_label: str) -> ServerResult:
+    name = display_name(command.text, UNREGISTER, peer)
+    return ServerResult(reply=server_message(f"Bye {name}!"))
+
+
+def _public_line(command: Command, peer: str, _peer_label: str) -> ServerResult:
+    return ServerResult(reply=server_message(chat_line(peer, command.payload.strip())))
+
+
+def _direct_line(command: Command, peer: str, _peer_label: str) -> ServerResult:
+    direct = parse_direct_message(command.text)
+    if direct is None:
+        return ServerResult()
+    return ServerResult(reply=server_message(direct_chat_line(peer, direct.recipient, direct.text)))
+
 
-    return ServerResult()
+_SERVER_HANDLERS: dict[str, Callable[[Command, str, str], ServerResult]] = {
+    CONNECT: _connected,
+    DISCONNECT: _disconnected,
+    REGISTER: _welcome,
+    UNREGISTER: _goodbye,
+    ALL: _public_line,
+    TO: _direct_line,
+}
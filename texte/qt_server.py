@@ -0,0 +1,378 @@
+"""Qt socket adapters for the Texte servers."""
+
+import logging
+import sys
+import time
+from collections import OrderedDict
+
+from PyQt6 import QtCore, QtNetwork
+
+from texte.backpressure import CONTROL, OutboundQueue, ServerStats, WriteLimits, frame_kind
+from texte.chat_room import ChatRoom, Delivery, Room, RoutingResult, is_udp_address
+from texte.metrics import InstrumentedRoom, ServerMetrics, http_response
+from texte.protocol import (
+    FrameDecoder,
+    ReliableEndpoint,
+    WriteCoalescer,
+    binary_frame,
+    connect_message,
+    datagram_text,
+    error_message,
+    frame_payload,
+    is_attachment_command,
+    wants_binary_frames,
+    wants_compressed_frames,
+)
+from texte.server_log import log_event
+
+# Distinct sender hosts kept parsed; clients behind one host share an entry.
+MAX_CACHED_HOSTS = 4096
+
+
+class PeerAddresses:
+    """Parsed QHostAddress objects for UDP peers, so replies skip re-parsing the host.
+
+    A broadcast to many clients otherwise builds one QHostAddress per datagram.
+    The oldest host is dropped once `limit` distinct hosts have been seen.
+    """
+
+    def __init__(self, limit: int = MAX_CACHED_HOSTS) -> None:
+        self.limit = limit
+        self._addresses: OrderedDict[str, QtNetwork.QHostAddress] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def remember(self, host: str, address: QtNetwork.QHostAddress) -> None:
+        if host not in self._addresses:
+            self._store(host, address)
+
+    def get(self, host: str) -> QtNetwork.QHostAddress:
+        address = self._addresses.get(host)
+        if address is None:
+            address = QtNetwork.QHostAddress(host)
+            self._store(host, address)
+        return address
+
+    def _store(self, host: str, address: QtNetwork.QHostAddress) -> None:
+        self._addresses[host] = address
+        while len(self._addresses) > self.limit:
+            self._addresses.popitem(last=False)
+
+
+def serve_metrics(metrics: ServerMetrics, port: int) -> QtNetwork.QTcpServer | None:
+    """Serve `metrics` over HTTP on the loopback interface, or return None if the port is taken."""
+    server = QtNetwork.QTcpServer()
+    if not server.listen(
+        QtNetwork.QHostAddress(QtNetwork.QHostAddress.SpecialAddress.LocalHost), port
+    ):
+        log_event("metrics.failed", logging.ERROR, port=port)
+        return None
+
+    def answer(scrape: QtNetwork.QTcpSocket, request: bytearray) -> None:
+        request += scrape.readAll().data()
+        response = http_response(bytes(request), metrics)
+        if response is not None:
+            scrape.write(response)
+            scrape.disconnectFromHost()
+
+    def new_scrape() -> None:
+        while server.hasPendingConnections():
+            scrape = server.nextPendingConnection()
+            if scrape is None:
+                continue
+            request = bytearray()
+            scrape.readyRead.connect(lambda scrape=scrape, request=request: answer(scrape, request))
+            scrape.disconnected.connect(scrape.deleteLater)
+
+    server.newConnection.connect(new_scrape)
+    log_event("metrics.listening", url=f"http://127.0.0.1:{port}/metrics")
+    return server
+
+
+def run_udp_server(
+    host: str = "127.0.0.1", port: int = 33002, metrics_port: int | None = None
+) -> None:
+    """Run the UDP server on a Qt event loop."""
+    app = QtCore.QCoreApplication(sys.argv)
+    udp_socket = QtNetwork.QUdpSocket()
+    metrics = ServerMetrics()
+    room = InstrumentedRoom(ChatRoom(), metrics)
+    endpoint = ReliableEndpoint()
+    addresses = PeerAddresses()
+    retransmit_timer = QtCore.QTimer()
+    retransmit_timer.setSingleShot(True)
+
+    if not udp_socket.bind(QtNetwork.QHostAddress(host), port):
+        log_event("server.failed", logging.ERROR, protocol="udp", host=host, port=port)
+        sys.exit(1)
+
+    def write(data: bytes | memoryview, peer: tuple[str, int]) -> None:
+        metrics.bytes_sent += len(data)
+        udp_socket.writeDatagram(data, addresses.get(peer[0]), peer[1])
+
+    def send(payload: bytes | memoryview, peer: tuple[str, int]) -> None:
+        write(endpoint.wrap(peer, payload, time.monotonic()), peer)
+
+    def send_delivery(delivery: Delivery) -> None:
+        recipient = delivery.recipient
+        if not is_udp_address(recipient):
+            return
+        send(frame_payload(delivery.frame), recipient)
+
+    def apply_result(peer: tuple[str, int], result: RoutingResult) -> None:
+        if result.log_line:
+            log_event("room.event", text=result.log_line)
+        for delivery in result.deliveries:
+            send_delivery(delivery)
+        if result.close_connection:
+            endpoint.forget(peer)
+
+    def schedule_retransmit() -> None:
+        deadline = endpoint.next_deadline()
+        if deadline is None:
+            retransmit_timer.stop()
+        else:
+            retransmit_timer.start(max(0, int((deadline - time.monotonic()) * 1000)))
+
+    def retransmit() -> None:
+        for peer, datagram in endpoint.due(time.monotonic()):
+            if is_udp_address(peer):
+                write(datagram, peer)
+        schedule_retransmit()
+
+    def receive_message() -> None:
+        # Drain every queued datagram before rescheduling retransmits once for the batch.
+        # A negative pending size means the queue is empty, which saves a separate
+        # hasPendingDatagrams() check per datagram.
+        while (size := udp_socket.pendingDatagramSize()) >= 0:
+            datagram, sender, sender_port = udp_socket.readDatagram(size)
+            if sender is None:
+                continue
+            metrics.bytes_received += len(datagram)
+            sender_str = sender.toString()
+            addresses.remember(sender_str, sender)
+            peer = (sender_str, sender_port)
+            peer_label = f"{sender_str}:{sender_port}"
+            payload, ack = endpoint.receive(peer, datagram, time.monotonic())
+            if ack is not None:
+                write(ack, peer)
+            if payload is None:
+                continue
+            message = datagram_text(payload)
+            if is_attachment_command(message):
+                send(error_message("Attachments require TCP.").encode(), peer)
+                continue
+            apply_result(peer, room.route(peer, message, peer_label))
+        schedule_retransmit()
+
+    metrics.add_gauge(
+        "texte_unacked_datagrams",
+        "Reliable datagrams waiting for an acknowledgement.",
+        lambda: endpoint.in_flight,
+    )
+    retransmit_timer.timeout.connect(retransmit)
+    udp_socket.readyRead.connect(receive_message)
+    log_event("server.listening", protocol="udp", host=host, port=port)
+    metrics_server = None if metrics_port is None else serve_metrics(metrics, metrics_port)
+    status = app.exec()
+    if metrics_server is not None:
+        metrics_server.close()
+    sys.exit(status)
+
+
+class WriteFlusher:
+    """Flush every connection that buffered frames during one event-loop turn, on one timer."""
+
+    def __init__(self) -> None:
+        self._pending: dict[TcpConnectionHandler, None] = {}
+        self._timer = QtCore.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.flush)
+
+    def schedule(self, handler: "TcpConnectionHandler") -> None:
+        if not self._pending:
+            self._timer.start()
+        self._pending[handler] = None
+
+    def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for handler in pending:
+            handler.flush()
+
+
+class TcpConnectionHandler(QtCore.QObject):
+    """Handle one newline-framed or binary-framed TCP client connection."""
+
+    def __init__(
+        self,
+        socket: QtNetwork.QTcpSocket,
+        room: Room,
+        connections: dict[QtNetwork.QTcpSocket, "TcpConnectionHandler"],
+        on_empty_connections,
+        limits: WriteLimits | None = None,
+        stats: ServerStats | None = None,
+        flusher: WriteFlusher | None = None,
+        metrics: ServerMetrics | None = None,
+    ) -> None:
+        super().__init__()
+        self.socket = socket
+        self.room = room
+        self.connections = connections
+        self.on_empty_connections = on_empty_connections
+        self.decoder = FrameDecoder()
+        self.binary_frames = False
+        self.compressed_frames = False
+        stats = stats or ServerStats()
+        self.outbound = OutboundQueue(limits or WriteLimits(), stats)
+        self.coalescer = WriteCoalescer(stats.writes)
+        self.flusher = flusher or WriteFlusher()
+        self.metrics = metrics or ServerMetrics(stats)
+        self.dropped = False
+        self.socket.readyRead.connect(self.read_data)
+        self.socket.bytesWritten.connect(self.drain)
+        self.socket.disconnected.connect(self.close)
+        self.socket.disconnected.connect(self.socket.deleteLater)
+
+    @property
+    def peer_label(self) -> str:
+        return f"{self.socket.peerAddress().toString()}:{self.socket.peerPort()}"
+
+    @property
+    def pending_bytes(self) -> int:
+        return self.socket.bytesToWrite() + self.coalescer.buffered_bytes
+
+    def write(self, frame: bytes, kind: str = CONTROL) -> None:
+        if self.dropped:
+            return
+        frames = self.outbound.push(frame, kind, self.pending_bytes)
+        if frames is None:
+            self._drop_slow_consumer()
+            return
+        for ready in frames:
+            self._queue(ready)
+
+    def drain(self, _written: int = 0) -> None:
+        for frame in self.outbound.drain(self.pending_bytes):
+            self._queue(frame)
+
+    def flush(self) -> None:
+        if self.coalescer and not self.dropped:
+            data = self.coalescer.flush()
+            self.metrics.bytes_sent += len(data)
+            self.socket.write(data)
+
+    def _queue(self, frame: bytes) -> None:
+        if self.coalescer.push(frame, time.monotonic()):
+            self.flush()
+        elif len(self.coalescer) == 1:
+            self.flusher.schedule(self)
+
+    def deliver(self, delivery: Delivery) -> None:
+        if self.compressed_frames:
+            frame = delivery.compressed_frame
+        else:
+            frame = delivery.binary_frame if self.binary_frames else delivery.frame
+        self.write(frame, frame_kind(delivery))
+
+    def _drop_slow_consumer(self) -> None:
+        # Abort on the next loop turn so routing in progress never sees a half-closed peer.
+        self.dropped = True
+        self.outbound.clear()
+        self.coalescer.clear()
+        log_event("connection.slow_disconnect", logging.WARNING, peer=self.peer_label)
+        QtCore.QTimer.singleShot(0, self.socket.abort)
+
+    def close(self) -> None:
+        log_event("connection.closed", peer=self.peer_label)
+        self.coalescer.clear()
+        result = self.room.unregister(self.socket)
+        self.connections.pop(self.socket, None)
+        self._apply_result(result)
+        if not self.connections:
+            self.on_empty_connections()
+
+    def read_data(self) -> None:
+        data = self.socket.readAll().data()
+        self.metrics.bytes_received += len(data)
+        for message in self.decoder.feed(data):
+            if isinstance(message, str) and wants_binary_frames(message):
+                self.binary_frames = True
+                self.compressed_frames = wants_compressed_frames(message)
+                self.decoder.inflate = self.compressed_frames
+                self.write(
+                    binary_frame(connect_message(binary=True, compressed=self.compressed_frames))
+                )
+            result = self.room.route(self.socket, message, self.peer_label)
+            self._apply_result(result)
+            if result.close_connection:
+                self.flush()
+                self.socket.disconnectFromHost()
+                break
+
+    def _apply_result(self, result: RoutingResult) -> None:
+        if result.log_line:
+            log_event("room.event", text=result.log_line)
+        for delivery in result.deliveries:
+            recipient = delivery.recipient
+            if not isinstance(recipient, QtNetwork.QTcpSocket):
+                continue
+            handler = self.connections.get(recipient)
+            if handler is not None:
+                handler.deliver(delivery)
+
+
+def run_tcp_server(
+    host: str = "127.0.0.1",
+    port: int = 33002,
+    limits: WriteLimits | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Run the TCP server on a Qt event loop."""
+    app = QtCore.QCoreApplication(sys.argv)
+    tcp_server = QtNetwork.QTcpServer()
+    stats = ServerStats()
+    metrics = ServerMetrics(stats)
+    room = InstrumentedRoom(ChatRoom(), metrics)
+    flusher = WriteFlusher()
+
+    if not tcp_server.listen(QtNetwork.QHostAddress(host), port):
+        log_event("server.failed", logging.ERROR, protocol="tcp", host=host, port=port)
+        sys.exit(1)
+    log_event("server.listening", protocol="tcp", host=host, port=port)
+
+    connections: dict[QtNetwork.QTcpSocket, TcpConnectionHandler] = {}
+    metrics.add_gauge("texte_connections", "Open TCP client connections.", connections.__len__)
+    metrics.add_gauge(
+        "texte_outbound_queue_bytes",
+        "Bytes written or held for TCP clients but not yet sent.",
+        lambda: sum(
+            handler.pending_bytes + handler.outbound.held_bytes for handler in connections.values()
+        ),
+    )
+    metrics_server = None if metrics_port is None else serve_metrics(metrics, metrics_port)
+
+    def stop_when_idle() -> None:
+        if connections:
+            return
+        tcp_server.close()
+        app.quit()
+
+    def new_connection() -> None:
+        while tcp_server.hasPendingConnections():
+            client_socket = tcp_server.nextPendingConnection()
+            if client_socket is None:
+                continue
+            handler = TcpConnectionHandler(
+                client_socket, room, connections, stop_when_idle, limits, stats, flusher, metrics
+            )
+            connections[client_socket] = handler
+            log_event("connection.opened", peer=handler.peer_label)
+
+    tcp_server.newConnection.connect(new_connection)
+    status = app.exec()
+    if metrics_server is not None:
+        metrics_server.close()
+    log_event("server.stopped", protocol="tcp", stats=stats.fields())
+    sys.exit(status)
@@ -0,0 +1,138 @@
+"""Bounded chat history kept by the server so clients can catch up after reconnecting."""
+
+import heapq
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+from operator import attrgetter
+
+DEFAULT_ROOM_MESSAGES = 500
+DEFAULT_ROOM_BYTES = 256 * 1024
+# Direct-message pairs past this count drop their history, least recently used first.
+DEFAULT_DIRECT_ROOMS = 1024
+# Past this many stored bytes across every room, direct pairs go least recently used first.
+DEFAULT_TOTAL_BYTES = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryLimits:
+    room_messages: int = DEFAULT_ROOM_MESSAGES
+    room_bytes: int = DEFAULT_ROOM_BYTES
+    direct_rooms: int = DEFAULT_DIRECT_ROOMS
+    total_bytes: int = DEFAULT_TOTAL_BYTES
+
+
+@dataclass(frozen=True, slots=True)
+class StoredLine:
+    seq: int
+    text: str
+    size: int
+
+
+class HistoryRing:
+    """The newest display lines of one room, capped by count and by encoded size."""
+
+    __slots__ = ("_lines", "byte_count", "limits")
+
+    def __init__(self, limits: HistoryLimits) -> None:
+        self.limits = limits
+        self._lines: deque[StoredLine] = deque()
+        self.byte_count = 0
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def append(self, line: StoredLine) -> None:
+        self._lines.append(line)
+        self.byte_count += line.size
+        while self._lines and (
+            len(self._lines) > self.limits.room_messages or self.byte_count > self.limits.room_bytes
+        ):
+            self.byte_count -= self._lines.popleft().size
+
+    def since(self, seq: int) -> list[StoredLine]:
+        newer: list[StoredLine] = []
+        for line in reversed(self._lines):
+            if line.seq <= seq:
+                break
+            newer.append(line)
+        newer.reverse()
+        return newer
+
+    def last(self, count: int) -> list[StoredLine]:
+        if count <= 0:
+            return []
+        start = max(0, len(self._lines) - count)
+        return [self._lines[index] for index in range(start, len(self._lines))]
+
+
+class RoomHistory:
+    """Ring buffers for the public room and for each direct-message pair.
+
+    Every recorded line takes the next value of one server-wide sequence, so a
+    client that remembers the last sequence it saw can ask for exactly what it
+    missed across every room it can read.
+
+    Direct rooms are keyed by reader ids, one per sign-in rather than per name,
+    so someone who later takes a departed user's name cannot read their direct
+    messages. `forget` drops a reader's direct rooms when they leave.
+    """
+
+    def __init__(self, limits: HistoryLimits | None = None) -> None:
+        self.limits = limits or HistoryLimits()
+        self.head = 0
+        self.byte_count = 0
+        self._public = HistoryRing(self.limits)
+        self._direct: OrderedDict[frozenset[Hashable], HistoryRing] = OrderedDict()
+
+    def record_public(self, text: str) -> StoredLine:
+        return self._record(self._public, text)
+
+    def record_direct(self, sender: Hashable, recipient: Hashable, text: str) -> StoredLine:
+        key = frozenset((sender, recipient))
+        ring = self._direct.get(key)
+        if ring is None:
+            ring = self._direct[key] = HistoryRing(self.limits)
+            while len(self._direct) > self.limits.direct_rooms:
+                self._drop_oldest_direct()
+        else:
+            self._direct.move_to_end(key)
+        return self._record(ring, text)
+
+    def forget(self, reader: Hashable) -> None:
+        """Drop every direct room `reader` takes part in."""
+        for key in [key for key in self._direct if reader in key]:
+            self.byte_count -= self._direct.pop(key).byte_count
+
+    def since(self, reader: Hashable, seq: int) -> list[StoredLine]:
+        """Return every stored line `reader` can read newer than `seq`, oldest first."""
+        return list(_merge(ring.since(seq) for ring in self._readable(reader)))
+
+    def last(self, reader: Hashable, count: int) -> list[StoredLine]:
+        """Return the newest `count` lines `reader` can read, oldest first."""
+        if count <= 0:
+            return []
+        return list(_merge(ring.last(count) for ring in self._readable(reader)))[-count:]
+
+    def _record(self, ring: HistoryRing, text: str) -> StoredLine:
+        self.head += 1
+        line = StoredLine(self.head, text, len(text.encode()))
+        before = ring.byte_count
+        ring.append(line)
+        self.byte_count += ring.byte_count - before
+        while self.byte_count > self.limits.total_bytes and self._direct:
+            self._drop_oldest_direct()
+        return line
+
+    def _drop_oldest_direct(self) -> None:
+        _key, ring = self._direct.popitem(last=False)
+        self.byte_count -= ring.byte_count
+
+    def _readable(self, reader: Hashable) -> list[HistoryRing]:
+        rings = [self._public]
+        rings.extend(ring for pair, ring in self._direct.items() if reader in pair)
+        return rings
+
+
+def _merge(runs: Iterable[list[StoredLine]]) -> Iterable[StoredLine]:
+    return heapq.merge(*runs, key=attrgetter("seq"))
@@ -13,11 +13,43 @@ Supported commands:
     {ALL}        - Broadcasts a timestamped message to registered clients.
     {TO}         - Routes a direct message to one registered user.
     {FILE}       - Routes small TCP file attachments.
+    {FILEBEGIN}, {FILECHUNK}, {FILEEND}
+                 - Stream larger TCP attachments in chunks.
+    {HISTORY}    - Replays recent chat lines after reconnecting.
+    {STATS}      - Answers clients on the server host with headline metrics.
+
+TCP clients may send `{CONNECT}binary` to receive length-prefixed binary frames,
+which carry attachments as raw bytes instead of base64.
+
+The default backend runs on a Qt event loop. `--backend asyncio` serves the same
+ChatRoom from asyncio streams and datagram endpoints and does not import Qt.
+`--workers N` spreads TCP connections across N asyncio worker processes that
+share one room through the parent process.
+
+Each TCP client has an outbound limit. Once more than `--high-water` bytes are
+waiting to be sent to it, `--slow-consumer` decides what happens. `drop-chat`
+(the default) holds frames and drops the oldest chat lines first.
+`disconnect` drops the client. `pause-attachments` holds attachment frames but
+keeps chat flowing. Held frames go out again once the backlog falls below
+`--low-water`.
+
+`--metrics-port PORT` serves per-command counts, routing latency histograms,
+byte counts, connection counts, and outbound queue depth as Prometheus text on
+http://127.0.0.1:PORT/metrics.
+
+Server events are written as JSON lines to stderr, or to `--log-file`, which
+rotates at `--log-max-bytes`. A background thread does the writing, so a slow
+terminal or disk never stalls routing; past a bounded backlog, records are
+dropped and counted. `--log-sample N` keeps one in N per-connection events.
 
 Usage:
     python server.py
     python server.py tcp
     python server.py --protocol tcp --port 33003
+    python server.py tcp --backend asyncio
+    python server.py tcp --workers 4
+    python server.py tcp --metrics-port 9102
+    python server.py tcp --log-file texte-server.log --log-sample 100
 
 Author: Sabneet Bains
 License: MIT
@@ -25,160 +57,53 @@ License: MIT
 
 import argparse
 import sys
-from typing import TypeGuard
-
-from PyQt6 import QtCore, QtNetwork
-
-from texte.chat_room import ChatRoom, Delivery, RoutingResult
-from texte.protocol import FILE, error_message, frame_message, split_frames
-
-
-def run_udp_server(host: str = "127.0.0.1", port: int = 33002) -> None:
-    """Run the UDP server."""
-    app = QtCore.QCoreApplication(sys.argv)
-    udp_socket = QtNetwork.QUdpSocket()
-    room = ChatRoom()
-
-    if not udp_socket.bind(QtNetwork.QHostAddress(host), port):
-        print("UDP bind failed")
-        sys.exit(1)
-
-    def send_delivery(delivery: Delivery) -> None:
-        recipient = delivery.recipient
-        if not _is_udp_recipient(recipient):
-            return
-        client_host, client_port = recipient
-        udp_socket.writeDatagram(
-            delivery.message.encode(),
-            QtNetwork.QHostAddress(client_host),
-            client_port,
-        )
-
-    def apply_result(result: RoutingResult) -> None:
-        if result.log_line:
-            print(result.log_line)
-        for delivery in result.deliveries:
-            send_delivery(delivery)
-
-    def receive_message() -> None:
-        while udp_socket.hasPendingDatagrams():
-            datagram, sender, sender_port = udp_socket.readDatagram(
-                udp_socket.pendingDatagramSize()
-            )
-            if sender is None:
-                continue
-            sender_str = sender.toString()
-            peer = (sender_str, sender_port)
-            peer_label = f"{sender_str}:{sender_port}"
-            message = datagram.decode().strip()
-            if message.startswith(FILE):
-                udp_socket.writeDatagram(
-                    error_message("Attachments require TCP.").encode(),
-                    QtNetwork.QHostAddress(sender_str),
-                    sender_port,
-                )
-                continue
-            apply_result(room.route(peer, message, peer_label))
-
-    udp_socket.readyRead.connect(receive_message)
-    print(f"UDP server running on {host}:{port}")
-    sys.exit(app.exec())
-
-
-class TcpConnectionHandler(QtCore.QObject):
-    """Handle one newline-framed TCP client connection."""
-
-    def __init__(
-        self,
-        socket: QtNetwork.QTcpSocket,
-        room: ChatRoom,
-        connections: dict[QtNetwork.QTcpSocket, "TcpConnectionHandler"],
-        on_empty_connections,
-    ) -> None:
-        super().__init__()
-        self.socket = socket
-        self.room = room
-        self.connections = connections
-        self.on_empty_connections = on_empty_connections
-        self.buffer = ""
-        self.socket.readyRead.connect(self.read_data)
-        self.socket.disconnected.connect(self.close)
-        self.socket.disconnected.connect(self.socket.deleteLater)
-
-    @property
-    def peer_label(self) -> str:
-        return f"{self.socket.peerAddress().toString()}:{self.socket.peerPort()}"
-
-    def write(self, message: str) -> None:
-        self.socket.write(frame_message(message))
-
-    def close(self) -> None:
-        result = self.room.unregister(self.socket)
-        self.connections.pop(self.socket, None)
-        self._apply_result(result)
-        if not self.connections:
-            self.on_empty_connections()
-
-    def read_data(self) -> None:
-        self.buffer += self.socket.readAll().data().decode()
-        messages, self.buffer = split_frames(self.buffer)
-        for message in messages:
-            result = self.room.route(self.socket, message, self.peer_label)
-            self._apply_result(result)
-            if result.close_connection:
-                self.socket.disconnectFromHost()
-                break
-
-    def _apply_result(self, result: RoutingResult) -> None:
-        if result.log_line:
-            print(result.log_line)
-        for delivery in result.deliveries:
-            recipient = delivery.recipient
-            if not isinstance(recipient, QtNetwork.QTcpSocket):
-                continue
-            handler = self.connections.get(recipient)
-            if handler is not None:
-                handler.write(delivery.message)
-
-
-def run_tcp_server(host: str = "127.0.0.1", port: int = 33002) -> None:
-    """Run the TCP server."""
-    app = QtCore.QCoreApplication(sys.argv)
-    tcp_server = QtNetwork.QTcpServer()
-    room = ChatRoom()
-
-    if not tcp_server.listen(QtNetwork.QHostAddress(host), port):
-        print("TCP Server could not start")
-        sys.exit(1)
-    print(f"TCP server listening on {host}:{port}")
-
-    connections: dict[QtNetwork.QTcpSocket, TcpConnectionHandler] = {}
-
-    def stop_when_idle() -> None:
-        if connections:
-            return
-        tcp_server.close()
-        app.quit()
-
-    def new_connection() -> None:
-        while tcp_server.hasPendingConnections():
-            client_socket = tcp_server.nextPendingConnection()
-            if client_socket is None:
-                continue
-            handler = TcpConnectionHandler(client_socket, room, connections, stop_when_idle)
-            connections[client_socket] = handler
-
-    tcp_server.newConnection.connect(new_connection)
-    sys.exit(app.exec())
-
-
-def _is_udp_recipient(value: object) -> TypeGuard[tuple[str, int]]:
-    return (
-        isinstance(value, tuple)
-        and len(value) == 2
-        and isinstance(value[0], str)
-        and isinstance(value[1], int)
-    )
+from pathlib import Path
+
+from texte.backpressure import (
+    DEFAULT_HIGH_WATER,
+    DEFAULT_LOW_WATER,
+    DROP_CHAT,
+    SLOW_CONSUMER_POLICIES,
+    WriteLimits,
+)
+from texte.server_log import (
+    DEFAULT_LOG_LEVEL,
+    DEFAULT_LOG_MAX_BYTES,
+    LOG_LEVELS,
+    LogSettings,
+    start_server_logging,
+)
+
+BACKENDS = ("qt", "asyncio")
+
+
+def run_udp_server(
+    host: str = "127.0.0.1",
+    port: int = 33002,
+    backend: str = "qt",
+    metrics_port: int | None = None,
+) -> None:
+    """Run the UDP server on the selected event-loop backend."""
+    if backend == "asyncio":
+        from texte.asyncio_server import run_udp_server as run_backend
+    else:
+        from texte.qt_server import run_udp_server as run_backend
+    run_backend(host, port, metrics_port)
+
+
+def run_tcp_server(
+    host: str = "127.0.0.1",
+    port: int = 33002,
+    backend: str = "qt",
+    limits: WriteLimits | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    """Run the TCP server on the selected event-loop backend."""
+    if backend == "asyncio":
+        from texte.asyncio_server import run_tcp_server as run_backend
+    else:
+        from texte.qt_server import run_tcp_server as run_backend
+    run_backend(host, port, limits, metrics_port)
 
 
 def parse_args(argv: list[str]) -> argparse.Namespace:
@@ -196,7 +121,71 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
     )
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=33002)
-    return parser.parse_args(argv)
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="qt",
+        help="Event loop that serves sockets. asyncio runs without Qt installed.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="TCP worker processes. More than one shards clients across asyncio workers.",
+    )
+    parser.add_argument(
+        "--high-water",
+        type=int,
+        default=DEFAULT_HIGH_WATER,
+        help="Unsent bytes per TCP client before the slow-consumer policy applies.",
+    )
+    parser.add_argument(
+        "--low-water",
+        type=int,
+        default=DEFAULT_LOW_WATER,
+        help="Unsent bytes per TCP client below which held frames are sent again.",
+    )
+    parser.add_argument(
+        "--slow-consumer",
+        choices=SLOW_CONSUMER_POLICIES,
+        default=DROP_CHAT,
+        help="What to do with TCP clients above the high-water mark.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics.",
+    )
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default=DEFAULT_LOG_LEVEL)
+    parser.add_argument(
+        "--log-file",
+        type=Path,
+        help="Write JSON log lines to this file instead of stderr, rotating it when full.",
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=DEFAULT_LOG_MAX_BYTES,
+        help="Size at which --log-file rotates.",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        default=1,
+        help="Keep one in N connection opened/closed events.",
+    )
+    args = parser.parse_args(argv)
+    if not 0 <= args.low_water < args.high_water:
+        parser.error("--low-water must be at least 0 and below --high-water")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and (args.protocol or args.mode or "udp") != "tcp":
+        parser.error("--workers is only available for the TCP server")
+    if args.workers > 1 and args.metrics_port is not None:
+        parser.error("--metrics-port is not available with --workers")
+    if args.log_sample < 1 or args.log_max_bytes < 1:
+        parser.error("--log-sample and --log-max-bytes must be at least 1")
+    return args
 
 
 def main() -> None:
@@ -204,10 +193,21 @@ def main() -> None:
     args = parse_args(sys.argv[1:])
     protocol = args.protocol or args.mode or "udp"
 
-    if protocol == "udp":
-        run_udp_server(args.host, args.port)
-    else:
-        run_tcp_server(args.host, args.port)
+    limits = WriteLimits(args.high_water, args.low_water, args.slow_consumer)
+    log_settings = LogSettings(args.log_level, args.log_file, args.log_sample, args.log_max_bytes)
+    server_logging = start_server_logging(log_settings)
+
+    try:
+        if protocol == "udp":
+            run_udp_server(args.host, args.port, args.backend, args.metrics_port)
+        elif args.workers > 1:
+            from texte.sharded_server import run_sharded_tcp_server
+
+            run_sharded_tcp_server(args.host, args.port, args.workers, limits, log_settings)
+        else:
+            run_tcp_server(args.host, args.port, args.backend, limits, args.metrics_port)
+    finally:
+        server_logging.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+"""Structured server logging that never blocks the event loop on output.
+
+Server code calls `log_event("connection.opened", peer=...)`. The record goes
+through a level check and a sampling filter, then into a bounded in-memory queue.
+A background thread writes it as one JSON line to stderr or to a rotating file. A
+full queue drops the record and counts it instead of stalling routing.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from dataclasses import dataclass, replace
+from datetime import UTC, datetime
+from pathlib import Path
+
+logger = logging.getLogger("texte.server")
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+DEFAULT_LOG_LEVEL = "info"
+# Records waiting for the writer thread past this count are dropped.
+LOG_QUEUE_SIZE = 10_000
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+# One record per client connection: these are the ones a connect storm multiplies.
+SAMPLED_EVENTS = frozenset({"connection.opened", "connection.closed"})
+
+
+def log_event(event: str, level: int = logging.INFO, **fields: object) -> None:
+    """Log one named event with structured fields."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Format a record as one JSON object: time, level, event, then its fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line: dict[str, object] = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        line.update(getattr(record, "fields", {}))
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep the first of every `every` records for each sampled event.
+
+    Kept records carry `"sampled": every`, so a reader can scale counts back up.
+    """
+
+    def __init__(self, every: int = 1, events: frozenset[str] = SAMPLED_EVENTS) -> None:
+        super().__init__()
+        self.every = every
+        self.events = events
+        self._seen: dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or record.msg not in self.events:
+            return True
+        event = str(record.msg)
+        seen = self._seen.get(event, 0)
+        self._seen[event] = seen + 1
+        if seen % self.every:
+            return False
+        record.fields = {**getattr(record, "fields", {}), "sampled": self.every}
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the writer thread, dropping them once `limit` are waiting.
+
+    The queue itself is unbounded so the listener's stop sentinel always fits.
+    """
+
+    def __init__(self, records: "queue.SimpleQueue[logging.LogRecord]", limit: int) -> None:
+        super().__init__(records)
+        self.records = records
+        self.limit = limit
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.records.qsize() >= self.limit:
+            self.dropped += 1
+        else:
+            self.records.put_nowait(record)
+
+
+@dataclass(frozen=True, slots=True)
+class LogSettings:
+    level: str = DEFAULT_LOG_LEVEL
+    path: Path | None = None
+    sample: int = 1
+    max_bytes: int = DEFAULT_LOG_MAX_BYTES
+    backups: int = LOG_BACKUPS
+    queue_size: int = LOG_QUEUE_SIZE
+
+
+def worker_log_settings(settings: LogSettings, index: int) -> LogSettings:
+    """Give worker `index` its own log file beside the parent's, e.g. `server.worker0.log`.
+
+    Rotating one file from several processes would lose records.
+    """
+    if settings.path is None:
+        return settings
+    return replace(settings, path=settings.path.with_stem(f"{settings.path.stem}.worker{index}"))
+
+
+class ServerLogging:
+    """The writer thread and handlers installed by `start_server_logging`."""
+
+    def __init__(
+        self,
+        handler: BoundedQueueHandler,
+        listener: logging.handlers.QueueListener,
+        output: logging.Handler,
+    ) -> None:
+        self.handler = handler
+        self.listener = listener
+        self.output = output
+
+    def stop(self) -> None:
+        """Write every queued record and a count of dropped ones, then detach the handlers."""
+        self.listener.stop()
+        logger.removeHandler(self.handler)
+        if self.handler.dropped:
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0, "log.dropped", (), None
+            )
+            record.fields = {"records": self.handler.dropped}
+            self.output.handle(record)
+        self.output.close()
+
+
+def start_server_logging(settings: LogSettings | None = None) -> ServerLogging:
+    """Route `texte.server` records through a bounded queue to a background writer."""
+    settings = settings or LogSettings()
+    output: logging.Handler
+    if settings.path is None:
+        output = logging.StreamHandler(sys.stderr)
+    else:
+        output = logging.handlers.RotatingFileHandler(
+            settings.path,
+            maxBytes=settings.max_bytes,
+            backupCount=settings.backups,
+            encoding="utf-8",
+        )
+    output.setFormatter(JsonLineFormatter())
+
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = BoundedQueueHandler(records, settings.queue_size)
+    handler.addFilter(SamplingFilter(settings.sample))
+    listener = logging.handlers.QueueListener(records, output)
+
+    logger.setLevel(settings.level.upper())
+    logger.propagate = False
+    logger.addHandler(handler)
+    listener.start()
+    return ServerLogging(handler, listener, output)
@@ -0,0 +1,321 @@
+"""Multi-process TCP server that shards connections across worker processes.
+
+Each worker accepts connections on the shared port through SO_REUSEPORT and owns
+their sockets, framing, and encoding on its own asyncio loop. The parent process
+owns the single `ChatRoom` and talks to workers over multiprocessing pipes, so
+`{ALL}`, `{TO}`, `{FILE}`, and presence behave as one room. A routed message
+crosses the bus once per worker, and each worker fans it out to its local
+connections, encoding it at most once per wire format.
+
+Neither side blocks on a full pipe: an attachment can outgrow the OS pipe buffer,
+and a parent blocked writing to a worker that is itself blocked writing to the
+parent would stall the whole server. The parent writes each pipe from its own
+`BusSender` thread, and each worker buffers its writes in a `BusWriter`.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import struct
+import sys
+import threading
+from collections.abc import Hashable
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from multiprocessing.reduction import ForkingPickler
+from typing import Any
+
+from texte.asyncio_server import AsyncTcpConnection
+from texte.backpressure import ServerStats, WriteLimits
+from texte.chat_room import ChatRoom, Delivery, RoutingResult, deliveries_for
+from texte.protocol import (
+    DISCONNECT,
+    STATS,
+    FileChunk,
+    FileDelivery,
+    FileMessage,
+    OutboundMessage,
+    command_tag,
+    error_message,
+)
+from texte.server_log import LogSettings, log_event, start_server_logging, worker_log_settings
+
+# Metrics are per process, so `{STATS}` is refused like `--metrics-port` is.
+STATS_UNAVAILABLE = "Server stats are not available with --workers."
+
+# Bus message kinds. Workers send READY, ROUTE, and LEAVE; the parent sends DELIVER.
+READY = "ready"
+ROUTE = "route"
+LEAVE = "leave"
+DELIVER = "deliver"
+
+
+@dataclass(frozen=True, slots=True)
+class ShardClient:
+    """ChatRoom client id for a connection hosted by one worker."""
+
+    worker: int
+    connection: int
+
+
+class BusSender:
+    """Send the parent's messages to one worker from a thread, in order."""
+
+    def __init__(self, bus: Connection) -> None:
+        self.bus = bus
+        self._queue: queue.SimpleQueue[tuple[Any, ...] | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, message: tuple[Any, ...]) -> None:
+        self._queue.put(message)
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        while (message := self._queue.get()) is not None:
+            try:
+                self.bus.send(message)
+            except OSError:
+                return
+
+
+class BusWriter:
+    """Buffer a worker's messages to the parent and write them as the pipe drains.
+
+    Messages use the `Connection.send` wire format, so the parent reads them with
+    `Connection.recv`. Writes pass MSG_DONTWAIT rather than making the pipe
+    non-blocking, which would break the blocking `recv` on the same socket.
+    """
+
+    def __init__(self, bus: Connection, loop: asyncio.AbstractEventLoop) -> None:
+        self._socket = socket.socket(fileno=os.dup(bus.fileno()))
+        self._loop = loop
+        self._buffer = bytearray()
+        self._waiting = False
+
+    def send(self, message: tuple[Any, ...]) -> None:
+        payload = ForkingPickler.dumps(message)
+        self._buffer += struct.pack("!i", len(payload))
+        self._buffer += payload
+        if not self._waiting:
+            self._write()
+
+    def close(self) -> None:
+        if self._waiting:
+            self._loop.remove_writer(self._socket.fileno())
+        self._socket.close()
+
+    def _write(self) -> None:
+        try:
+            sent = self._socket.send(self._buffer, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            # The parent is gone; the bus reader notices and stops the worker.
+            sent = len(self._buffer)
+        del self._buffer[:sent]
+        if self._buffer and not self._waiting:
+            self._loop.add_writer(self._socket.fileno(), self._write)
+            self._waiting = True
+        elif not self._buffer and self._waiting:
+            self._loop.remove_writer(self._socket.fileno())
+            self._waiting = False
+
+
+class ShardRoom:
+    """Forward one worker's routing calls to the parent-process ChatRoom."""
+
+    def __init__(self, bus: BusWriter) -> None:
+        self.bus = bus
+        self.connections: dict[int, AsyncTcpConnection] = {}
+        self._ids: dict[Hashable, int] = {}
+        self._next_id = itertools.count()
+
+    def route(
+        self, client_id: Hashable, message: str | FileMessage | FileChunk, peer_name: str
+    ) -> RoutingResult:
+        if isinstance(message, str) and command_tag(message) == STATS:
+            return RoutingResult(deliveries_for([client_id], error_message(STATS_UNAVAILABLE)))
+        connection_id = self._ids.get(client_id)
+        if connection_id is None:
+            if not isinstance(client_id, AsyncTcpConnection):
+                return RoutingResult()
+            connection_id = next(self._next_id)
+            self._ids[client_id] = connection_id
+            self.connections[connection_id] = client_id
+        self.bus.send((ROUTE, connection_id, message, peer_name))
+        if isinstance(message, str) and message.startswith(DISCONNECT):
+            return RoutingResult(close_connection=True)
+        return RoutingResult()
+
+    def unregister(self, client_id: Hashable) -> RoutingResult:
+        connection_id = self._ids.pop(client_id, None)
+        if connection_id is not None:
+            self.connections.pop(connection_id, None)
+            self.bus.send((LEAVE, connection_id))
+        return RoutingResult()
+
+    def deliver(self, payload: str | FileDelivery | FileChunk, connection_ids: list[int]) -> None:
+        if isinstance(payload, (FileDelivery, FileChunk)):
+            outbound = OutboundMessage(file=payload)
+        else:
+            outbound = OutboundMessage(payload)
+        for connection_id in connection_ids:
+            connection = self.connections.get(connection_id)
+            if connection is not None:
+                connection.deliver(Delivery(connection, outbound))
+
+
+def run_sharded_tcp_server(
+    host: str = "127.0.0.1",
+    port: int = 33002,
+    workers: int = 2,
+    limits: WriteLimits | None = None,
+    log_settings: LogSettings | None = None,
+) -> None:
+    """Run the TCP server across several worker processes sharing one room.
+
+    Workers log with the same settings as the parent. With a log file, each
+    worker writes its own file beside it; see `worker_log_settings`.
+    """
+    log_settings = log_settings or LogSettings()
+    if not hasattr(socket, "SO_REUSEPORT"):
+        log_event("server.failed", logging.ERROR, protocol="tcp", reason="no SO_REUSEPORT")
+        sys.exit(1)
+
+    # Turn SIGTERM into SystemExit so the finally block below stops the workers.
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0))
+    context = multiprocessing.get_context("spawn")
+    buses: dict[Connection, int] = {}
+    processes = []
+    for index in range(workers):
+        parent_end, worker_end = context.Pipe()
+        process = context.Process(
+            target=_run_worker,
+            args=(index, host, port, worker_end, limits, worker_log_settings(log_settings, index)),
+            daemon=True,
+        )
+        process.start()
+        worker_end.close()
+        buses[parent_end] = index
+        processes.append(process)
+
+    try:
+        _coordinate(host, port, buses)
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+def _coordinate(host: str, port: int, buses: dict[Connection, int]) -> None:
+    room = ChatRoom()
+    workers = {index: BusSender(bus) for bus, index in buses.items()}
+    expected = len(workers)
+    ready = 0
+    try:
+        while buses:
+            for bus in wait(list(buses)):
+                assert isinstance(bus, Connection)
+                try:
+                    message = bus.recv()
+                except EOFError:
+                    sender = workers.pop(buses.pop(bus), None)
+                    if sender is not None:
+                        sender.close()
+                    continue
+                worker = buses[bus]
+                kind = message[0]
+                if kind == READY:
+                    ready += 1
+                    if ready == expected:
+                        log_event(
+                            "server.listening", protocol="tcp", host=host, port=port, workers=ready
+                        )
+                elif kind == ROUTE:
+                    _, connection_id, payload, peer_name = message
+                    result = room.route(ShardClient(worker, connection_id), payload, peer_name)
+                    _dispatch(result, workers)
+                elif kind == LEAVE:
+                    _dispatch(room.unregister(ShardClient(worker, message[1])), workers)
+    finally:
+        for sender in workers.values():
+            sender.close()
+
+
+def _dispatch(result: RoutingResult, workers: dict[int, BusSender]) -> None:
+    if result.log_line:
+        log_event("room.event", text=result.log_line)
+    # One bus message per (message, worker) pair, in first-delivery order.
+    groups: dict[tuple[OutboundMessage, int], list[int]] = {}
+    for delivery in result.deliveries:
+        recipient = delivery.recipient
+        if isinstance(recipient, ShardClient):
+            key = (delivery.outbound, recipient.worker)
+            groups.setdefault(key, []).append(recipient.connection)
+    for (outbound, worker), connection_ids in groups.items():
+        sender = workers.get(worker)
+        if sender is not None:
+            sender.send((DELIVER, outbound.file or outbound.text, connection_ids))
+
+
+def _run_worker(
+    index: int,
+    host: str,
+    port: int,
+    bus: Connection,
+    limits: WriteLimits | None,
+    log_settings: LogSettings,
+) -> None:
+    # The parent terminates workers; exit through `finally` so queued records are written.
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0))
+    server_logging = start_server_logging(log_settings)
+    try:
+        asyncio.run(_serve_worker(host, port, bus, limits))
+    except OSError as error:
+        log_event("worker.failed", logging.ERROR, worker=index, error=str(error))
+        sys.exit(1)
+    finally:
+        server_logging.stop()
+
+
+async def _serve_worker(host: str, port: int, bus: Connection, limits: WriteLimits | None) -> None:
+    loop = asyncio.get_running_loop()
+    bus_writer = BusWriter(bus, loop)
+    room = ShardRoom(bus_writer)
+    stats = ServerStats()
+    connections: set[AsyncTcpConnection] = set()
+    parent_gone = asyncio.Event()
+
+    def read_bus() -> None:
+        try:
+            while bus.poll():
+                kind, payload, connection_ids = bus.recv()
+                if kind == DELIVER:
+                    room.deliver(payload, connection_ids)
+        except (EOFError, OSError):
+            loop.remove_reader(bus.fileno())
+            parent_gone.set()
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = AsyncTcpConnection(
+            reader, writer, room, connections, lambda: None, limits, stats
+        )
+        connections.add(connection)
+        log_event("connection.opened", peer=connection.peer_label)
+        await connection.serve()
+
+    server = await asyncio.start_server(handle_connection, host, port, reuse_port=True)
+    loop.add_reader(bus.fileno(), read_bus)
+    bus_writer.send((READY,))
+    try:
+        async with server:
+            await parent_gone.wait()
+    finally:
+        bus_writer.close()
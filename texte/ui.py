@@ -4,7 +4,8 @@ from pathlib import Path
 
 from PyQt6 import QtCore, QtGui, QtWidgets
 
-from texte.widgets import InvisibleItemDelegate, SmoothListWidget, ThemeModeSwitch
+from texte.chat_log import ChatLogView
+from texte.widgets import InvisibleItemDelegate, ThemeModeSwitch
 
 ICON_BUTTON_SIZE = 22
 SIDEBAR_MIN_WIDTH = 300
@@ -106,6 +107,13 @@ def _build_sidebar(client) -> None:
     )
     client.sidebar_layout.addWidget(client.search_field)
 
+    client.search_results = QtWidgets.QListWidget()
+    client.search_results.setObjectName("Search_Results")
+    client.search_results.setWordWrap(True)
+    client.search_results.setMaximumHeight(260)
+    client.search_results.setVisible(False)
+    client.sidebar_layout.addWidget(client.search_results)
+
     client.pinned_title = QtWidgets.QLabel("Pinned")
     client.pinned_title.setObjectName("Sidebar_Section_Label")
     client.sidebar_layout.addWidget(client.pinned_title)
@@ -395,7 +403,7 @@ def _build_chat_area(client) -> None:
     header.addWidget(client.theme_switch, 0, QtCore.Qt.AlignmentFlag.AlignVCenter)
     chat_layout.addWidget(client.chat_header)
 
-    client.chat_log = SmoothListWidget()
+    client.chat_log = ChatLogView()
     client.chat_log.setObjectName("Chat_Log")
     client.chat_log.setEnabled(False)
     client.chat_log.setSizePolicy(
@@ -1,7 +1,5 @@
 """Small reusable widgets that give Texte its Messages-style shape."""
 
-from collections.abc import Callable
-
 from PyQt6 import QtCore, QtGui, QtSvg, QtWidgets
 
 from texte.themes import ThemePalette
@@ -17,87 +15,6 @@ def emoji_font(point_size: int = 14) -> QtGui.QFont:
     return font
 
 
-class ClickableLabel(QtWidgets.QLabel):
-    """QLabel variant that emits a signal when clicked."""
-
-    clicked = QtCore.pyqtSignal()
-
-    def mousePressEvent(self, event: QtGui.QMouseEvent | None) -> None:
-        if event is not None and event.button() == QtCore.Qt.MouseButton.LeftButton:
-            self.clicked.emit()
-            event.accept()
-            return
-        super().mousePressEvent(event)
-
-
-class ReactionLabel(QtWidgets.QLabel):
-    """Selectable text label with a reaction context menu."""
-
-    clicked = QtCore.pyqtSignal()
-    reactionChosen = QtCore.pyqtSignal(str)
-
-    def __init__(self, text: str = "", parent: QtWidgets.QWidget | None = None) -> None:
-        super().__init__(text, parent)
-        self.click_handler: Callable[[], None] | None = None
-
-    def mouseReleaseEvent(self, event: QtGui.QMouseEvent | None) -> None:
-        if event is not None and event.button() == QtCore.Qt.MouseButton.LeftButton:
-            if callable(self.click_handler):
-                self.click_handler()
-            else:
-                self.clicked.emit()
-            event.accept()
-            return
-        super().mouseReleaseEvent(event)
-
-    def contextMenuEvent(self, event: QtGui.QContextMenuEvent | None) -> None:
-        if event is None:
-            return
-
-        menu = QtWidgets.QMenu(self)
-
-        try:
-            selected_text = self.selectedText()
-        except Exception:
-            selected_text = ""
-
-        if selected_text:
-            copy_action = menu.addAction("Copy")
-            assert copy_action is not None
-            copy_action.triggered.connect(self._copy_selected_text(selected_text))
-
-        try:
-            has_all_text = bool(self.text())
-            has_selection_api = True
-        except Exception:
-            has_all_text = False
-            has_selection_api = False
-
-        if has_selection_api and has_all_text:
-            select_all_action = menu.addAction("Select All")
-            assert select_all_action is not None
-            select_all_action.triggered.connect(lambda: self.setSelection(0, len(self.text())))
-
-        if menu.actions():
-            menu.addSeparator()
-
-        react_menu = menu.addMenu("React")
-        assert react_menu is not None
-        for emoji in ("👍", "❤", "😂", "😮", "😢", "👎"):
-            action = react_menu.addAction(emoji)
-            assert action is not None
-            action.triggered.connect(
-                lambda _checked=False, value=emoji: self.reactionChosen.emit(value)
-            )
-
-        menu.exec(event.globalPos())
-
-    def _copy_selected_text(self, text: str) -> Callable[[], None]:
-        clipboard = QtGui.QGuiApplication.clipboard()
-        assert clipboard is not None
-        return lambda: clipboard.setText(text)
-
-
 class MessageActionPopup(QtWidgets.QFrame):
     """Floating bubble popover with emoji reactions and message actions."""
 
@@ -231,8 +148,8 @@ class TransientScrollStyle(QtWidgets.QProxyStyle):
         return super().styleHint(hint, option, widget, return_data)
 
 
-class SmoothListWidget(QtWidgets.QListWidget):
-    """QListWidget with pixel-based smooth wheel scrolling."""
+class SmoothListView(QtWidgets.QListView):
+    """QListView with pixel-based smooth wheel scrolling."""
 
     def __init__(self, parent: QtWidgets.QWidget | None = None) -> None:
         super().__init__(parent)
@@ -241,9 +158,9 @@ class SmoothListWidget(QtWidgets.QListWidget):
         scrollbar = self.verticalScrollBar()
         assert scrollbar is not None
         scrollbar.setSingleStep(18)
-        self._wheel_animation = QtCore.QPropertyAnimation(scrollbar, b"value", self)
-        self._wheel_animation.setDuration(140)
-        self._wheel_animation.setEasingCurve(QtCore.QEasingCurve.Type.OutCubic)
+        self.wheel_animation = QtCore.QPropertyAnimation(scrollbar, b"value", self)
+        self.wheel_animation.setDuration(140)
+        self.wheel_animation.setEasingCurve(QtCore.QEasingCurve.Type.OutCubic)
 
     def wheelEvent(self, event: QtGui.QWheelEvent | None) -> None:
         if event is None:
@@ -257,10 +174,10 @@ class SmoothListWidget(QtWidgets.QListWidget):
         step = max(40, scrollbar.singleStep() * 4)
         target = scrollbar.value() - int(angle_delta / 120) * step
         target = max(scrollbar.minimum(), min(target, scrollbar.maximum()))
-        self._wheel_animation.stop()
-        self._wheel_animation.setStartValue(scrollbar.value())
-        self._wheel_animation.setEndValue(target)
-        self._wheel_animation.start()
+        self.wheel_animation.stop()
+        self.wheel_animation.setStartValue(scrollbar.value())
+        self.wheel_animation.setEndValue(target)
+        self.wheel_animation.start()
         event.accept()
 
 